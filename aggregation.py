@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# aggregation.py
+# Vectorised summary engine: bins parsed listing rows by age and size in one
+# NumPy pass and reports count / mean / median / percentiles per cell.
+#
+# Buckets are inclusive [lo, hi] pairs; None means open-ended. Labels follow
+# the historic summary keys: [0, 4] -> "0-4", [None, 79] -> "<80", [121, None] -> ">120".
+
+import hashlib
+import json
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import sketch
+import spatial
+from config import summary_settings
+
+# Bump whenever parsing or summary logic changes in a way that alters numbers;
+# backfill.py regenerates every stored run whose summary has an older version.
+#   1: original extractor (closure parsers, hard-coded buckets)
+#   2: parsing.py (decimal prices) + configurable vectorised buckets with percentiles
+#   3: per-cell spatial "grid" block (spatial.py)
+#   4: mergeable quantile sketch per cell, "sketches" block (sketch.py)
+#   5: sketches over every parsed price, not just the floor / ceiling window
+LOGIC_VERSION = 5
+
+# ------------------------
+# Defaults (overridable in config.yaml under `summary:`)
+# ------------------------
+DEFAULT_BUCKETS = {
+    "age": [[0, 4], [5, 9], [10, 14], [15, 20]],
+    "size": [[None, 79], [80, 120], [121, None]],
+}
+DEFAULT_PERCENTILES = [10, 25, 75, 90]  # the median is always reported
+PRICE_FLOOR = 50_000_000
+PRICE_CEILING = 300_000_000
+
+Bucket = Sequence[Optional[float]]
+
+
+def bucket_label(bucket: Bucket) -> str:
+    lo, hi = bucket
+    if lo is None:
+        return f"<{hi + 1}"
+    if hi is None:
+        return f">{lo - 1}"
+    return f"{lo}-{hi}"
+
+
+def assign_buckets(values: np.ndarray, buckets: List[Bucket]) -> np.ndarray:
+    # index of the first bucket containing each value, -1 for none / NaN
+    out = np.full(len(values), -1, dtype=np.int64)
+    for i in range(len(buckets) - 1, -1, -1):
+        lo, hi = buckets[i]
+        mask = ~np.isnan(values)
+        if lo is not None:
+            mask &= values >= lo
+        if hi is not None:
+            mask &= values <= hi
+        out[mask] = i
+    return out
+
+
+def cell_stats(prices: np.ndarray, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, int]:
+    if len(prices) == 0:
+        return {"avg": 0, "count": 0, "median": 0, **{f"p{int(p)}": 0 for p in percentiles}}
+    qs = np.percentile(prices, [50, *percentiles])
+    return {
+        "avg": int(prices.mean()),
+        "count": int(len(prices)),
+        "median": int(qs[0]),
+        **{f"p{int(p)}": int(q) for p, q in zip(percentiles, qs[1:])},
+    }
+
+
+def resolve_settings(path_name: Optional[str] = None) -> Dict[str, Any]:
+    s = summary_settings(path_name)
+    buckets = s.get("buckets", {}) or {}
+    return {
+        "age": buckets.get("age", DEFAULT_BUCKETS["age"]),
+        "size": buckets.get("size", DEFAULT_BUCKETS["size"]),
+        "percentiles": s.get("percentiles", DEFAULT_PERCENTILES),
+        "price_floor": s.get("price_floor", PRICE_FLOOR),
+        "price_ceiling": s.get("price_ceiling", PRICE_CEILING),
+        "grid_cell_m": s.get("grid_cell_m", spatial.DEFAULT_CELL_M),
+        "grid_min_count": s.get("grid_min_count", spatial.DEFAULT_MIN_COUNT),
+        "sketch_compression": s.get("sketch_compression", sketch.DEFAULT_COMPRESSION),
+    }
+
+
+def logic_fingerprint(settings: Dict[str, Any]) -> Dict[str, Any]:
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return {"version": LOGIC_VERSION, "settings": digest}
+
+
+class SummaryColumns:
+    # Running input of summarise(), filled row by row as pages stream in
+    # (PostSink on_row), so the run's summary needs no second pass over the
+    # store parts. This reduces memory but does not bound it: the exact
+    # medians, percentiles and grid cells of a summary need every value, so
+    # the columns grow with the run, as packed doubles (40 bytes per listing,
+    # about 11 KB for the largest recorded run of 284 posts). Bounding it
+    # would mean serving the cells from sketches alone, which changes the
+    # published numbers.
+    FIELDS = ("price_per_sqm", "age", "size", "lat", "lon")
+
+    def __init__(self):
+        self._cols = {k: array("d") for k in self.FIELDS}
+
+    def add(self, row: Dict[str, Any]):
+        for k, col in self._cols.items():
+            v = row.get(k)
+            col.append(float("nan") if v is None else v)
+
+    def __len__(self) -> int:
+        return len(self._cols["price_per_sqm"])
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {k: np.frombuffer(col, dtype=np.float64).copy() for k, col in self._cols.items()}
+
+
+def summarise(columns: Dict[str, np.ndarray], min_requested: int, max_requested: int,
+              settings: Dict[str, Any]) -> Dict[str, Any]:
+    # columns: price_per_sqm / age / size arrays (NaN = missing), e.g. from listing_store.read_part;
+    # with lat / lon as well, the summary also gets a per-cell "grid" (spatial.grid_stats).
+    # "sketches" mirrors the cells with one mergeable quantile sketch each (sketch.py).
+    # The sketches take every parsed price in the size range, not only those
+    # between price_floor and price_ceiling: their IQR and trimmed mean are
+    # the outlier handling there, so clipping first would hide what they trim.
+    price = np.asarray(columns["price_per_sqm"], dtype=np.float64)
+    age = np.asarray(columns["age"], dtype=np.float64)
+    size = np.asarray(columns["size"], dtype=np.float64)
+
+    # client-side strict filtering: parsed size known and inside the requested range
+    in_range = ~np.isnan(size) & (size >= min_requested) & (size <= max_requested)
+    priced = in_range & ~np.isnan(price)
+    valid = priced & (price >= settings["price_floor"]) & (price <= settings["price_ceiling"])
+    all_price, all_age, all_size = price[priced], age[priced], size[priced]
+    price, age, size = price[valid], age[valid], size[valid]
+    grid = None
+    if "lat" in columns and "lon" in columns:
+        grid = spatial.grid_stats(price, np.asarray(columns["lat"], dtype=np.float64)[valid],
+                                  np.asarray(columns["lon"], dtype=np.float64)[valid],
+                                  settings["grid_cell_m"], settings["grid_min_count"])
+
+    age_b, size_b = settings["age"], settings["size"]
+    age_idx = assign_buckets(age, age_b)
+    size_idx = assign_buckets(size, size_b)
+    pct = settings["percentiles"]
+
+    # one sort by (age, size) cell, then every cell is a contiguous slice
+    cell_key = (age_idx + 1) * (len(size_b) + 1) + (size_idx + 1)
+    order = np.argsort(cell_key, kind="stable")
+    sorted_key, sorted_price = cell_key[order], price[order]
+    bounds = np.searchsorted(sorted_key, np.arange(0, (len(age_b) + 1) * (len(size_b) + 1) + 1))
+
+    def slice_of(a: int, z: int) -> np.ndarray:
+        k = (a + 1) * (len(size_b) + 1) + (z + 1)
+        return sorted_price[bounds[k]:bounds[k + 1]]
+
+    age_labels = [bucket_label(b) for b in age_b]
+    size_labels = [bucket_label(b) for b in size_b]
+    overall = cell_stats(price, pct)
+    compression = settings["sketch_compression"]
+
+    def sketch_of(prices: np.ndarray) -> Dict[str, Any]:
+        return sketch.QuantileSketch.from_values(prices, compression).to_dict()
+
+    all_age_idx = assign_buckets(all_age, age_b)
+    all_size_idx = assign_buckets(all_size, size_b)
+
+    summary = {
+        "total_posts": int(in_range.sum()),
+        "valid_for_averages": overall["count"],
+        "overall_avg_price_per_sqm": overall["avg"],
+        "overall": overall,
+        "age_intervals": {lbl: cell_stats(price[age_idx == i], pct) for i, lbl in enumerate(age_labels)},
+        "size_intervals": {lbl: cell_stats(price[size_idx == j], pct) for j, lbl in enumerate(size_labels)},
+        "age_size_matrix": {
+            a_lbl: {s_lbl: cell_stats(slice_of(i, j), pct) for j, s_lbl in enumerate(size_labels)}
+            for i, a_lbl in enumerate(age_labels)
+        },
+        "buckets": {"age": age_b, "size": size_b},
+        "price_floor": settings["price_floor"],
+        "price_ceiling": settings["price_ceiling"],
+        "sketches": {
+            "compression": compression,
+            "overall": sketch_of(all_price),
+            "age_intervals": {lbl: sketch_of(all_price[all_age_idx == i]) for i, lbl in enumerate(age_labels)},
+            "size_intervals": {lbl: sketch_of(all_price[all_size_idx == j]) for j, lbl in enumerate(size_labels)},
+            "age_size_matrix": {
+                a_lbl: {s_lbl: sketch_of(all_price[(all_age_idx == i) & (all_size_idx == j)])
+                        for j, s_lbl in enumerate(size_labels)}
+                for i, a_lbl in enumerate(age_labels)
+            },
+        },
+        "logic": logic_fingerprint(settings),
+    }
+    if grid is not None:
+        summary["grid"] = grid
+    return summary
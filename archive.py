@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# archive.py
+# Monthly run archives written by compaction.py:
+#
+#   divar_results/<district>/archive/<YYYY-MM>.pack       members appended back to back
+#   divar_results/<district>/archive/<YYYY-MM>.idx.json   "<run ts>/<file name>" -> offset, length, ...
+#
+# Each member is compressed on its own (zlib, or stored as-is when the file is
+# already gzipped), so reading one file is a seek plus one decompress. Adding
+# members appends to the pack and then atomically replaces the index; bytes
+# past the last indexed member (an interrupted append) are simply never read.
+# ArchivedFile mimics the parts of pathlib.Path the loaders use (name,
+# read_bytes, open, stat), so runs.Run can hand out archived files unchanged.
+
+import hashlib
+import io
+import json
+import os
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+ARCHIVE_DIR = "archive"
+PACK_SUFFIX = ".pack"
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+ZLIB_LEVEL = 9
+
+
+class ArchivedFile:
+    def __init__(self, pack: Path, key: str, entry: Dict[str, Any]):
+        self.pack = Path(pack)
+        self.key = key
+        self.entry = entry
+        self.name = key.rsplit("/", 1)[-1]
+        self.suffix = Path(self.name).suffix
+
+    def __str__(self) -> str:
+        return f"{self.pack}#{self.key}"
+
+    def __repr__(self) -> str:
+        return f"ArchivedFile({self})"
+
+    def exists(self) -> bool:
+        return self.pack.exists()
+
+    def stat(self):
+        mtime_ns = self.entry["mtime_ns"]
+        return SimpleNamespace(st_size=self.entry["size"], st_mtime_ns=mtime_ns, st_mtime=mtime_ns / 1e9)
+
+    def read_bytes(self) -> bytes:
+        with open(self.pack, "rb") as f:
+            f.seek(self.entry["offset"])
+            data = f.read(self.entry["length"])
+        return zlib.decompress(data) if self.entry["codec"] == "zlib" else data
+
+    def read_text(self, encoding: str = "utf-8") -> str:
+        return self.read_bytes().decode(encoding)
+
+    def open(self, mode: str = "r", encoding: str = "utf-8"):
+        if "w" in mode or "a" in mode:
+            raise OSError(f"{self} is read-only")
+        buf = io.BytesIO(self.read_bytes())
+        return buf if "b" in mode else io.TextIOWrapper(buf, encoding=encoding)
+
+
+class MonthArchive:
+    def __init__(self, district_dir: Path, month: str):
+        base = Path(district_dir) / ARCHIVE_DIR
+        self.month = month
+        self.pack = base / f"{month}{PACK_SUFFIX}"
+        self.index_file = base / f"{month}{INDEX_SUFFIX}"
+        self._members: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @property
+    def members(self) -> Dict[str, Dict[str, Any]]:
+        if self._members is None:
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    self._members = json.load(f).get("members", {})
+            except (OSError, ValueError):
+                self._members = {}
+        return self._members
+
+    def file(self, key: str) -> ArchivedFile:
+        return ArchivedFile(self.pack, key, self.members[key])
+
+    def runs(self) -> Dict[str, Dict[str, ArchivedFile]]:
+        # run ts -> file name -> ArchivedFile
+        out: Dict[str, Dict[str, ArchivedFile]] = {}
+        for key in self.members:
+            ts, name = key.split("/", 1)
+            out.setdefault(ts, {})[name] = self.file(key)
+        return out
+
+    def add(self, files: Dict[str, Path]) -> int:
+        # append {key: source file}; a key already archived with the same content
+        # is skipped, different content supersedes it. Returns bytes appended.
+        self.pack.parent.mkdir(parents=True, exist_ok=True)
+        members = dict(self.members)
+        appended = 0
+        with open(self.pack, "ab") as out:
+            offset = out.seek(0, os.SEEK_END)
+            for key, src in files.items():
+                data = Path(src).read_bytes()
+                sha = hashlib.sha256(data).hexdigest()
+                if members.get(key, {}).get("sha256") == sha:
+                    continue
+                stored = data if src.name.endswith(".gz") else zlib.compress(data, ZLIB_LEVEL)
+                out.write(stored)
+                members[key] = {"offset": offset, "length": len(stored), "size": len(data),
+                                "codec": "store" if stored is data else "zlib", "sha256": sha,
+                                "mtime_ns": src.stat().st_mtime_ns}
+                offset += len(stored)
+                appended += len(stored)
+            out.flush()
+            os.fsync(out.fileno())
+        tmp = self.index_file.with_name(self.index_file.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "month": self.month, "members": members}, f,
+                      ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.index_file)
+        self._members = members
+        return appended
+
+    def verify(self, keys: List[str]) -> bool:
+        # every key readable and matching its recorded sha256
+        for key in keys:
+            entry = self.members.get(key)
+            if entry is None:
+                return False
+            try:
+                data = self.file(key).read_bytes()
+            except (OSError, zlib.error):
+                return False
+            if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                return False
+        return True
+
+
+def month_of(run_ts: str) -> str:
+    return f"{run_ts[:4]}-{run_ts[4:6]}"
+
+
+def archives(district_dir: Path) -> List[MonthArchive]:
+    base = Path(district_dir) / ARCHIVE_DIR
+    if not base.is_dir():
+        return []
+    return [MonthArchive(district_dir, p.name[:-len(INDEX_SUFFIX)]) for p in sorted(base.glob(f"*{INDEX_SUFFIX}"))]
+
+
+def archived_runs(district_dir: Path) -> Dict[str, Dict[str, ArchivedFile]]:
+    # every archived run of a district: run ts -> file name -> ArchivedFile
+    out: Dict[str, Dict[str, ArchivedFile]] = {}
+    for month in archives(district_dir):
+        out.update(month.runs())
+    return out
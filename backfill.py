@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# backfill.py
+# Recompute summaries for every stored run from its raw posts_collected snapshot.
+#
+#   python backfill.py [--root divar_results] [--district NAME] [--workers N] [--force] [--store]
+#
+# Results are written next to the original as summary_<ts>.v<LOGIC_VERSION>.json.
+# A run is skipped when its newest summary already has the current logic
+# version and settings and was built from the same raw input (sha256).
+# With --store, runs missing from the listing store (a local cache, not
+# committed; see listing_store.py) are parsed into it as well, rebuilt or not,
+# except runs older than the store's retention (compaction.store_cutoff). The
+# latest run of each district is always added, so tiles, the spatial index and
+# lifecycle have something to serve even when every recorded run is older.
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import aggregation
+import compaction
+import listing_store
+import rolling
+import summary_index
+from parsing import parse_posts
+from runs import RESULTS_ROOT, Run, iter_runs, summary_version
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_json(path: Optional[Path]) -> Optional[Dict[str, Any]]:
+    if not path:
+        return None
+    try:
+        # path may be an archive.ArchivedFile of a compacted run
+        return json.loads(path.read_bytes())
+    except Exception:
+        return None
+
+
+def is_up_to_date(run: Run, input_sha: str, settings: Dict[str, Any]) -> bool:
+    current = load_json(run.best_summary()) or {}
+    if current.get("logic") != aggregation.logic_fingerprint(settings):
+        return False
+    backfill = current.get("backfill")
+    # summaries written live by the scraper have no input hash; their logic match is enough
+    return backfill is None or backfill.get("input_sha256") == input_sha
+
+
+def store_run(district: str, run_dir: str, raw_file: str) -> Dict[str, Any]:
+    # worker: only add an up-to-date run to the listing store
+    run = Run(district, Path(run_dir))
+    rows = parse_posts(listing_store.iter_raw_posts(Path(raw_file)))
+    listing_store.append_run(district, run.ts, rows)
+    return {"run": f"{district}/{run.ts}", "out": "listing store", "posts": len(rows)}
+
+
+def rebuild_run(district: str, run_dir: str, raw_file: str, input_sha: str,
+                settings: Dict[str, Any], write_store: bool) -> Dict[str, Any]:
+    # runs in a worker process: everything it needs is passed in by value
+    run = Run(district, Path(run_dir))
+    original = load_json(run.original_summary()) or {}
+    rows = parse_posts(listing_store.iter_raw_posts(Path(raw_file)))
+
+    if write_store and not any(listing_store.iter_parts_for_run(district, run.ts)):
+        listing_store.append_run(district, run.ts, rows)
+
+    columns = {k: np.array([np.nan if r[k] is None else r[k] for r in rows], dtype=np.float64)
+               for k in ("price_per_sqm", "age", "size", "lat", "lon")}
+    min_requested = original.get("requested_size_min", 60)
+    max_requested = original.get("requested_size_max", 150)
+    summary = {
+        "timestamp": original.get("timestamp") or time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.strptime(run.ts, listing_store.RUN_TS_FORMAT)),
+        "requested_size_min": min_requested,
+        "requested_size_max": max_requested,
+        **aggregation.summarise(columns, min_requested, max_requested, settings),
+    }
+    for key in ("complete", "range_outcomes", "lifecycle"):
+        if key in original:
+            summary[key] = original[key]
+    summary["backfill"] = {
+        "input": Path(raw_file).name,
+        "input_sha256": input_sha,
+        "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    out = run.path / f"summary_{run.ts}.v{aggregation.LOGIC_VERSION}.json"
+    tmp = out.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, out)
+    return {"run": f"{district}/{run.ts}", "out": str(out), "posts": len(rows)}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Recompute summaries from stored raw posts.")
+    ap.add_argument("--root", default=str(RESULTS_ROOT))
+    ap.add_argument("--district", default=None, help="only this district folder")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--force", action="store_true", help="rebuild even if up to date")
+    ap.add_argument("--store", action="store_true", help="also add missing runs to the listing store")
+    args = ap.parse_args(argv)
+
+    started = time.perf_counter()
+    jobs, store_jobs, skipped, no_raw = [], [], 0, 0
+    stale = []  # runs left on older logic: nothing to rebuild them from
+    settings_by_district: Dict[str, Dict[str, Any]] = {}
+    cutoff = compaction.store_cutoff()
+    keep_from = cutoff.strftime(listing_store.RUN_TS_FORMAT)
+    runs = list(iter_runs(Path(args.root), args.district))
+    latest = {run.district: run.ts for run in runs if run.archived is None and run.raw_posts_file() is not None}
+    too_old = 0  # runs with raw posts left out of the store by its retention
+    archived = 0
+    for run in runs:
+        if run.archived is not None:
+            # compacted runs are read-only; `compaction.py --unpack` restores them for a rebuild
+            archived += 1
+            continue
+        raw = run.raw_posts_file()
+        if raw is None:
+            no_raw += 1
+            best = run.best_summary()
+            if best is not None and summary_version(best) < aggregation.LOGIC_VERSION:
+                stale.append(f"{run.district}/{run.ts} (v{summary_version(best)})")
+            continue
+        settings = settings_by_district.setdefault(run.district, aggregation.resolve_settings(run.district))
+        sha = file_sha256(raw)
+        to_store = args.store and (run.ts >= keep_from or run.ts == latest[run.district])
+        if args.store and not to_store:
+            too_old += 1
+        if not args.force and is_up_to_date(run, sha, settings):
+            skipped += 1
+            if to_store and not any(listing_store.iter_parts_for_run(run.district, run.ts)):
+                store_jobs.append((run.district, str(run.path), str(raw)))
+            continue
+        jobs.append((run.district, str(run.path), str(raw), sha, settings, to_store))
+
+    print(f"{len(jobs)} runs to rebuild, {skipped} up to date, {no_raw} without raw posts, {archived} archived"
+          + (f", {len(store_jobs)} to add to the listing store" if args.store else ""))
+    if too_old:
+        print(f"{too_old} runs older than the listing store's retention (before {cutoff}, "
+              f"retention.store_keep_days) not added to it; the latest run of each district is added regardless")
+    if stale:
+        print(f"{len(stale)} runs keep an older summary logic (no raw posts to rebuild from): " + ", ".join(stale))
+    failed = 0
+    if jobs or store_jobs:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {pool.submit(rebuild_run, *job): job for job in jobs}
+            futures.update({pool.submit(store_run, *job): job for job in store_jobs})
+            for f in as_completed(futures):
+                try:
+                    r = f.result()
+                    print(f"  {r['run']}: {r['posts']} posts -> {Path(r['out']).name}")
+                except Exception as e:
+                    failed += 1
+                    print(f"  {futures[f][0]}/{Path(futures[f][1]).name}: FAILED {e!r}")
+        # rewritten summaries invalidate the districts' rolling aggregates
+        for district in sorted({job[0] for job in jobs}):  # store-only runs change no summary
+            summary_index.refresh(district, Path(args.root))
+            rolling.update(district, Path(args.root), rebuild=True)
+    print(f"Done in {time.perf_counter() - started:.2f}s ({failed} failed)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
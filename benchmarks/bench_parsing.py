@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# benchmarks/bench_parsing.py
+# Parsing throughput over the recorded posts_collected snapshots.
+# Run from the repo root: python benchmarks/bench_parsing.py [--repeat N] [--root divar_results]
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import parsing  # noqa: E402
+from listing_store import iter_raw_posts  # noqa: E402
+
+
+# ------------------------
+# The pre-parsing.py implementation, kept only as a speed/correctness baseline
+# ------------------------
+_PERSIAN_DIGITS = "۰۱۲۳۴۵۶۷۸۹"
+
+
+def legacy_persian_to_int(num_str: str) -> Optional[int]:
+    if not isinstance(num_str, str):
+        return None
+    s = num_str
+    for p, e in zip(_PERSIAN_DIGITS, "0123456789"):
+        s = s.replace(p, e)
+    s = re.sub(r"[^\d]", "", s)
+    return int(s) if s else None
+
+
+def legacy_parse_price(text: str) -> Optional[int]:
+    if not text:
+        return None
+    n = legacy_persian_to_int(text)
+    if n is not None:
+        if "میلیارد" in text:
+            n *= 1_000_000_000
+        elif "میلیون" in text:
+            n *= 1_000_000
+    return n
+
+
+def legacy_parse_post(post):
+    card = post.get("map_post_card", {}) or {}
+    ppm = total = None
+    for field in card.get("price_fields", []):
+        if "متری" in field.get("title", ""):
+            ppm = legacy_parse_price(field.get("value", ""))
+        elif "قیمت" in field.get("title", ""):
+            total = legacy_parse_price(field.get("value", ""))
+    age = size = None
+    for chip in card.get("chips", []):
+        title = chip.get("title", "")
+        if age is None and "نوساز" in title:
+            age = 0
+        elif age is None and "سال" in title:
+            m = re.search(r"[\d۰-۹]+", title)
+            age = legacy_persian_to_int(m.group()) if m else None
+        if size is None and any(k in title for k in ["متراژ", "مساحت", "متر", "زیربنا", "زیر بنا"]):
+            size = legacy_persian_to_int(title)
+    return {"price_per_sqm": ppm, "total_price": total, "age": age, "size": size}
+
+
+def find_snapshots(root: Path):
+    patterns = ("posts_collected_*.json", "posts_collected_*.json.gz", "posts_collected_*.jsonl", "posts_collected_*.jsonl.gz")
+    files = []
+    for pattern in patterns:
+        files.extend(root.glob(f"*/*/{pattern}"))
+    return sorted(files)
+
+
+def timed(fn, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        parsing.clear_caches()
+        t = time.perf_counter()
+        for page in pages:
+            fn(page)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--root", default="divar_results")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    files = find_snapshots(Path(args.root))
+    if not files:
+        print(f"No posts_collected snapshots under {args.root}")
+        return 1
+    t = time.perf_counter()
+    pages = [list(iter_raw_posts(f)) for f in files]
+    load_s = time.perf_counter() - t
+    n = sum(len(p) for p in pages)
+    print(f"{len(files)} snapshots, {n} posts (load {load_s:.2f}s)")
+
+    new_s = timed(parsing.parse_posts, pages, args.repeat)
+    old_s = timed(lambda page: [legacy_parse_post(p) for p in page], pages, args.repeat)
+    print(f"parsing.parse_posts : {n / new_s:12,.0f} posts/s  ({new_s * 1000:.1f} ms)")
+    print(f"legacy closures     : {n / old_s:12,.0f} posts/s  ({old_s * 1000:.1f} ms)")
+    print(f"speed-up            : {old_s / new_s:.2f}x")
+
+    # where the two implementations disagree (mostly decimal prices like ۱۰٫۷ میلیارد)
+    diffs = {}
+    for page in pages:
+        for post in page:
+            new, old = parsing.parse_post(post), legacy_parse_post(post)
+            for k, v in old.items():
+                if new[k] != v:
+                    diffs[k] = diffs.get(k, 0) + 1
+    print(f"fields that differ from legacy: {diffs or 'none'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# benchmarks/bench_pipeline.py
+# Offline end-to-end benchmark over the recorded divar_results corpus.
+# Run from the repo root:
+#
+#   python benchmarks/bench_pipeline.py [--repeat N] [--stages parse,summarise,...]
+#                                       [--out benchmarks/results] [--compare OLD.json]
+#
+# Stages: load (raw snapshots), parse, summarise, load_all_summaries (cold and
+# warm index), make_chart, render_report, and fetch (scraper.extractor against
+# a local stand-in for the viewport API serving the corpus). Each stage reports
+# its best/median wall time, throughput and tracemalloc peak; the results are
+# written as JSON so two commits can be compared with --compare.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+import aggregation  # noqa: E402
+import parsing  # noqa: E402
+import summary_index  # noqa: E402
+from listing_store import iter_raw_posts  # noqa: E402
+from runs import iter_runs, list_districts  # noqa: E402
+
+STAGES = ("load", "parse", "summarise", "load_all_summaries", "make_chart", "render_report", "fetch")
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+
+# ------------------------
+# Measurement
+# ------------------------
+def measure(name: str, fn: Callable[[], Any], items: int, unit: str, repeat: int) -> Dict[str, Any]:
+    # timings come from untraced repeats; one extra traced call gives the peak
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = min(times)
+    result = {
+        "stage": name,
+        "items": items,
+        "unit": unit,
+        "best_s": round(best, 6),
+        "median_s": round(statistics.median(times), 6),
+        "per_s": round(items / best, 1) if best > 0 else None,
+        "peak_mb": round(peak / 2 ** 20, 2),
+    }
+    print(f"{name:<24} {result['best_s'] * 1000:10.1f} ms  {result['per_s'] or 0:12,.0f} {unit}/s"
+          f"  peak {result['peak_mb']:8.1f} MB")
+    return result
+
+
+def latest_raw(district: str) -> Optional[Path]:
+    for run in sorted(iter_runs(ROOT / "divar_results", district), key=lambda r: r.ts, reverse=True):
+        raw = run.raw_posts_file()
+        if raw:
+            return raw
+    return None
+
+
+# ------------------------
+# Local stand-in for api.divar.ir/v8/mapview/viewport
+# ------------------------
+class ViewportHandler(BaseHTTPRequestHandler):
+    # serves the corpus posts whose parsed size and pin fall inside the request's
+    # size range and bbox, in one page (like the real viewport endpoint)
+    posts: List[Dict[str, Any]] = []
+    sizes: np.ndarray = np.empty(0)
+    lons: np.ndarray = np.empty(0)
+    lats: np.ndarray = np.empty(0)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        data = body["search_data"]["form_data"]["data"]
+        nr = data["size"]["number_range"]
+        lo, hi = float(nr.get("minimum", 0)), float(nr.get("maximum", 1e9))
+        mask = (self.sizes >= lo) & (self.sizes <= hi)
+        if "bbox" in data:
+            x0, y0, x1, y1 = [v["value"] for v in data["bbox"]["repeated_float"]["value"]]
+            mask &= (self.lons >= x0) & (self.lons <= x1) & (self.lats >= y0) & (self.lats <= y1)
+        out = json.dumps({"map_posts": [self.posts[i] for i in np.flatnonzero(mask)]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(posts: List[Dict[str, Any]]) -> ThreadingHTTPServer:
+    rows = parsing.parse_posts(posts)
+    ViewportHandler.posts = posts
+    ViewportHandler.sizes = np.array([np.nan if r["size"] is None else r["size"] for r in rows], dtype=float)
+    ViewportHandler.lons = np.array([np.nan if r["lon"] is None else r["lon"] for r in rows], dtype=float)
+    ViewportHandler.lats = np.array([np.nan if r["lat"] is None else r["lat"] for r in rows], dtype=float)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ViewportHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_fetch(district: str, repeat: int) -> Dict[str, Any]:
+    # the whole scraper path (planning, pooled client, sink, store, summary),
+    # with the rate limiter opened up so the stage measures our own overhead
+    import planner
+    import scraper
+    from divar_client import DivarClient
+    from ratelimit import TokenBucket
+
+    raw = latest_raw(district)
+    posts = list(iter_raw_posts(raw))
+    server = start_server(posts)
+    job = [j for j in planner.build_requests(ROOT / "config.yaml") if j.path == district][0]
+    job.url = f"http://127.0.0.1:{server.server_address[1]}/v8/mapview/viewport"
+    latencies = []
+    home = os.getcwd()
+
+    def run():
+        client = DivarClient(TokenBucket(10_000, 100))
+        post_json = client.post_json
+
+        def timed_post(*args):
+            t = time.perf_counter()
+            try:
+                return post_json(*args)
+            finally:
+                latencies.append(time.perf_counter() - t)
+
+        client.post_json = timed_post
+        # extractor writes ./divar_results and ./listing_store: keep them out of the repo
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                scraper.extractor(job, client=client)
+            finally:
+                os.chdir(home)
+                client.close()
+
+    try:
+        devnull = open(os.devnull, "w")
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure("fetch", run, len(posts), "listings", repeat)
+        finally:
+            sys.stdout = stdout
+            devnull.close()
+    finally:
+        server.shutdown()
+    lat = np.array(latencies) * 1000
+    result.update(requests=len(latencies) // (repeat + 1),
+                  request_p50_ms=round(float(np.percentile(lat, 50)), 2),
+                  request_p95_ms=round(float(np.percentile(lat, 95)), 2))
+    print(f"{'fetch':<24} {result['best_s'] * 1000:10.1f} ms  {result['per_s']:12,.0f} listings/s"
+          f"  ({result['requests']} requests, p50 {result['request_p50_ms']} ms, p95 {result['request_p95_ms']} ms)")
+    return result
+
+
+# ------------------------
+# Suite
+# ------------------------
+def run_suite(stages: List[str], repeat: int, fetch_district: str) -> List[Dict[str, Any]]:
+    results = []
+    districts = list_districts(ROOT / "divar_results")
+    snapshots = [raw for raw in (run.raw_posts_file() for run in iter_runs(ROOT / "divar_results")) if raw]
+    pages = [list(iter_raw_posts(f)) for f in snapshots]
+    n_posts = sum(len(p) for p in pages)
+    print(f"corpus: {len(districts)} districts, {len(snapshots)} snapshots, {n_posts} posts\n")
+
+    if "load" in stages:
+        results.append(measure("load", lambda: [list(iter_raw_posts(f)) for f in snapshots], n_posts, "listings", repeat))
+
+    def parse_all():
+        parsing.clear_caches()
+        return [parsing.parse_posts(p) for p in pages]
+
+    if "parse" in stages:
+        results.append(measure("parse", parse_all, n_posts, "listings", repeat))
+
+    if "summarise" in stages:
+        settings = aggregation.resolve_settings(None)
+        cols = [{k: np.array([np.nan if r[k] is None else r[k] for r in rows], dtype=np.float64)
+                 for k in ("price_per_sqm", "age", "size")} for rows in parse_all()]
+        results.append(measure("summarise", lambda: [aggregation.summarise(c, 60, 150, settings) for c in cols],
+                               n_posts, "listings", repeat))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_file = Path(tmp) / "summary_index.sqlite"
+        root = ROOT / "divar_results"
+
+        def load_all(cold: bool):
+            if cold:
+                index_file.unlink(missing_ok=True)
+            return {d: summary_index.load_district(d, root, index_file) for d in districts}
+
+        summaries = load_all(True)
+        n_runs = sum(len(s) for s in summaries.values())
+        if "load_all_summaries" in stages:
+            results.append(measure("load_all_summaries_cold", lambda: load_all(True), n_runs, "runs", repeat))
+            results.append(measure("load_all_summaries_warm", lambda: load_all(False), n_runs, "runs", repeat))
+
+        import mainDraw
+
+        if "make_chart" in stages:
+            results.append(measure("make_chart", lambda: [mainDraw.make_chart(s) for s in summaries.values()],
+                                   n_runs, "runs", repeat))
+
+        if "render_report" in stages:
+            site = Path(tmp) / "site"
+            site.mkdir()
+            mainDraw.plotly_asset(site)  # one-off 4.8 MB copy, not part of a report render
+
+            def render_all():
+                stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+                try:
+                    for d, s in summaries.items():
+                        mainDraw.render_report(s, site / f"{d}_report.html", ROOT / "templates", "template.html")
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+
+            results.append(measure("render_report", render_all, len(summaries), "reports", repeat))
+
+    if "fetch" in stages:
+        results.append(bench_fetch(fetch_district, repeat))
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], old_file: Path, threshold: float) -> int:
+    old = {r["stage"]: r for r in json.loads(Path(old_file).read_text(encoding="utf-8"))["stages"]}
+    print(f"\ncompared with {old_file}:")
+    regressions = 0
+    for r in results:
+        prev = old.get(r["stage"])
+        if not prev or not prev["best_s"]:
+            continue
+        ratio = r["best_s"] / prev["best_s"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"  {r['stage']:<24} {prev['best_s'] * 1000:9.1f} -> {r['best_s'] * 1000:9.1f} ms  ({ratio:5.2f}x)"
+              f"  peak {prev['peak_mb']:.1f} -> {r['peak_mb']:.1f} MB{flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark.")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {', '.join(STAGES)}")
+    ap.add_argument("--fetch-district", default="ShahrAra")
+    ap.add_argument("--out", default=str(RESULTS_DIR), help="directory for the JSON results ('' to skip)")
+    ap.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=1.25, help="slow-down ratio reported as a regression")
+    args = ap.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        ap.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    results = run_suite(stages, args.repeat, args.fetch_district)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "stages": results,
+    }
+    if args.out:
+        out_dir = Path(args.out)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out = out_dir / f"bench_{time.strftime('%Y%m%d_%H%M%S')}_{report['meta']['commit'] or 'nogit'}.json"
+        out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nresults written to {out}")
+    if args.compare:
+        return 1 if compare(results, Path(args.compare), args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# benchmarks/bench_sketch.py
+# Accuracy and speed of the per-cell quantile sketches (sketch.py) over the
+# recorded divar_results corpus: every run with raw posts is sketched on its
+# own, then the sketches are merged per district and across all districts and
+# compared with the exact statistics of the pooled prices.
+# Run from the repo root: python benchmarks/bench_sketch.py [--compression N] [--root divar_results]
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+import sketch  # noqa: E402
+from listing_store import iter_raw_posts  # noqa: E402
+from parsing import parse_posts  # noqa: E402
+from runs import iter_runs, list_districts  # noqa: E402
+
+
+def run_prices(root: Path) -> Dict[str, List[np.ndarray]]:
+    # district -> parsed prices per run (the overall sketch of summarise: no floor / ceiling cut)
+    out: Dict[str, List[np.ndarray]] = {}
+    for district in list_districts(root):
+        for run in iter_runs(root, district):
+            raw = run.raw_posts_file()
+            if raw is None:
+                continue
+            rows = parse_posts(iter_raw_posts(raw))
+            price = np.array([np.nan if r["price_per_sqm"] is None else r["price_per_sqm"] for r in rows])
+            price = price[~np.isnan(price)]
+            if len(price):
+                out.setdefault(district, []).append(price)
+    return out
+
+
+def exact(prices: np.ndarray, trim: float) -> Dict[str, float]:
+    p25, p50, p75 = np.percentile(prices, [25, 50, 75])
+    srt = np.sort(prices)
+    cut = trim * len(srt)
+    # same fractional-trim definition as QuantileSketch.trimmed_mean
+    w = np.clip(np.minimum(np.arange(1, len(srt) + 1), len(srt) - cut) - np.maximum(np.arange(len(srt)), cut), 0, None)
+    return {"median": p50, "p25": p25, "p75": p75, "iqr": p75 - p25, "trimmed_mean": (w * srt).sum() / w.sum()}
+
+
+def compare(label: str, sketches: List[sketch.QuantileSketch], prices: np.ndarray, trim: float) -> float:
+    started = time.perf_counter()
+    merged = sketch.QuantileSketch.merge(sketches)
+    elapsed = time.perf_counter() - started
+    got, want = merged.stats(trim), exact(prices, trim)
+    errors = {k: abs(got[k] - v) / v * 100 for k, v in want.items()}
+    print(f"{label:45s} runs {len(sketches):3d}  listings {len(prices):6,d}  centroids {len(merged.mean):3d}  "
+          f"merge {elapsed * 1000:6.2f} ms  err % " + "  ".join(f"{k} {e:.3f}" for k, e in errors.items()))
+    return max(errors.values())
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Quantile sketch accuracy over the recorded corpus.")
+    ap.add_argument("--root", default="divar_results")
+    ap.add_argument("--compression", type=int, default=sketch.DEFAULT_COMPRESSION)
+    ap.add_argument("--trim", type=float, default=sketch.DEFAULT_TRIM)
+    args = ap.parse_args()
+
+    corpus = run_prices(Path(args.root))
+    if not corpus:
+        print("no runs with raw posts")
+        return 1
+    started = time.perf_counter()
+    per_district = {d: [sketch.QuantileSketch.from_values(p, args.compression) for p in runs]
+                    for d, runs in corpus.items()}
+    n_runs = sum(len(v) for v in per_district.values())
+    build = time.perf_counter() - started
+    size = sum(len(json.dumps(s.to_dict())) for v in per_district.values() for s in v)
+    print(f"{n_runs} run sketches built in {build * 1000:.1f} ms, {size / n_runs:.0f} bytes of JSON each")
+
+    worst = 0.0
+    for district, sketches in per_district.items():
+        worst = max(worst, compare(district, sketches, np.concatenate(corpus[district]), args.trim))
+    everything = [s for v in per_district.values() for s in v]
+    worst = max(worst, compare("all districts", everything,
+                               np.concatenate([p for v in corpus.values() for p in v]), args.trim))
+    print(f"worst relative error {worst:.3f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# compaction.py
+# Retention for the working tree:
+#   - run folders are packed into one archive per district per month
+#     (archive.py) and removed, so divar_results stops growing by a folder of
+#     JSON files per run. A month is packed once ("sealed"), when the whole
+#     month is older than `retention.compact_after_days` (config.yaml), so the
+#     committed pack is written one time instead of growing every day.
+#   - listing store partitions older than `retention.store_keep_days` are
+#     deleted (listing_store.prune); the store is a gitignored cache.
+# Archived runs stay readable through runs.iter_runs / Run (summaries, raw
+# posts), so summary_index, backfill's loaders and the benchmarks keep seeing
+# the full history. This bounds the checkout, not git history: every packed
+# file is still in earlier commits.
+#
+#   python compaction.py [--older-than DAYS] [--store-keep-days DAYS] [--district NAME] [--dry-run]
+#   python compaction.py --unpack --district NAME --month YYYY-MM   restore folders (e.g. for backfill)
+#
+# A folder is only deleted after every file was read back from the pack and
+# matched its sha256. A month holding the newest run of a district is not
+# sealed (planner.py and partitioner.py read that run from disk).
+
+import argparse
+import os
+import shutil
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import listing_store
+from archive import MonthArchive, archives, month_of
+from config import load_config
+from runs import RESULTS_ROOT, iter_runs, list_districts
+
+DEFAULT_AGE_DAYS = 60
+DEFAULT_STORE_KEEP_DAYS = 180
+
+
+def _retention() -> Dict[str, Any]:
+    return load_config().get("retention", {}) or {}
+
+
+def compact_after_days() -> int:
+    return int(_retention().get("compact_after_days", DEFAULT_AGE_DAYS))
+
+
+def store_keep_days() -> int:
+    return int(_retention().get("store_keep_days", DEFAULT_STORE_KEEP_DAYS))
+
+
+def store_cutoff(now: Optional[datetime] = None, keep_days: Optional[int] = None) -> date:
+    # listing store partitions before this day are pruned (and not re-added by backfill --store)
+    days = store_keep_days() if keep_days is None else keep_days
+    return ((now or datetime.now()) - timedelta(days=days)).date()
+
+
+def _next_month(month: str) -> str:
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}{mon % 12 + 1:02d}01_000000"
+
+
+def compact(root: Path = RESULTS_ROOT, older_than_days: Optional[int] = None,
+            districts: Optional[List[str]] = None, now: Optional[datetime] = None,
+            dry_run: bool = False) -> Dict[str, Any]:
+    root = Path(root)
+    days = compact_after_days() if older_than_days is None else older_than_days
+    cutoff = ((now or datetime.now()) - timedelta(days=days)).strftime("%Y%m%d_%H%M%S")
+    stats = {"runs": 0, "files": 0, "bytes_in": 0, "bytes_out": 0, "failed": []}
+
+    for district in districts or list_districts(root):
+        on_disk = [r for r in iter_runs(root, district) if r.archived is None]
+        if not on_disk:
+            continue
+        by_month: Dict[str, list] = {}
+        for run in on_disk:
+            by_month.setdefault(month_of(run.ts), []).append(run)
+        newest_month = month_of(on_disk[-1].ts)
+
+        for month, month_runs in sorted(by_month.items()):
+            # seal whole months only: every run of it past the cutoff, and not the
+            # district's newest run (kept on disk whatever its age)
+            if _next_month(month) > cutoff or month == newest_month:
+                continue
+            files = {f"{run.ts}/{name}": path for run in month_runs for name, path in sorted(run.files().items())}
+            size = sum(p.stat().st_size for p in files.values())
+            if dry_run:
+                print(f"[{district}] {month}: would pack {len(month_runs)} runs ({len(files)} files, {size:,} bytes)")
+                stats["runs"] += len(month_runs)
+                stats["files"] += len(files)
+                stats["bytes_in"] += size
+                continue
+            pack = MonthArchive(root / district, month)
+            if pack.members:
+                # a sealed month gained run folders (e.g. unpacked and not repacked)
+                print(f"[{district}] {month}: adding {len(month_runs)} runs to the sealed archive")
+            appended = pack.add(files)
+            for run in month_runs:
+                keys = [k for k in files if k.startswith(f"{run.ts}/")]
+                if not pack.verify(keys):
+                    print(f"[{district}] {run.ts}: archive verification failed, keeping the folder")
+                    stats["failed"].append(f"{district}/{run.ts}")
+                    continue
+                shutil.rmtree(run.path)
+                stats["runs"] += 1
+            stats["files"] += len(files)
+            stats["bytes_in"] += size
+            stats["bytes_out"] += appended
+            print(f"[{district}] {month}: packed {len(month_runs)} runs, {size:,} -> {appended:,} bytes "
+                  f"-> {pack.pack}")
+    return stats
+
+
+def prune_store(districts: List[str], keep_days: Optional[int] = None, now: Optional[datetime] = None,
+                store_root: Path = listing_store.STORE_ROOT, dry_run: bool = False) -> Dict[str, int]:
+    before = store_cutoff(now, keep_days)
+    total = {"partitions": 0, "files": 0, "bytes": 0}
+    for district in districts:
+        stats = listing_store.prune(district, before, store_root, dry_run)
+        if stats["partitions"]:
+            print(f"[{district}] listing store: {'would drop' if dry_run else 'dropped'} {stats['partitions']} "
+                  f"days before {before} ({stats['files']} files, {stats['bytes']:,} bytes)")
+        for k in total:
+            total[k] += stats[k]
+    return total
+
+
+def unpack(root: Path, district: str, month: str) -> int:
+    # write an archive's runs back out as folders and drop the archive
+    root = Path(root)
+    month_archive = MonthArchive(root / district, month)
+    if not month_archive.members:
+        print(f"[{district}] no archive for {month}")
+        return 0
+    restored = 0
+    for ts, files in month_archive.runs().items():
+        run_dir = root / district / ts
+        run_dir.mkdir(parents=True, exist_ok=True)
+        for name, f in files.items():
+            dest = run_dir / name
+            if not dest.exists():
+                dest.write_bytes(f.read_bytes())
+                os.utime(dest, ns=(f.stat().st_mtime_ns, f.stat().st_mtime_ns))
+        restored += 1
+    month_archive.pack.unlink()
+    month_archive.index_file.unlink()
+    if not any(month_archive.pack.parent.iterdir()):
+        month_archive.pack.parent.rmdir()
+    print(f"[{district}] {month}: restored {restored} runs")
+    return restored
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Pack old run folders into monthly archives.")
+    ap.add_argument("--root", default=str(RESULTS_ROOT))
+    ap.add_argument("--district", action="append", help="only these districts (repeatable)")
+    ap.add_argument("--older-than", type=int, default=None, metavar="DAYS",
+                    help=f"age in days (default: config.yaml retention.compact_after_days, else {DEFAULT_AGE_DAYS})")
+    ap.add_argument("--store-keep-days", type=int, default=None, metavar="DAYS",
+                    help="listing store days kept (default: config.yaml retention.store_keep_days, "
+                         f"else {DEFAULT_STORE_KEEP_DAYS})")
+    ap.add_argument("--store", default=str(listing_store.STORE_ROOT), help="listing store root")
+    ap.add_argument("--dry-run", action="store_true", help="only report what would be packed")
+    ap.add_argument("--unpack", action="store_true", help="restore the --month archive of each --district")
+    ap.add_argument("--month", default=None, help="YYYY-MM (with --unpack)")
+    args = ap.parse_args(argv)
+
+    root = Path(args.root)
+    if args.unpack:
+        if not args.district or not args.month:
+            ap.error("--unpack needs --district and --month")
+        for district in args.district:
+            unpack(root, district, args.month)
+        return 0
+
+    started = time.perf_counter()
+    stats = compact(root, args.older_than, args.district, dry_run=args.dry_run)
+    if stats["runs"] or args.dry_run:
+        ratio = f", {stats['bytes_in'] / stats['bytes_out']:.1f}x smaller" if stats["bytes_out"] else ""
+        print(f"compaction: {stats['runs']} runs, {stats['files']} files, {stats['bytes_in']:,} bytes{ratio} "
+              f"in {time.perf_counter() - started:.2f}s")
+    print(f"archives: {sum(len(archives(root / d)) for d in list_districts(root))} monthly packs")
+    pruned = prune_store(args.district or list_districts(root), args.store_keep_days,
+                         store_root=Path(args.store), dry_run=args.dry_run)
+    if pruned["partitions"]:
+        print(f"listing store: {pruned['files']} files, {pruned['bytes']:,} bytes "
+              f"{'would be ' if args.dry_run else ''}removed")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
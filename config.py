@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# config.py
+# Loads config.yaml and resolves per-district settings on top of the defaults.
+
+import copy
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+CONFIG_FILE = Path("config.yaml")
+
+
+@lru_cache(maxsize=4)
+def load_config(path: Path = CONFIG_FILE) -> Dict[str, Any]:
+    import yaml
+
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    out = copy.deepcopy(base)
+    for k, v in (override or {}).items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = _merge(out[k], v)
+        else:
+            out[k] = copy.deepcopy(v)
+    return out
+
+
+def find_district(path_name: str, config_path: Path = CONFIG_FILE) -> Optional[Dict[str, Any]]:
+    # districts are matched on their output folder name ("path"), falling back to district_name
+    for d in load_config(config_path).get("districts", []) or []:
+        if path_name in (d.get("path"), d.get("district_name")):
+            return d
+    return None
+
+
+def districts(config_path: Path = CONFIG_FILE) -> List[Dict[str, Any]]:
+    # every `districts:` entry merged over the top-level `district_defaults:`
+    cfg = load_config(config_path)
+    defaults = cfg.get("district_defaults", {}) or {}
+    return [_merge(defaults, d) for d in cfg.get("districts", []) or []]
+
+
+def summary_settings(path_name: Optional[str] = None, config_path: Path = CONFIG_FILE) -> Dict[str, Any]:
+    # top-level `summary:` block, overridden by the district's own `summary:` block
+    cfg = load_config(config_path)
+    settings = cfg.get("summary", {}) or {}
+    district = find_district(path_name, config_path) if path_name else None
+    if district and district.get("summary"):
+        settings = _merge(settings, district["summary"])
+    return settings
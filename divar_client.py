@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# divar_client.py
+# Pooled HTTP client for the Divar viewport API: keep-alive sessions,
+# bounded retries with jittered exponential backoff and Retry-After support.
+
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import TokenBucket, RequestBudget
+from http_cache import HttpCache
+import metrics
+
+# ------------------------
+# Config: tweak as needed
+# ------------------------
+REQUEST_TIMEOUT = 30
+RATE_LIMIT_SLEEP = 0.12  # min spacing between requests when no burst is left
+REQUESTS_PER_SECOND = 1 / RATE_LIMIT_SLEEP  # shared across all workers
+REQUEST_BURST = 2
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # seconds, doubled per attempt
+BACKOFF_CAP = 20.0
+RETRY_AFTER_CAP = 60.0  # never honour a Retry-After longer than this
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+POOL_SIZE = 20  # keep-alive connections kept per host
+
+
+class FetchError(Exception):
+    # raised once every retry for a request has been spent
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    # "full jitter": uniform in [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class DivarClient:
+    # One client (and therefore one connection pool, limiter and budget)
+    # is meant to be shared by every district and every range of a run.
+    # With a cache, hits skip the limiter and the budget entirely (see http_cache.py).
+    def __init__(self, limiter: Optional[TokenBucket] = None, budget: Optional[RequestBudget] = None,
+                 max_retries: int = MAX_RETRIES, timeout: float = REQUEST_TIMEOUT, pool_size: int = POOL_SIZE,
+                 cache: Optional[HttpCache] = None):
+        self.cache = cache if cache is not None and cache.enabled else None
+        self.limiter = limiter or TokenBucket(REQUESTS_PER_SECOND, REQUEST_BURST)
+        self.budget = budget or RequestBudget()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post_json(self, url: str, headers: dict, payload: dict) -> Any:
+        if self.cache:
+            hit, body = self.cache.get(url, payload)  # raises CacheMiss in replay mode
+            if self.cache.mode != "record":
+                metrics.inc("http_cache_lookups_total", result="hit" if hit else "miss")
+            if hit:
+                return body
+        body = self._fetch(url, headers, payload)
+        if self.cache:
+            self.cache.put(url, payload, body)
+        return body
+
+    def _fetch(self, url: str, headers: dict, payload: dict) -> Any:
+        last_error = None
+        last_status = None
+        for attempt in range(self.max_retries + 1):
+            self.budget.take()
+            t = time.perf_counter()
+            self.limiter.acquire()
+            sent = time.perf_counter()
+            metrics.observe("ratelimit_wait_seconds", sent - t)
+            try:
+                resp = self.session.post(url, headers=headers, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error, last_status = e, None
+                delay = backoff_delay(attempt)
+                metrics.observe("http_request_seconds", time.perf_counter() - sent, status=type(e).__name__)
+                metrics.inc("http_requests_total", status=type(e).__name__)
+            else:
+                metrics.observe("http_request_seconds", time.perf_counter() - sent, status=resp.status_code)
+                metrics.inc("http_requests_total", status=resp.status_code)
+                metrics.inc("http_response_bytes_total", len(resp.content))
+                if resp.status_code not in RETRY_STATUSES:
+                    resp.raise_for_status()
+                    return resp.json()
+                last_error, last_status = f"HTTP {resp.status_code}", resp.status_code
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                delay = min(retry_after, RETRY_AFTER_CAP) if retry_after is not None else backoff_delay(attempt)
+            if attempt < self.max_retries:
+                metrics.inc("http_retries_total", reason=last_status or type(last_error).__name__)
+                print(f"  retrying in {delay:.1f}s after {last_error} (attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+        raise FetchError(f"giving up after {self.max_retries + 1} attempts: {last_error}", last_status)
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+
+def range_outcome(min_sqm: int, max_sqm: int, bbox: Optional[list] = None) -> Dict[str, Any]:
+    # per-range bookkeeping stored in the summary so incomplete runs are visible
+    return {"min": min_sqm, "max": max_sqm, "bbox": bbox, "status": "complete", "pages": 0, "posts": 0,
+            "last_page_posts": 0, "error": None}
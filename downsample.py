@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# downsample.py
+# Multi-resolution time series for the report charts.
+#
+# Every series is kept at four levels: "raw" (one point per run, reduced with
+# Largest-Triangle-Three-Buckets so the shape survives), and count-weighted
+# daily / weekly / monthly means. Each level is capped at MAX_POINTS, so the
+# data a report embeds stays roughly constant however long the history gets.
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+LEVELS = ("raw", "daily", "weekly", "monthly")
+MAX_POINTS = 1000  # per series, per level
+TARGET_POINTS = 400  # points on screen the report aims for at any zoom
+
+_DAY_MS = 86_400_000
+
+
+def ms_to_datetime(ms: float) -> datetime:
+    # inverse of build_levels' x axis (naive, like the summaries' timestamps)
+    return datetime(1970, 1, 1) + timedelta(milliseconds=ms)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    # indices of the points Largest-Triangle-Three-Buckets keeps (always the
+    # first and the last); x must be sorted and y free of NaN
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (the last point for the final bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        if nlo >= nhi:
+            nlo, nhi = n - 1, n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area)) if hi > lo else lo
+        keep[i + 1] = a
+    return keep
+
+
+def _period_start(ms: np.ndarray, level: str) -> np.ndarray:
+    days = ms // _DAY_MS
+    if level == "daily":
+        return days * _DAY_MS
+    if level == "weekly":
+        # 1970-01-01 was a Thursday; weeks start on Monday (epoch day 4)
+        return ((days - 4) // 7 * 7 + 4) * _DAY_MS
+    if level == "monthly":
+        months = days.astype("datetime64[D]").astype("datetime64[M]")
+        return months.astype("datetime64[D]").astype(np.int64) * _DAY_MS
+    raise ValueError(f"unknown level {level!r}")
+
+
+def resample(ms: np.ndarray, y: np.ndarray, w: np.ndarray, level: str):
+    # count-weighted mean of y per period; periods without a value are dropped
+    starts = _period_start(ms, level)
+    keys, inv = np.unique(starts, return_inverse=True)
+    wsum = np.bincount(inv, weights=w, minlength=len(keys))
+    ysum = np.bincount(inv, weights=y * w, minlength=len(keys))
+    ok = wsum > 0
+    return keys[ok], ysum[ok] / wsum[ok], wsum[ok]
+
+
+def build_levels(timestamps: Sequence[Any], values: Sequence[Optional[float]],
+                 counts: Optional[Sequence[float]] = None,
+                 max_points: int = MAX_POINTS) -> Dict[str, List[list]]:
+    # {level: [x_ms, y]} with x as epoch milliseconds (what plotly date axes take)
+    ms = np.array([np.datetime64(t, "ms").astype(np.int64) for t in timestamps], dtype=np.int64)
+    y = np.array([np.nan if v is None else v for v in values], dtype=float)
+    w = np.ones(len(y)) if counts is None else np.array([c or 0 for c in counts], dtype=float)
+    ok = ~np.isnan(y)
+    if counts is not None:
+        # a run whose cell has a value but no count still deserves a vote
+        w = np.where(ok & (w <= 0), 1.0, w)
+    ms, y, w = ms[ok], y[ok], w[ok]
+    order = np.argsort(ms, kind="stable")
+    ms, y, w = ms[order], y[order], w[order]
+
+    out = {}
+    for level in LEVELS:
+        if level == "raw":
+            lx, ly = ms, y
+        else:
+            lx, ly, _ = resample(ms, y, w, level)
+        idx = lttb(lx, ly, max_points)
+        out[level] = [lx[idx].tolist(), np.rint(ly[idx]).astype(np.int64).tolist()]
+    return out
+
+
+def pick_level(levels: Dict[str, List[list]], start_ms: Optional[float] = None,
+               end_ms: Optional[float] = None, target: int = TARGET_POINTS) -> str:
+    # finest level showing at most `target` points in [start, end]
+    # (the whole series when no range is given); mirrors the report's JS
+    for level in LEVELS:
+        x = np.asarray(levels[level][0], dtype=float)
+        if start_ms is not None:
+            x = x[(x >= start_ms) & (x <= end_ms)]
+        if len(x) <= target:
+            return level
+    return LEVELS[-1]
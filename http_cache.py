@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# http_cache.py
+# Record/replay cache for viewport API responses, used by DivarClient.
+#
+# Entries are keyed by sha256(url + canonical JSON payload) and stored gzipped
+# under .cache/http/<k[:2]>/<key>.json.gz. Modes:
+#   off     no cache (default)
+#   cache   serve entries younger than the TTL, fetch and store the rest
+#           (a same-day rerun only pays for what failed the first time)
+#   record  always fetch, store every successful response
+#   replay  serve stored responses of any age and never touch the network;
+#           a miss raises CacheMiss. A replay reproduces a run only if the
+#           scraper asks the same questions, i.e. from the same divar_results
+#           history (partitioner.plan_cells merges ranges based on it).
+# On close(), "cache" mode drops entries older than the TTL, and both writing
+# modes drop the oldest entries beyond MAX_BYTES.
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+CACHE_DIR = Path(".cache/http")
+MODES = ("off", "cache", "record", "replay")
+DEFAULT_MODE = os.environ.get("DIVAR_HTTP_CACHE", "off")
+TTL_SECONDS = 12 * 3600  # how long "cache" mode trusts an entry
+MAX_BYTES = 512 * 1024 * 1024
+
+
+class CacheMiss(Exception):
+    # replay mode was asked for a request that was never recorded
+    pass
+
+
+def cache_key(url: str, payload: Any) -> str:
+    # header-independent; key order and whitespace in the payload don't matter
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"POST {url}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+class HttpCache:
+    def __init__(self, mode: str = DEFAULT_MODE, root: Path = CACHE_DIR, ttl: float = TTL_SECONDS,
+                 max_bytes: int = MAX_BYTES):
+        if mode not in MODES:
+            raise ValueError(f"unknown cache mode {mode!r} (expected one of {', '.join(MODES)})")
+        self.mode = mode
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json.gz"
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, url: str, payload: Any) -> Tuple[bool, Any]:
+        # (hit, body); record mode never reads
+        if self.mode in ("off", "record"):
+            return False, None
+        path = self.path_for(cache_key(url, payload))
+        try:
+            if self.mode == "cache" and time.time() - path.stat().st_mtime > self.ttl:
+                raise FileNotFoundError(path)
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError, EOFError):
+            self._count("misses")
+            if self.mode == "replay":
+                raise CacheMiss(f"no recorded response for {url} ({path.name})")
+            return False, None
+        self._count("hits")
+        return True, entry["body"]
+
+    def put(self, url: str, payload: Any, body: Any):
+        if self.mode in ("off", "replay"):
+            return
+        path = self.path_for(cache_key(url, payload))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"url": url, "payload": payload, "stored": time.time(), "body": body}
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(entry, f, ensure_ascii=False, separators=(",", ":"))
+        tmp.replace(path)
+        self._count("stored")
+
+    def evict(self) -> int:
+        # drop expired entries, then the oldest until the cache fits in max_bytes
+        if not self.root.exists():
+            return 0
+        now = time.time()
+        entries = []
+        removed = 0
+        for path in self.root.glob("*/*.json.gz"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            # recordings are fixtures: only "cache" mode expires entries by age
+            if self.mode == "cache" and now - st.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        with self._lock:
+            self.stats["evicted"] += removed
+        return removed
+
+    def close(self) -> Dict[str, int]:
+        if self.mode in ("cache", "record"):
+            self.evict()
+        if self.enabled:
+            print(f"http cache ({self.mode}): {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                  f"{self.stats['stored']} stored, {self.stats['evicted']} evicted")
+        return dict(self.stats)
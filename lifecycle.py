@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# lifecycle.py
+# Persistent per-listing lifecycle index across runs, keyed by (district, post token),
+# fed from the listing store (listing_store parts) one run at a time, oldest first.
+#
+#   listings  one row per token: first_seen, removed (run that no longer saw it) and
+#             last_seen (run before that), current price / attributes, cut counters
+#   changes   delta-encoded history: a (token, ts, field, value) row only when a
+#             field's value differs from the token's previous one (first sighting included)
+#   runs      per-run counts: seen / new / removed / returned / price cuts / raises,
+#             active listings and median days on market
+#
+# Ingesting a run writes only new, changed and removed listings: an active listing's
+# last_seen is implicitly the district's latest run. Runs that did not complete
+# (summary "complete": false) never mark listings as removed, since a failed size
+# range would look like a mass delisting.
+#
+#   python lifecycle.py --district Mehran            ingest new runs, print per-run stats
+#   python lifecycle.py --district Mehran --token X  price / attribute history of one listing
+
+import argparse
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+import listing_store
+from runs import RESULTS_ROOT, Run
+
+INDEX_FILE = Path(".cache/lifecycle.sqlite")
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+FIELDS = ["price_per_sqm", "total_price", "size", "age", "rooms"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    district      TEXT NOT NULL,
+    token         TEXT NOT NULL,
+    first_seen    TEXT NOT NULL,
+    last_seen     TEXT,
+    removed       TEXT,
+    price_per_sqm REAL,
+    total_price   REAL,
+    size          REAL,
+    age           REAL,
+    rooms         REAL,
+    first_price   REAL,
+    price_cuts    INTEGER NOT NULL DEFAULT 0,
+    price_raises  INTEGER NOT NULL DEFAULT 0,
+    relisted      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (district, token)
+);
+CREATE INDEX IF NOT EXISTS listings_active ON listings (district, removed);
+CREATE TABLE IF NOT EXISTS changes (
+    district TEXT NOT NULL,
+    token    TEXT NOT NULL,
+    ts       TEXT NOT NULL,
+    field    TEXT NOT NULL,
+    value    REAL
+);
+CREATE INDEX IF NOT EXISTS changes_by_token ON changes (district, token, ts);
+CREATE INDEX IF NOT EXISTS changes_by_run ON changes (district, ts);
+CREATE TABLE IF NOT EXISTS runs (
+    district     TEXT NOT NULL,
+    run_ts       TEXT NOT NULL,
+    timestamp    TEXT NOT NULL,
+    complete     INTEGER NOT NULL,
+    seen         INTEGER NOT NULL,
+    new          INTEGER NOT NULL,
+    removed      INTEGER NOT NULL,
+    returned     INTEGER NOT NULL,
+    price_cuts   INTEGER NOT NULL,
+    price_raises INTEGER NOT NULL,
+    active       INTEGER NOT NULL,
+    median_dom_active  REAL,
+    median_dom_removed REAL,
+    PRIMARY KEY (district, run_ts)
+);
+"""
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def connect(index_file: Path = INDEX_FILE) -> Iterator[sqlite3.Connection]:
+    # one short-lived connection per call; commits on success, always closes
+    index_file = Path(index_file)
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(index_file, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _timestamp(run_ts: str) -> str:
+    return datetime.strptime(run_ts, listing_store.RUN_TS_FORMAT).strftime(TS_FORMAT)
+
+
+def _days(a: str, b: str) -> float:
+    return (datetime.strptime(b, TS_FORMAT) - datetime.strptime(a, TS_FORMAT)).total_seconds() / 86400
+
+
+def _value(v) -> Optional[float]:
+    return None if v is None or v != v else float(v)
+
+
+def _median(values: List[float]) -> Optional[float]:
+    return round(float(np.median(values)), 2) if values else None
+
+
+def _run_complete(district: str, run_ts: str, root: Path) -> bool:
+    # same rule as planner.run_succeeded: only an explicit "complete": false counts
+    summary = Run(district, Path(root) / district / run_ts).best_summary()
+    if summary is None:
+        return True
+    try:
+        return json.loads(summary.read_bytes()).get("complete") is not False
+    except (OSError, ValueError):
+        return True
+
+
+def read_run(district: str, run_ts: str, store_root: Path = listing_store.STORE_ROOT) -> Dict[str, Dict[str, Optional[float]]]:
+    # token -> field values of one run (a token seen twice keeps its last row)
+    out: Dict[str, Dict[str, Optional[float]]] = {}
+    for part in listing_store.iter_parts_for_run(district, run_ts, store_root):
+        cols = listing_store.read_part(part, ["token"] + FIELDS)
+        values = zip(*(cols[f].tolist() for f in FIELDS))
+        for token, row in zip(cols["token"].tolist(), values):
+            if token is not None:
+                out[token] = {f: _value(v) for f, v in zip(FIELDS, row)}
+    return out
+
+
+def ingest_run(conn: sqlite3.Connection, district: str, run_ts: str,
+               rows: Dict[str, Dict[str, Optional[float]]], complete: bool = True) -> Dict[str, Any]:
+    # diff one run against the district's active listings; run_ts must be newer
+    # than every run already ingested for the district
+    ts = _timestamp(run_ts)
+    prev = conn.execute("SELECT MAX(timestamp) FROM runs WHERE district = ?", (district,)).fetchone()[0]
+    active = {r[0]: r[1:] for r in conn.execute(
+        f"SELECT token, first_seen, {', '.join(FIELDS)} FROM listings WHERE district = ? AND removed IS NULL",
+        (district,))}
+
+    changes, updates, inserts, returned = [], [], [], []
+    cuts = raises = 0
+    unseen = [t for t in rows if t not in active]
+    known_removed = set()
+    for i in range(0, len(unseen), 500):
+        chunk = unseen[i:i + 500]
+        known_removed.update(r[0] for r in conn.execute(
+            f"SELECT token FROM listings WHERE district = ? AND token IN ({','.join('?' * len(chunk))})",
+            [district, *chunk]))
+
+    for token, row in rows.items():
+        if token in active:
+            old = dict(zip(FIELDS, active[token][1:]))
+        elif token in known_removed:
+            old = dict(zip(FIELDS, conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM listings WHERE district = ? AND token = ?",
+                (district, token)).fetchone()))
+            returned.append(token)
+        else:
+            inserts.append((district, token, ts, *(row[f] for f in FIELDS), row["price_per_sqm"]))
+            changes.extend((district, token, ts, f, row[f]) for f in FIELDS if row[f] is not None)
+            continue
+        changed = {f: row[f] for f in FIELDS if row[f] is not None and row[f] != old[f]}
+        if not changed and token not in known_removed:
+            continue
+        cut = raise_ = 0
+        if "price_per_sqm" in changed and old["price_per_sqm"] is not None:
+            cut, raise_ = int(row["price_per_sqm"] < old["price_per_sqm"]), int(row["price_per_sqm"] > old["price_per_sqm"])
+        cuts, raises = cuts + cut, raises + raise_
+        changes.extend((district, token, ts, f, v) for f, v in changed.items())
+        merged = {**old, **changed}
+        back = int(token in known_removed)
+        updates.append((*(merged[f] for f in FIELDS), cut, raise_, back, back, back, district, token))
+
+    removed_dom = []
+    removed = []
+    if complete and prev is not None:
+        for token, (first_seen, *_) in active.items():
+            if token not in rows:
+                removed.append((prev, ts, district, token))
+                removed_dom.append(_days(first_seen, prev))
+
+    conn.executemany(
+        f"INSERT INTO listings (district, token, first_seen, {', '.join(FIELDS)}, first_price) "
+        f"VALUES (?, ?, ?, {', '.join('?' * len(FIELDS))}, ?)", inserts)
+    conn.executemany(
+        f"UPDATE listings SET {', '.join(f'{f} = ?' for f in FIELDS)}, price_cuts = price_cuts + ?, "
+        "price_raises = price_raises + ?, relisted = relisted + ?, "
+        "removed = CASE WHEN ? THEN NULL ELSE removed END, last_seen = CASE WHEN ? THEN NULL ELSE last_seen END "
+        "WHERE district = ? AND token = ?", updates)
+    conn.executemany("UPDATE listings SET last_seen = ?, removed = ? WHERE district = ? AND token = ?", removed)
+    conn.executemany("INSERT INTO changes (district, token, ts, field, value) VALUES (?, ?, ?, ?, ?)", changes)
+
+    still_active = [first for t, (first, *_) in active.items() if t in rows or not complete or prev is None]
+    active_dom = [_days(first, ts) for first in still_active] + [0.0] * len(inserts)
+    stats = {
+        "run_ts": run_ts,
+        "timestamp": ts,
+        "complete": complete,
+        "seen": len(rows),
+        "new": len(inserts),
+        "removed": len(removed),
+        "returned": len(returned),
+        "price_cuts": cuts,
+        "price_raises": raises,
+        "active": len(still_active) + len(inserts) + len(returned),
+        "median_dom_active": _median(active_dom),
+        "median_dom_removed": _median(removed_dom),
+    }
+    conn.execute(
+        "INSERT OR REPLACE INTO runs (district, run_ts, timestamp, complete, seen, new, removed, returned, "
+        "price_cuts, price_raises, active, median_dom_active, median_dom_removed) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (district, *(stats[k] for k in ("run_ts", "timestamp")), int(complete),
+         *(stats[k] for k in ("seen", "new", "removed", "returned", "price_cuts", "price_raises", "active",
+                              "median_dom_active", "median_dom_removed"))))
+    return stats
+
+
+def update(district: str, root: Path = RESULTS_ROOT, store_root: Path = listing_store.STORE_ROOT,
+           index_file: Path = INDEX_FILE, complete: Optional[Dict[str, bool]] = None) -> List[Dict[str, Any]]:
+    # ingest every stored run not yet in the index, oldest first; a stored run older
+    # than the newest ingested one (e.g. backfill --store) rebuilds the district.
+    # complete: run_ts -> completeness for runs whose summary isn't written yet
+    stored = sorted({p.stem[5:20] for p in listing_store.iter_parts(district, root=store_root)})
+    with _lock, connect(index_file) as conn:
+        done = {r[0] for r in conn.execute("SELECT run_ts FROM runs WHERE district = ?", (district,))}
+        pending = [ts for ts in stored if ts not in done]
+        if pending and done and pending[0] < max(done):
+            print(f"[{district}] lifecycle: older run {pending[0]} appeared, rebuilding the index")
+            for table in ("listings", "changes", "runs"):
+                conn.execute(f"DELETE FROM {table} WHERE district = ?", (district,))
+            pending = stored
+        out = []
+        for run_ts in pending:
+            ok = (complete or {}).get(run_ts)
+            ok = _run_complete(district, run_ts, root) if ok is None else ok
+            out.append(ingest_run(conn, district, run_ts, read_run(district, run_ts, store_root), ok))
+    return out
+
+
+# ------------------------
+# Queries
+# ------------------------
+def run_stats(district: str, index_file: Path = INDEX_FILE) -> List[Dict[str, Any]]:
+    with _lock, connect(index_file) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM runs WHERE district = ? ORDER BY run_ts", (district,)).fetchall()
+    return [{k: r[k] for k in r.keys() if k != "district"} for r in rows]
+
+
+def days_on_market(district: str, since: Optional[str] = None, until: Optional[str] = None,
+                   index_file: Path = INDEX_FILE) -> np.ndarray:
+    # days between first and last sighting of listings removed in [since, until] (TS_FORMAT)
+    query = ("SELECT julianday(last_seen) - julianday(first_seen) FROM listings "
+             "WHERE district = ? AND removed IS NOT NULL")
+    args: list = [district]
+    if since:
+        query += " AND removed >= ?"
+        args.append(since)
+    if until:
+        query += " AND removed <= ?"
+        args.append(until)
+    with _lock, connect(index_file) as conn:
+        return np.array([r[0] for r in conn.execute(query, args)], dtype=np.float64)
+
+
+def history(district: str, token: str, index_file: Path = INDEX_FILE) -> List[Dict[str, Any]]:
+    # one entry per run in which any field changed: {"ts": ..., field: new value, ...}
+    with _lock, connect(index_file) as conn:
+        rows = conn.execute("SELECT ts, field, value FROM changes WHERE district = ? AND token = ? ORDER BY ts",
+                            (district, token)).fetchall()
+    out: List[Dict[str, Any]] = []
+    for ts, field, value in rows:
+        if not out or out[-1]["ts"] != ts:
+            out.append({"ts": ts})
+        out[-1][field] = value
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Listing lifecycle index: days on market, price changes.")
+    ap.add_argument("--district", required=True)
+    ap.add_argument("--root", default=str(RESULTS_ROOT))
+    ap.add_argument("--store", default=str(listing_store.STORE_ROOT))
+    ap.add_argument("--token", default=None, help="print this listing's history instead")
+    args = ap.parse_args(argv)
+
+    new_runs = update(args.district, Path(args.root), Path(args.store))
+    if args.token:
+        for entry in history(args.district, args.token):
+            print(entry)
+        return 0
+    print(f"ingested {len(new_runs)} new runs")
+    for s in run_stats(args.district):
+        print(f"{s['run_ts']}: seen {s['seen']}, new {s['new']}, removed {s['removed']}, "
+              f"returned {s['returned']}, cuts {s['price_cuts']}, raises {s['price_raises']}, "
+              f"active {s['active']}, median DOM {s['median_dom_active']} / removed {s['median_dom_removed']}")
+    dom = days_on_market(args.district)
+    if len(dom):
+        p25, p50, p75 = np.percentile(dom, [25, 50, 75])
+        print(f"days on market of {len(dom)} removed listings: median {p50:.1f} (IQR {p25:.1f}–{p75:.1f})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# listing_store.py
+# Append-only columnar store for parsed listings.
+#
+# Layout: <root>/<district>/date=YYYY-MM-DD/part_<run ts>[_<chunk>].npz
+# Each part is (a chunk of) one scrape run, saved with np.savez_compressed. Numeric columns
+# are float64 (NaN = missing), sort_date is datetime64[s], and string columns
+# are dictionary-encoded as int32 codes plus a "<col>__dict" array.
+#
+# The store is a local cache derived from the committed raw posts snapshots
+# (posts_collected_<ts>.jsonl.gz), so it is gitignored rather than committed
+# twice: CI keeps it in the actions cache next to .cache/, and
+# `python backfill.py --store` re-adds any run missing from it. Partitions
+# older than `retention.store_keep_days` (config.yaml) are dropped by
+# compaction.py via prune(), except each district's newest day; their raw
+# posts stay in the run folders and monthly archives.
+
+import gzip
+import io
+import json
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# ------------------------
+# Config: tweak as needed
+# ------------------------
+STORE_ROOT = Path("./listing_store")
+SAVE_RAW_POSTS = True  # keep the raw API posts next to the summary as JSON Lines
+RAW_POSTS_GZIP = True  # gzip the JSON Lines file (flushed per page, so a crash keeps what was fetched)
+CHUNK_ROWS = 5000  # rows buffered in memory before a part file is written
+
+NUMERIC_COLUMNS = ["price_per_sqm", "total_price", "size", "age", "rooms", "lat", "lon"]
+STRING_COLUMNS = ["token"]
+DATE_COLUMNS = ["sort_date"]
+COLUMNS = STRING_COLUMNS + NUMERIC_COLUMNS + DATE_COLUMNS
+
+RUN_TS_FORMAT = "%Y%m%d_%H%M%S"
+
+
+def _dict_encode(values: List[Optional[str]]):
+    uniques: Dict[str, int] = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        if v is None:
+            codes[i] = -1
+        else:
+            codes[i] = uniques.setdefault(v, len(uniques))
+    return codes, np.array(list(uniques), dtype=str)
+
+
+def _dict_decode(codes: np.ndarray, dictionary: np.ndarray) -> np.ndarray:
+    out = np.empty(len(codes), dtype=object)
+    mask = codes >= 0
+    out[mask] = dictionary[codes[mask]] if len(dictionary) else None
+    out[~mask] = None
+    return out
+
+
+def _to_datetime64(values: List[Any]) -> np.ndarray:
+    out = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[s]")
+    for i, v in enumerate(values):
+        if v:
+            try:
+                out[i] = np.datetime64(str(v).rstrip("Z")[:19], "s")
+            except ValueError:
+                pass
+    return out
+
+
+def partition_dir(district: str, day: date, root: Path = STORE_ROOT) -> Path:
+    return Path(root) / district / f"date={day.isoformat()}"
+
+
+def append_run(district: str, run_ts: str, rows: List[Dict[str, Any]], root: Path = STORE_ROOT,
+               chunk: Optional[int] = None) -> Path:
+    # run_ts uses the run folder format (YYYYmmdd_HHMMSS); one part file per run (or per chunk)
+    day = datetime.strptime(run_ts, RUN_TS_FORMAT).date()
+    out_dir = partition_dir(district, day, root)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    arrays: Dict[str, np.ndarray] = {"__run_ts": np.array(run_ts)}
+    for col in STRING_COLUMNS:
+        codes, dictionary = _dict_encode([r.get(col) for r in rows])
+        arrays[col] = codes
+        arrays[f"{col}__dict"] = dictionary
+    for col in NUMERIC_COLUMNS:
+        arrays[col] = np.array([np.nan if r.get(col) is None else r[col] for r in rows], dtype=np.float64)
+    for col in DATE_COLUMNS:
+        arrays[col] = _to_datetime64([r.get(col) for r in rows])
+
+    name = f"part_{run_ts}" if chunk is None else f"part_{run_ts}_{chunk:04d}"
+    final = out_dir / f"{name}.npz"
+    tmp = out_dir / f".{name}.tmp.npz"
+    np.savez_compressed(tmp, **arrays)
+    os.replace(tmp, final)  # readers never see a half-written part
+    return final
+
+
+class ListingWriter:
+    # Buffers parsed rows and writes a part every CHUNK_ROWS rows,
+    # so memory stays bounded however many listings a run returns.
+    def __init__(self, district: str, run_ts: str, root: Path = STORE_ROOT, chunk_rows: int = CHUNK_ROWS):
+        self.district = district
+        self.run_ts = run_ts
+        self.root = root
+        self.chunk_rows = chunk_rows
+        self.rows: List[Dict[str, Any]] = []
+        self.parts: List[Path] = []
+        self.total = 0
+
+    def add(self, row: Dict[str, Any]):
+        self.rows.append(row)
+        self.total += 1
+        if len(self.rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.parts.append(append_run(self.district, self.run_ts, self.rows, self.root, chunk=len(self.parts)))
+            self.rows = []
+
+    def close(self) -> List[Path]:
+        self.flush()
+        return self.parts
+
+
+def iter_parts(district: str, start: Optional[date] = None, end: Optional[date] = None,
+               root: Path = STORE_ROOT) -> Iterator[Path]:
+    base = Path(root) / district
+    if not base.exists():
+        return
+    for part_dir in sorted(base.glob("date=*")):
+        day = date.fromisoformat(part_dir.name.split("=", 1)[1])
+        if (start and day < start) or (end and day > end):
+            continue
+        yield from sorted(part_dir.glob("part_*.npz"))
+
+
+def iter_parts_for_run(district: str, run_ts: str, root: Path = STORE_ROOT) -> Iterator[Path]:
+    day = datetime.strptime(run_ts, RUN_TS_FORMAT).date()
+    part_dir = partition_dir(district, day, root)
+    yield from sorted(part_dir.glob(f"part_{run_ts}.npz"))
+    yield from sorted(part_dir.glob(f"part_{run_ts}_*.npz"))
+
+
+def prune(district: str, before: date, root: Path = STORE_ROOT, dry_run: bool = False) -> Dict[str, int]:
+    # drop whole date partitions older than `before`; returns files / bytes removed.
+    # The newest partition always stays: it holds the district's latest run
+    # (tiles, spatial index, lifecycle), however old that run is.
+    stats = {"partitions": 0, "files": 0, "bytes": 0}
+    base = Path(root) / district
+    if not base.exists():
+        return stats
+    for part_dir in sorted(base.glob("date=*"))[:-1]:
+        if date.fromisoformat(part_dir.name.split("=", 1)[1]) >= before:
+            break
+        files = list(part_dir.iterdir())
+        stats["partitions"] += 1
+        stats["files"] += len(files)
+        stats["bytes"] += sum(f.stat().st_size for f in files)
+        if not dry_run:
+            for f in files:
+                f.unlink()
+            part_dir.rmdir()
+    return stats
+
+
+def read_part(path: Path, columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    wanted = list(columns) if columns else COLUMNS
+    with np.load(path, allow_pickle=False) as z:
+        out = {}
+        for col in wanted:
+            if col in STRING_COLUMNS:
+                out[col] = _dict_decode(z[col], z[f"{col}__dict"])
+            else:
+                out[col] = z[col]
+        run_ts = str(z["__run_ts"])
+    out["run_ts"] = np.full(len(next(iter(out.values()))) if out else 0, run_ts, dtype=object)
+    return out
+
+
+def read_listings(district: str, start: Optional[date] = None, end: Optional[date] = None,
+                  columns: Optional[Iterable[str]] = None, root: Path = STORE_ROOT):
+    # returns a pandas DataFrame with one row per listing per run
+    import pandas as pd
+
+    frames = [pd.DataFrame(read_part(p, columns)) for p in iter_parts(district, start, end, root)]
+    if not frames:
+        return pd.DataFrame(columns=(list(columns) if columns else COLUMNS) + ["run_ts"])
+    return pd.concat(frames, ignore_index=True)
+
+
+# ------------------------
+# Optional raw payloads
+# ------------------------
+def open_raw_posts(path: Path):
+    # append-mode JSON Lines writer; caller writes one post per line
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "at", encoding="utf-8")
+    return open(path, "a", encoding="utf-8")
+
+
+def iter_raw_posts(path: Path) -> Iterator[Any]:
+    # Streams posts from any snapshot format: the old posts_collected_*.json
+    # arrays, .json.gz arrays and .jsonl(.gz) files. A truncated gzip tail
+    # (crash mid-run) ends the stream instead of raising. path may also be an
+    # archive.ArchivedFile (a run compacted by compaction.py).
+    if not hasattr(path, "open"):
+        path = Path(path)
+    is_lines = path.name.endswith((".jsonl", ".jsonl.gz"))
+    with path.open("rb") as raw, (gzip.open(raw, "rt", encoding="utf-8") if path.suffix == ".gz"
+                                  else io.TextIOWrapper(raw, encoding="utf-8")) as f:
+        if not is_lines:
+            yield from json.load(f)
+            return
+        try:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        return  # half-written last line
+        except (EOFError, OSError):
+            return
+
+
+def load_raw_posts(path: Path) -> List[Any]:
+    return list(iter_raw_posts(path))
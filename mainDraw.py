@@ -1,37 +1,40 @@
 #!/usr/bin/env python3
 #from flask import Flask, render_template
-import plotly.graph_objs as go
-import plotly.offline as pyo
-import plotly.graph_objs as go
 from pathlib import Path
-from datetime import datetime
-import json, os
-import threading,schedule, time
-from jinja2 import Environment, FileSystemLoader
-import runner
+from functools import lru_cache
+import json
+import hashlib, shutil
+import summary_index
+import metrics
+
+# plotly, jinja2, schedule and runner (-> scraper -> requests) are imported
+# inside the functions that use them, so render-only runs don't pay for the
+# scraper and `python main.py --help` doesn't pay for plotly.
 
 
 #app = Flask(__name__)
 
 
 def load_all_summaries(DIVAR_RESULTS):
-    summaries = []
-    for folder in sorted(DIVAR_RESULTS.iterdir()):
-        if not folder.is_dir():
-            continue
-        for file in folder.glob("summary_*.json"):
-            try:
-                with open(file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    ts = datetime.strptime(data["timestamp"], "%Y-%m-%d %H:%M:%S")
-                    summaries.append((ts, data))
-            except Exception:
-                pass
-    summaries.sort(key=lambda x: x[0])
-    return summaries
-
-def make_chart(summaries):
+    # DIVAR_RESULTS is one district folder (divar_results/<district>); the
+    # persistent index only re-reads summaries that changed since the last call
+    DIVAR_RESULTS = Path(DIVAR_RESULTS)
+    return summary_index.load_district(DIVAR_RESULTS.name, DIVAR_RESULTS.parent)
+
+# bump whenever make_chart/render_report output changes, so site_builder.py
+# knows every existing report is stale
+CHART_VERSION = 8
+
+AGE_COLORS = ["#4caf50", "#2196f3", "#9c27b0", "#f44336", "#ffeb3b", "#00bcd4"]
+SIZE_COLORS = ["#8bc34a", "#03a9f4", "#e91e63", "#ff5722", "#cddc39"]
+
+
+def make_chart(summaries, rolling=None):
+    # rolling: rolling.load() output (timestamp -> series -> ma7/ma30/...), drawn as smoothed trends
+    import plotly.graph_objs as go
     import plotly.subplots as sp
+    import plotly.io as pio
+    import downsample
 
     timestamps = [s[0] for s in summaries]
 
@@ -39,40 +42,51 @@ def make_chart(summaries):
     overall = [s[1]["overall_avg_price_per_sqm"] for s in summaries]
     overall_count = [s[1]["valid_for_averages"] for s in summaries]
 
-    def get_age_data(interval):
-        return [s[1]["age_intervals"][interval]["avg"] for s in summaries], [
-            s[1]["age_intervals"][interval]["count"] for s in summaries
-        ]
+    # Bucket labels come from the summaries themselves (config.yaml `summary.buckets`),
+    # so a new bucket layout shows up without code edits. Older runs lacking a label get gaps.
+    def labels_of(key):
+        labels = []
+        for s in summaries:
+            for label in s[1].get(key, {}):
+                if label not in labels:
+                    labels.append(label)
+        return labels
+
+    def get_series(key, interval):
+        cells = [s[1].get(key, {}).get(interval) for s in summaries]
+        return [c["avg"] if c else None for c in cells], [c["count"] if c else 0 for c in cells]
 
-    def get_size_data(interval):
-        return [s[1]["size_intervals"][interval]["avg"] for s in summaries], [
-            s[1]["size_intervals"][interval]["count"] for s in summaries
-        ]
+    # Every trace is kept at raw/daily/weekly/monthly resolution; the figure starts
+    # at the finest level that fits the whole history and static/report.js swaps levels on zoom.
+    levels = []
 
-    age0_4, cnt0_4 = get_age_data("0-4")
-    age5_9, cnt5_9 = get_age_data("5-9")
-    age10_14, cnt10_14 = get_age_data("10-14")
-    age15_20, cnt15_20 = get_age_data("15-20")
+    def series(values, counts=None):
+        lv = downsample.build_levels(timestamps, values, counts)
+        levels.append(lv)
+        return lv
 
-    size_small, cnt_small = get_size_data("<80")
-    size_mid, cnt_mid = get_size_data("80-120")
-    size_large, cnt_large = get_size_data(">120")
+    def xy(lv):
+        return dict(x=[downsample.ms_to_datetime(t) for t in lv[level][0]], y=lv[level][1])
 
-    # Create a subplot layout: 2 rows, 1 column
+    level = downsample.pick_level(series(overall, overall_count))
+
+    # Create a subplot layout: 2 rows, 1 column, plus a market activity row once
+    # runs carry listing lifecycle counts (lifecycle.py)
+    activity = any("lifecycle" in s[1] for s in summaries)
     fig = sp.make_subplots(
-        rows=2,
+        rows=3 if activity else 2,
         cols=1,
         shared_xaxes=True,
-        vertical_spacing=0.1,
-        row_heights=[0.7, 0.3],
-        subplot_titles=("Average Price per m² Over Time", "Number of Listings Over Time"),
+        vertical_spacing=0.08 if activity else 0.1,
+        row_heights=[0.55, 0.2, 0.25] if activity else [0.7, 0.3],
+        subplot_titles=("Average Price per m² Over Time", "Number of Listings Over Time")
+        + (("Market Activity per Run",) if activity else ()),
     )
 
     # --- Chart 1: Price per sqm lines ---
     fig.add_trace(
         go.Scatter(
-            x=timestamps,
-            y=overall,
+            **xy(levels[0]),
             mode="lines+markers",
             name=f"Overall Avg ({overall_count[-1]})",
             line=dict(width=3, color="#ff9800"),
@@ -80,85 +94,63 @@ def make_chart(summaries):
         ),
         row=1, col=1
     )
-    fig.add_trace(
-        go.Scatter(
-            x=timestamps,
-            y=age0_4,
-            mode="lines+markers",
-            name=f"Age 0–4 ({cnt0_4[-1]})",
-            line=dict(color="#4caf50"),
-            legendgroup="price",
-        ),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Scatter(
-            x=timestamps,
-            y=age5_9,
-            mode="lines+markers",
-            name=f"Age 5–9 ({cnt5_9[-1]})",
-            line=dict(color="#2196f3"),
-            legendgroup="price",
-        ),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Scatter(
-            x=timestamps,
-            y=age10_14,
-            mode="lines+markers",
-            name=f"Age 10–14 ({cnt10_14[-1]})",
-            line=dict(color="#9c27b0"),
-            legendgroup="price",
-        ),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Scatter(
-            x=timestamps,
-            y=age15_20,
-            mode="lines+markers",
-            name=f"Age 15–20 ({cnt15_20[-1]})",
-            line=dict(color="#f44336"),
-            legendgroup="price",
-        ),
-        row=1, col=1
-    )
+    for i, label in enumerate(labels_of("age_intervals")):
+        values, counts = get_series("age_intervals", label)
+        fig.add_trace(
+            go.Scatter(
+                **xy(series(values, counts)),
+                mode="lines+markers",
+                name=f"Age {label.replace('-', '–')} ({counts[-1]})",
+                line=dict(color=AGE_COLORS[i % len(AGE_COLORS)]),
+                legendgroup="price",
+            ),
+            row=1, col=1
+        )
+
+    # --- Smoothed trends (rolling.py): 7 / 30 day moving averages ---
+    if rolling:
+        keys = [ts.strftime("%Y-%m-%d %H:%M:%S") for ts in timestamps]
+
+        def smoothed(name, stat):
+            return [(rolling.get(k, {}).get(name) or {}).get(stat) for k in keys]
+
+        for stat, label, width in (("ma7", "7-day", 2), ("ma30", "30-day", 3)):
+            fig.add_trace(
+                go.Scatter(
+                    **xy(series(smoothed("overall", stat))),
+                    mode="lines",
+                    name=f"Overall {label} Avg",
+                    line=dict(width=width, color="#ffe0b2" if stat == "ma7" else "#ffffff", dash="dash"),
+                    legendgroup="trend",
+                ),
+                row=1, col=1
+            )
+        for i, label in enumerate(labels_of("age_intervals")):
+            fig.add_trace(
+                go.Scatter(
+                    **xy(series(smoothed(f"age:{label}", "ma7"))),
+                    mode="lines",
+                    name=f"Age {label.replace('-', '–')} 7-day Avg",
+                    line=dict(color=AGE_COLORS[i % len(AGE_COLORS)], dash="dash"),
+                    legendgroup="trend",
+                    visible="legendonly",
+                ),
+                row=1, col=1
+            )
 
     # --- Add size-based lines ---
-    fig.add_trace(
-        go.Scatter(
-            x=timestamps,
-            y=size_small,
-            mode="lines+markers",
-            name=f"Size <80m² ({cnt_small[-1]})",
-            line=dict(color="#8bc34a", dash="dot"),
-            legendgroup="size",
-        ),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Scatter(
-            x=timestamps,
-            y=size_mid,
-            mode="lines+markers",
-            name=f"Size 80–120m² ({cnt_mid[-1]})",
-            line=dict(color="#03a9f4", dash="dot"),
-            legendgroup="size",
-        ),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Scatter(
-            x=timestamps,
-            y=size_large,
-            mode="lines+markers",
-            name=f"Size >120m² ({cnt_large[-1]})",
-            line=dict(color="#e91e63", dash="dot"),
-            legendgroup="size",
-        ),
-        row=1, col=1
-    )
+    for i, label in enumerate(labels_of("size_intervals")):
+        values, counts = get_series("size_intervals", label)
+        fig.add_trace(
+            go.Scatter(
+                **xy(series(values, counts)),
+                mode="lines+markers",
+                name=f"Size {label.replace('-', '–')}m² ({counts[-1]})",
+                line=dict(color=SIZE_COLORS[i % len(SIZE_COLORS)], dash="dot"),
+                legendgroup="size",
+            ),
+            row=1, col=1
+        )
 
     # --- Chart 2: Listing volume bars ---
     total_posts = [s[1]["total_posts"] for s in summaries]
@@ -166,8 +158,7 @@ def make_chart(summaries):
 
     fig.add_trace(
         go.Bar(
-            x=timestamps,
-            y=total_posts,
+            **xy(series(total_posts)),
             name="Total Listings",
             marker_color="rgba(100, 149, 237, 0.7)",
             legendgroup="volume",
@@ -176,8 +167,7 @@ def make_chart(summaries):
     )
     fig.add_trace(
         go.Bar(
-            x=timestamps,
-            y=valid_posts,
+            **xy(series(valid_posts)),
             name="Valid Listings (for averages)",
             marker_color="rgba(255, 152, 0, 0.7)",
             legendgroup="volume",
@@ -185,19 +175,84 @@ def make_chart(summaries):
         row=2, col=1
     )
 
+    # --- Chart 3: New / removed listings and price cuts (lifecycle.py) ---
+    if activity:
+        def lifecycle_series(key):
+            return [s[1]["lifecycle"][key] if "lifecycle" in s[1] else None for s in summaries]
+
+        for key, name, color in (("new", "New Listings", "rgba(105, 240, 174, 0.7)"),
+                                 ("removed", "Removed Listings", "rgba(255, 82, 82, 0.7)")):
+            fig.add_trace(go.Bar(**xy(series(lifecycle_series(key))), name=name, marker_color=color,
+                                 legendgroup="activity"), row=3, col=1)
+        fig.add_trace(
+            go.Scatter(
+                **xy(series(lifecycle_series("price_cuts"))),
+                mode="lines+markers",
+                name="Price Cuts",
+                line=dict(color="#ffeb3b"),
+                legendgroup="activity",
+            ),
+            row=3, col=1
+        )
+
     fig.update_layout(
         template="plotly_dark",
         hovermode="x unified",
-        height=850,
+        height=1100 if activity else 850,
         margin=dict(t=80, b=40, l=60, r=20),
         legend_tracegroupgap=160,
     )
 
     fig.update_yaxes(title_text="Price (IRR)", row=1, col=1)
     fig.update_yaxes(title_text="Listings", row=2, col=1)
-    fig.update_xaxes(title_text="Timestamp", row=2, col=1)
+    if activity:
+        fig.update_yaxes(title_text="Listings", row=3, col=1)
+    fig.update_xaxes(title_text="Timestamp", row=3 if activity else 2, col=1)
 
-    return pyo.plot(fig, include_plotlyjs=False, output_type="div")
+    # the chart's data bundle: plotly figure JSON plus every resolution level,
+    # and the price heatmap when the latest runs carry a spatial grid
+    payload = {"level": level, "target": downsample.TARGET_POINTS, "traces": levels}
+    bundle = '{"figure":%s,"levels":%s' % (pio.to_json(fig, pretty=False), json.dumps(payload, separators=(",", ":")))
+    heatmap = make_heatmap(summaries)
+    if heatmap is not None:
+        bundle += ',"map":%s' % pio.to_json(heatmap, pretty=False)
+    return bundle + "}"
+
+
+def make_heatmap(summaries):
+    # price per m² of the latest run with a spatial grid (summary["grid"], see
+    # spatial.py), one square per grid cell on a map; None without any grid
+    import plotly.graph_objs as go
+    import spatial
+
+    ts, latest = next(((ts, s) for ts, s in reversed(summaries) if (s.get("grid") or {}).get("ix")), (None, None))
+    if latest is None:
+        return None
+    grid = latest["grid"]
+    ids = [f"{ix}:{iy}" for ix, iy in zip(grid["ix"], grid["iy"])]
+    lons = [(ix + 0.5) * grid["cell_m"] / spatial.M_PER_DEG_LON for ix in grid["ix"]]
+    lats = [(iy + 0.5) * grid["cell_m"] / spatial.M_PER_DEG_LAT for iy in grid["iy"]]
+
+    fig = go.Figure(go.Choroplethmap(
+        geojson=spatial.cell_geojson(grid),
+        locations=ids,
+        z=grid["median"],
+        customdata=list(zip(grid["count"], grid["avg"])),
+        colorscale="Turbo",
+        marker_opacity=0.6,
+        marker_line_width=0,
+        colorbar=dict(title="IRR/m²"),
+        hovertemplate="Median %{z:,} IRR/m²<br>Avg %{customdata[1]:,}<br>%{customdata[0]} listings<extra></extra>",
+    ))
+    fig.update_layout(
+        template="plotly_dark",
+        title=f"Median price per m² by {grid['cell_m']} m cell — {ts:%Y-%m-%d}",
+        map=dict(style="carto-darkmatter", center=dict(lat=sum(lats) / len(lats), lon=sum(lons) / len(lons)),
+                 zoom=13),
+        height=650,
+        margin=dict(t=60, b=20, l=20, r=20),
+    )
+    return fig
 
 
 #@app.route("/")
@@ -220,25 +275,114 @@ def make_chart(summaries):
 #    }
 
     return render_template("index.html", chart_html=chart_html, last_data=last_data)
-def render_report(summaries,OUTPUT_FILE,TEMPLATE_DIR,TEMPLATE_FILE):
+@lru_cache(maxsize=8)
+def get_template(TEMPLATE_DIR, TEMPLATE_FILE):
+    # one Jinja environment per template dir for the life of the process
+    from jinja2 import Environment, FileSystemLoader
+
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+    return env.get_template(TEMPLATE_FILE)
+
+
+# ------------------------
+# Static assets next to the reports
+# ------------------------
+STATIC_SRC = Path(__file__).resolve().parent / "static"
+REPORT_JS = "report.js"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def plotly_asset(site_dir):
+    # pinned copy of the plotly.js bundled with the installed plotly package,
+    # served from <site>/static/plotly-<version>.min.js instead of a CDN "latest"
+    from plotly.offline import get_plotlyjs_version
+    import plotly
+
+    name = f"plotly-{get_plotlyjs_version()}.min.js"
+    dest = Path(site_dir) / "static" / name
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Path(plotly.__file__).parent / "package_data" / "plotly.min.js", dest)
+    # only the pinned version is referenced; copies left by earlier plotly versions go
+    for old in dest.parent.glob("plotly-*.min.js"):
+        if old != dest:
+            old.unlink()
+    return f"static/{name}"
+
+
+def report_js_asset(site_dir):
+    # static/report.js, versioned by content so browsers refetch it only when it changes
+    src = STATIC_SRC / REPORT_JS
+    data = src.read_bytes()
+    dest = Path(site_dir) / "static" / REPORT_JS
+    if dest.resolve() != src and (not dest.exists() or dest.read_bytes() != data):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_bytes(data)
+    return f"static/{REPORT_JS}?v={content_hash(data)}"
+
+
+def write_bundle(site_dir, name, text):
+    # data/<name>.<hash>.js: the bundle JSON wrapped in a script that registers it
+    # as window.reportBundles["<name>.<hash>"], so report.js can load it with a
+    # <script> tag, which (unlike fetch) also works for reports opened from disk.
+    # Older bundles of the same name are removed.
+    key = f"{name}.{content_hash(text.encode('utf-8'))}"
+    data = ("(window.reportBundles = window.reportBundles || {})[%s] = %s;\n"
+            % (json.dumps(key), text)).encode("utf-8")
+    data_dir = Path(site_dir) / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    dest = data_dir / f"{key}.js"
+    if not dest.exists():
+        dest.write_bytes(data)
+    for old in [*data_dir.glob(f"{name}.*.js"), *data_dir.glob(f"{name}.*.json")]:
+        stem = old.name[len(name) + 1:].rsplit(".", 1)[0]
+        if old != dest and stem.isalnum():
+            old.unlink()
+    return f"data/{dest.name}"
+
+
+def render_report(summaries,OUTPUT_FILE,TEMPLATE_DIR,TEMPLATE_FILE,tiles_url=None,rolling=None):
+    # tiles_url: the district's tile manifest (tiles.export), drawn as a listings layer on the map;
+    # rolling: the district's rolling aggregates (rolling.load), drawn as smoothed trends
+    OUTPUT_FILE = Path(OUTPUT_FILE)
+    site_dir = OUTPUT_FILE.parent
     latest = summaries[-1][1]
     latest_ts = summaries[-1][0].strftime("%Y-%m-%d %H:%M")
 
+    import aggregation
+
     last_data = {
         "timestamp": latest_ts,
+        "runs": len(summaries),
+        # runs still summarised with older parsing / bucket logic (no raw posts for backfill.py)
+        "old_logic": sum(((s.get("logic") or {}).get("version") or 1) < aggregation.LOGIC_VERSION
+                         for _, s in summaries),
         "overall": latest["overall_avg_price_per_sqm"],
-        "age0_4": latest["age_intervals"]["0-4"]["avg"],
-        "age5_9": latest["age_intervals"]["5-9"]["avg"],
-        "age10_14": latest["age_intervals"]["10-14"]["avg"],
-        "age15_20": latest["age_intervals"]["15-20"]["avg"],
+        "ages": [(label.replace("-", "–"), cell["avg"]) for label, cell in latest["age_intervals"].items()],
+        "trend": ((rolling or {}).get(summaries[-1][0].strftime("%Y-%m-%d %H:%M:%S")) or {}).get("overall"),
     }
 
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template(TEMPLATE_FILE)
-    chart_html = make_chart(summaries)
-    html_title = str(OUTPUT_FILE)
-    html_title=html_title.removesuffix("_report.html")
-    html = template.render(chart_html=chart_html, last_data=last_data, report_title=html_title, tab_title=html_title)
+    template = get_template(str(TEMPLATE_DIR), str(TEMPLATE_FILE))
+    html_title = OUTPUT_FILE.name.removesuffix("_report.html")
+    # the chart itself lives in a content-hashed bundle that report.js fetches on demand
+    with metrics.timer("render_seconds", step="make_chart"):
+        chart = make_chart(summaries, rolling)
+    with metrics.timer("render_seconds", step="bundle"):
+        bundle_url = write_bundle(site_dir, html_title, chart)
+    metrics.inc("bundle_bytes_total", len(chart.encode("utf-8")))
+    with metrics.timer("render_seconds", step="template"):
+        html = template.render(
+            bundle_url=bundle_url,
+            plotly_url=plotly_asset(site_dir),
+            report_js_url=report_js_asset(site_dir),
+            tiles_url=tiles_url or "",
+            last_data=last_data,
+            report_title=html_title,
+            tab_title=html_title,
+        )
 
     OUTPUT_FILE.write_text(html, encoding="utf-8")
     print(f"Saved report to {OUTPUT_FILE.resolve()}")
@@ -249,9 +393,13 @@ def render_report(summaries,OUTPUT_FILE,TEMPLATE_DIR,TEMPLATE_FILE):
 def daily_refresh():
     print("Refreshing data at 22:00…")
     # your scraper or data updater here, e.g.:
+    import runner
+
     runner.run()
 
 def schedule_thread():
+    import schedule, time
+
     schedule.every().day.at("00:08").do(daily_refresh)
     while True:
         schedule.run_pending()
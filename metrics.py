@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# metrics.py
+# Counters and histograms for one scrape run (or one site build), tagged by
+# district / size range / phase, written as metrics_<ts>.json next to the
+# run's summary and optionally as Prometheus text (metrics_<ts>.prom).
+#
+# Code deep in the call stack (DivarClient, PostSink, mainDraw) reports
+# through the module-level inc()/observe()/timer(), which go to whatever
+# registry the current thread activated with `with metrics.use(registry, **tags)`
+# and are no-ops otherwise.
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+WRITE_PROMETHEUS = os.environ.get("DIVAR_METRICS_PROM") == "1"  # also write metrics_<ts>.prom
+PROM_PREFIX = "divar_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 200, 500, 1000)
+
+TagKey = Tuple[Tuple[str, str], ...]
+
+
+def _tag_key(tags: Dict[str, Any]) -> TagKey:
+    return tuple(sorted((k, str(v)) for k, v in tags.items() if v is not None))
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        cumulative, running = {}, 0
+        for bound, n in zip(list(self.bounds) + ["+Inf"], self.counts):
+            running += n
+            cumulative[str(bound)] = running
+        return {"count": self.count, "sum": round(self.sum, 6), "min": self.min, "max": self.max,
+                "mean": round(self.sum / self.count, 6) if self.count else None, "buckets": cumulative}
+
+
+class Metrics:
+    # Thread-safe registry; base tags (e.g. district) are added to every series.
+    def __init__(self, **base_tags):
+        self.base_tags = base_tags
+        self.started = time.time()
+        self._counters: Dict[Tuple[str, TagKey], float] = {}
+        self._histograms: Dict[Tuple[str, TagKey], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **tags):
+        key = (name, _tag_key({**self.base_tags, **tags}))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **tags):
+        key = (name, _tag_key({**self.base_tags, **tags}))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(buckets)
+            hist.add(value)
+
+    @contextmanager
+    def timer(self, name: str, **tags) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t, **tags)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = [{"name": n, "tags": dict(t), "value": v} for (n, t), v in sorted(self._counters.items())]
+            histograms = [{"name": n, "tags": dict(t), **h.as_dict()} for (n, t), h in sorted(self._histograms.items())]
+        return {"started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                "elapsed_s": round(time.time() - self.started, 3),
+                "counters": counters, "histograms": histograms}
+
+    def merge(self, snapshot: Dict[str, Any]):
+        # fold in another registry's snapshot (e.g. from a worker process)
+        with self._lock:
+            for c in snapshot.get("counters", []):
+                key = (c["name"], _tag_key(c["tags"]))
+                self._counters[key] = self._counters.get(key, 0) + c["value"]
+            for h in snapshot.get("histograms", []):
+                bounds = [float(b) for b in h["buckets"] if b != "+Inf"]
+                key = (h["name"], _tag_key(h["tags"]))
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = self._histograms[key] = _Histogram(bounds)
+                prev = 0
+                for i, n in enumerate(h["buckets"].values()):
+                    hist.counts[i] += n - prev
+                    prev = n
+                hist.count += h["count"]
+                hist.sum += h["sum"]
+                for attr, pick in (("min", min), ("max", max)):
+                    if h[attr] is not None:
+                        cur = getattr(hist, attr)
+                        setattr(hist, attr, h[attr] if cur is None else pick(cur, h[attr]))
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        lines: List[str] = []
+
+        def labels(tags: Dict[str, str], extra: Optional[Dict[str, str]] = None) -> str:
+            items = {**tags, **(extra or {})}
+            if not items:
+                return ""
+            esc = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in items.values())
+            return "{" + ",".join(f'{k.replace("-", "_")}="{v}"' for k, v in zip(items, esc)) + "}"
+
+        typed = set()
+        for c in snap["counters"]:
+            name = PROM_PREFIX + c["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{labels(c['tags'])} {c['value']}")
+        for h in snap["histograms"]:
+            name = PROM_PREFIX + h["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for le, n in h["buckets"].items():
+                lines.append(f"{name}_bucket{labels(h['tags'], {'le': le})} {n}")
+            lines.append(f"{name}_sum{labels(h['tags'])} {h['sum']}")
+            lines.append(f"{name}_count{labels(h['tags'])} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, out_dir: Path, ts: str, prometheus: bool = WRITE_PROMETHEUS) -> List[Path]:
+        out_dir = Path(out_dir)
+        out = out_dir / f"metrics_{ts}.json"
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        files = [out]
+        if prometheus:
+            prom = out_dir / f"metrics_{ts}.prom"
+            prom.write_text(self.to_prometheus(), encoding="utf-8")
+            files.append(prom)
+        return files
+
+
+# ------------------------
+# Thread-local active registry
+# ------------------------
+_local = threading.local()
+
+
+@contextmanager
+def use(registry: Optional[Metrics], **tags) -> Iterator[Optional[Metrics]]:
+    # nested use() calls inherit (and may override) the outer tags
+    stack = _local.__dict__.setdefault("stack", [])
+    outer_tags = stack[-1][1] if stack and stack[-1][0] is registry else {}
+    stack.append((registry, {**outer_tags, **tags}))
+    try:
+        yield registry
+    finally:
+        stack.pop()
+
+
+def _active():
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack and stack[-1][0] is not None else (None, None)
+
+
+def inc(name: str, value: float = 1, **tags):
+    registry, ctx = _active()
+    if registry is not None:
+        registry.inc(name, value, **{**ctx, **tags})
+
+
+def observe(name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **tags):
+    registry, ctx = _active()
+    if registry is not None:
+        registry.observe(name, value, buckets, **{**ctx, **tags})
+
+
+@contextmanager
+def timer(name: str, **tags) -> Iterator[None]:
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t, **tags)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# parsing.py
+# Persian number / price / age / size parsing for Divar map_post_cards.
+#
+# Numbers may be Persian or Arabic-Indic digits, may use the Persian decimal
+# (٫) and thousands (٬) separators, and may mix digits with number words:
+# "۱۰٫۷ میلیارد", "۱ میلیارد و ۲۰۰ میلیون", "دو میلیون و پانصد هزار".
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+# ------------------------
+# Normalisation tables
+# ------------------------
+_TRANSLATE = str.maketrans({
+    **{p: str(i) for i, p in enumerate("۰۱۲۳۴۵۶۷۸۹")},
+    **{a: str(i) for i, a in enumerate("٠١٢٣٤٥٦٧٨٩")},
+    "٫": ".",  # Persian decimal separator
+    "٬": "",  # Persian thousands separator
+    ",": "",
+    "،": " ",
+    "ي": "ی",  # Arabic yeh / kaf -> Persian
+    "ك": "ک",
+    "‌": "",  # ZWNJ: "سی‌صد" -> "سیصد"
+    "-": " ",
+})
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_TOKEN_RE = re.compile(r"\d+(?:\.\d+)?|[^\s\d.]+")
+
+WORDS_MAP = {
+    "صفر": 0, "یک": 1, "دو": 2, "سه": 3, "چهار": 4, "پنج": 5, "شش": 6, "هفت": 7, "هشت": 8, "نه": 9,
+    "ده": 10, "یازده": 11, "دوازده": 12, "سیزده": 13, "چهارده": 14, "پانزده": 15, "شانزده": 16,
+    "هفده": 17, "هجده": 18, "نوزده": 19, "بیست": 20, "سی": 30, "چهل": 40, "پنجاه": 50, "شصت": 60,
+    "هفتاد": 70, "هشتاد": 80, "نود": 90, "صد": 100, "یکصد": 100, "دویست": 200, "سیصد": 300, "چهارصد": 400,
+    "پانصد": 500, "ششصد": 600, "هفتصد": 700, "هشتصد": 800, "نهصد": 900, "هزار": 1000,
+    "میلیون": 1_000_000, "میلیارد": 1_000_000_000,
+}
+
+SIZE_KEYWORDS = ("متراژ", "مساحت", "متر", "زیربنا", "زیر بنا")
+
+
+def normalize(text: str) -> str:
+    return text.translate(_TRANSLATE)
+
+
+def parse_number(text: str) -> Optional[float]:
+    # the type check stays outside the cache: unhashable input must not reach lru_cache
+    if not isinstance(text, str) or not text:
+        return None
+    return _parse_number(text)
+
+
+@lru_cache(maxsize=8192)
+def _parse_number(text: str) -> Optional[float]:
+    # Digits and number words of ONE number; multipliers (هزار/میلیون/میلیارد)
+    # close a group the way words_to_number always did. Parts of the number are
+    # joined by "و" or follow a multiplier ("۱ میلیارد و ۲۰۰ میلیون",
+    # "یک میلیون پانصد هزار"). Words before the number are ignored; a second,
+    # separate number ("۲ خوابه ۸۵ متر", "۸۵ ۹۰") makes the text ambiguous -> None.
+    total, group = 0.0, 0.0
+    seen = False
+    joinable = True  # may the next numeral extend the current number?
+    ended = False  # a non-number word followed the number
+    for tok in _TOKEN_RE.findall(normalize(text)):
+        val = float(tok) if tok[0].isdigit() else WORDS_MAP.get(tok)
+        if val is None:
+            if seen and tok != "و":
+                ended = True
+            joinable = tok == "و" and not ended
+            continue
+        # a multiplier right after numerals applies to them ("۲۰۰ هزار"); anything
+        # else that cannot extend the number starts a second one
+        if seen and (ended or (val < 1000 and not joinable)):
+            return None
+        seen = True
+        if val >= 1000:
+            total += (group or 1) * val
+            group = 0.0
+            joinable = True
+        else:
+            group += val
+            joinable = False
+    if not seen:
+        return None
+    return total + group
+
+
+def clear_caches():
+    # for benchmarks: time cold parsing
+    _parse_number.cache_clear()
+    _parse_price.cache_clear()
+
+
+def persian_to_int(text: str) -> Optional[int]:
+    # first numeric literal in the text, decimals truncated ("۶۳ متر" -> 63)
+    if not isinstance(text, str):
+        return None
+    m = _NUMBER_RE.search(normalize(text))
+    return int(float(m.group())) if m else None
+
+
+def words_to_number(text: str) -> Optional[int]:
+    n = parse_number(text)
+    return int(round(n)) if n else None
+
+
+def parse_price(text: str) -> Optional[int]:
+    if not isinstance(text, str) or not text:
+        return None
+    return _parse_price(text)
+
+
+@lru_cache(maxsize=8192)
+def _parse_price(text: str) -> Optional[int]:
+    n = _parse_number(text)
+    return int(round(n)) if n else None
+
+
+def parse_age(chips: List[Dict[str, Any]]) -> Optional[int]:
+    for chip in chips or []:
+        title = chip.get("title", "")
+        if not title:
+            continue
+        if "نوساز" in title:
+            return 0
+        if "سال" in title:
+            n = parse_number(title)
+            if n is not None:
+                return int(n)
+    return None
+
+
+def parse_size(map_post: Dict[str, Any]) -> Optional[int]:
+    for chip in map_post.get("chips", []) or []:
+        title = chip.get("title", "")
+        if title and any(k in title for k in SIZE_KEYWORDS):
+            n = parse_number(title)
+            if n:
+                return int(n)
+    return None
+
+
+def parse_rooms(chips: List[Dict[str, Any]]) -> Optional[int]:
+    for chip in chips or []:
+        title = chip.get("title", "")
+        if "اتاق" in title:
+            if "بدون" in title:
+                return 0
+            n = parse_number(title)
+            return int(n) if n is not None else None
+    return None
+
+
+# ------------------------
+# Whole-post parsing
+# ------------------------
+def parse_post(post: Dict[str, Any]) -> Dict[str, Any]:
+    # one flat row per viewport post (see listing_store.COLUMNS)
+    map_post = post.get("map_post_card", {}) or {}
+    pin = post.get("map_pin_feature", {}) or {}
+    price_per_meter = None
+    total_price = None
+    for field in map_post.get("price_fields", []) or []:
+        title = field.get("title", "")
+        if "متری" in title:
+            price_per_meter = parse_price(field.get("value", ""))
+        elif "قیمت" in title:
+            total_price = parse_price(field.get("value", ""))
+    info = ((map_post.get("action_log") or {}).get("server_side_info") or {}).get("info") or {}
+    chips = map_post.get("chips", []) or []
+    return {
+        "token": map_post.get("token") or map_post.get("id"),
+        "title": map_post.get("title"),
+        "price_per_sqm": price_per_meter,
+        "total_price": total_price,
+        "age": parse_age(chips),
+        "size": parse_size(map_post),
+        "rooms": parse_rooms(chips),
+        "lat": pin.get("lat"),
+        "lon": pin.get("lon"),
+        "sort_date": info.get("sort_date"),
+    }
+
+
+def parse_posts(posts: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # batch API: a whole page of posts in one call
+    return [parse_post(p) for p in posts]
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# partitioner.py
+# Decides which (size range, bbox) cells a district is fetched with.
+# Sparse neighbouring size ranges are merged using the previous run's
+# per-range counts; saturated responses are split by size or into bbox quadrants.
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# ------------------------
+# Config: tweak as needed
+# ------------------------
+BASE_STEP = 5  # finest size slice used to estimate density (m²)
+VIEWPORT_RESULT_CAP = 100  # posts per response at which we assume the viewport truncated results
+MERGE_TARGET = 40  # merge neighbouring slices while their expected posts stay below this
+MAX_MERGED_WIDTH = 30  # never merge into a range wider than this (m²)
+MAX_SPLIT_DEPTH = 4  # how many times a saturated cell may be split again
+
+Cell = Dict[str, Any]
+
+
+def build_5sqm_intervals(min_sqm: int, max_sqm: int, step: int = BASE_STEP) -> List[tuple]:
+    intervals = []
+    current = min_sqm
+    while current <= max_sqm:
+        hi = current + (step - 1)
+        if hi > max_sqm:
+            hi = max_sqm
+        intervals.append((current, hi))
+        current = hi + 1
+    return intervals
+
+
+def make_cell(min_sqm: int, max_sqm: int, bbox: Optional[List[float]] = None, depth: int = 0) -> Cell:
+    # bbox is [min_lon, min_lat, max_lon, max_lat] like the payload's repeated_float
+    return {"min": min_sqm, "max": max_sqm, "bbox": bbox, "depth": depth}
+
+
+def cell_tag(cell: Cell) -> str:
+    # unique, file-name-safe name of a cell: "60-64" or "60-64_51.3800_35.7200_51.4000_35.7400"
+    tag = f"{cell['min']}-{cell['max']}"
+    if cell["bbox"]:
+        tag += "_" + "_".join(f"{v:.4f}" for v in cell["bbox"])
+    return tag
+
+
+# ------------------------
+# History: per-range post counts from the latest summary of the district
+# ------------------------
+def load_history(district_dir: Path, exclude: Optional[Path] = None) -> Dict[Tuple[int, int], int]:
+    if not district_dir.exists():
+        return {}
+    runs = sorted((d for d in district_dir.iterdir() if d.is_dir() and d != exclude), reverse=True)
+    for run in runs:
+        for file in run.glob("summary_*.json"):
+            try:
+                with open(file, "r", encoding="utf-8") as f:
+                    outcomes = json.load(f).get("range_outcomes")
+            except Exception:
+                continue
+            if not outcomes:
+                continue
+            # Only leaf cells count: a saturated parent that was split covers the same
+            # listings as its children. The leaves left for one size range are disjoint
+            # bbox quadrants (or the single unsplit cell), so their sum is the range's
+            # count; a repeated (range, bbox) outcome is kept once.
+            leaves: Dict[tuple, int] = {}
+            for o in outcomes:
+                if o.get("fallback") or o.get("split") or o.get("status") != "complete":
+                    continue
+                bbox = tuple(o["bbox"]) if o.get("bbox") else None
+                leaves[(int(o["min"]), int(o["max"]), bbox)] = int(o.get("posts", 0))
+            history: Dict[Tuple[int, int], int] = {}
+            for (lo, hi, _), posts in leaves.items():
+                history[(lo, hi)] = history.get((lo, hi), 0) + posts
+            if history:
+                return history
+    return {}
+
+
+def estimate_posts(history: Dict[Tuple[int, int], int], lo: int, hi: int) -> Optional[float]:
+    # spread each historical range's count evenly over its width and sum the overlap
+    if not history:
+        return None
+    total, covered = 0.0, 0
+    for (hmin, hmax), posts in history.items():
+        overlap = min(hi, hmax) - max(lo, hmin) + 1
+        if overlap > 0:
+            total += posts * overlap / (hmax - hmin + 1)
+            covered += overlap
+    if covered < hi - lo + 1:
+        return None  # part of the range was never seen; do not guess
+    return total
+
+
+# ------------------------
+# Planning
+# ------------------------
+def plan_cells(min_sqm: int, max_sqm: int, history: Dict[Tuple[int, int], int]) -> List[Cell]:
+    slices = build_5sqm_intervals(min_sqm, max_sqm)
+    cells: List[Cell] = []
+    cur_lo, cur_hi, cur_est = None, None, 0.0
+    for lo, hi in slices:
+        est = estimate_posts(history, lo, hi)
+        if est is None:
+            # unknown density: flush and keep this slice on its own
+            if cur_lo is not None:
+                cells.append(make_cell(cur_lo, cur_hi))
+                cur_lo = None
+            cells.append(make_cell(lo, hi))
+            continue
+        if cur_lo is not None and cur_est + est < MERGE_TARGET and hi - cur_lo + 1 <= MAX_MERGED_WIDTH:
+            cur_hi, cur_est = hi, cur_est + est
+        else:
+            if cur_lo is not None:
+                cells.append(make_cell(cur_lo, cur_hi))
+            cur_lo, cur_hi, cur_est = lo, hi, est
+    if cur_lo is not None:
+        cells.append(make_cell(cur_lo, cur_hi))
+    return cells
+
+
+def is_saturated(outcome: Dict[str, Any]) -> bool:
+    return outcome.get("status") == "complete" and outcome.get("last_page_posts", 0) >= VIEWPORT_RESULT_CAP
+
+
+def split_cell(cell: Cell, default_bbox: Optional[List[float]]) -> List[Cell]:
+    # split by size while possible, otherwise into four bbox quadrants
+    depth = cell["depth"] + 1
+    if depth > MAX_SPLIT_DEPTH:
+        return []
+    if cell["max"] > cell["min"]:
+        mid = (cell["min"] + cell["max"]) // 2
+        return [make_cell(cell["min"], mid, cell["bbox"], depth), make_cell(mid + 1, cell["max"], cell["bbox"], depth)]
+    bbox = cell["bbox"] or default_bbox
+    if not bbox:
+        return []
+    min_lon, min_lat, max_lon, max_lat = bbox
+    mid_lon, mid_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+    quads = [
+        [min_lon, min_lat, mid_lon, mid_lat],
+        [mid_lon, min_lat, max_lon, mid_lat],
+        [min_lon, mid_lat, mid_lon, max_lat],
+        [mid_lon, mid_lat, max_lon, max_lat],
+    ]
+    return [make_cell(cell["min"], cell["max"], q, depth) for q in quads]
+
+
+# ------------------------
+# Payload helpers
+# ------------------------
+def get_bbox(payload: dict) -> Optional[List[float]]:
+    try:
+        values = payload["search_data"]["form_data"]["data"]["bbox"]["repeated_float"]["value"]
+        return [float(v["value"]) for v in values]
+    except Exception:
+        return None
+
+
+def try_set_bbox(p: dict, bbox: List[float]) -> dict:
+    # mutates p in place (callers pass an already deep-copied payload)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    try:
+        p["search_data"]["form_data"]["data"]["bbox"] = {
+            "repeated_float": {"value": [{"value": v} for v in bbox]}
+        }
+        if isinstance(p.get("camera_info"), dict):
+            p["camera_info"]["bbox"] = {
+                "min_latitude": min_lat,
+                "min_longitude": min_lon,
+                "max_latitude": max_lat,
+                "max_longitude": max_lon,
+            }
+    except Exception:
+        pass
+    return p
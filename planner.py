@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# planner.py
+# Builds the scrape jobs from config.yaml instead of hard-coded payloads.
+#
+# Every `districts:` entry (merged over `district_defaults:`) becomes one
+# DivarRequest for the viewport API. plan() drops the districts whose last
+# stored run is younger than their `refresh_interval`, and orders the rest by
+# `priority` (then by how overdue they are), so an hourly schedule only spends
+# requests on the districts that are actually due.
+
+import json
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import CONFIG_FILE, districts, load_config
+from runs import RESULTS_ROOT, RUN_DIR_RE, iter_runs
+from scraper import DivarRequest
+
+DEFAULT_URL = "https://api.divar.ir/v8/mapview/viewport"
+DEFAULT_INTERVAL = "1d"
+# a run that started a little less than one interval ago is due anyway, so a
+# daily district on an hourly schedule does not drift an hour later every day
+REFRESH_GRACE = timedelta(minutes=20)
+
+_INTERVAL_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_interval(value: Any) -> timedelta:
+    # "30m", "6h", "1d", "2w" or plain seconds
+    m = _INTERVAL_RE.match(str(value))
+    if not m:
+        raise ValueError(f"bad refresh_interval {value!r} (expected e.g. 30m, 6h, 1d)")
+    return timedelta(seconds=float(m.group(1)) * _UNITS[m.group(2)])
+
+
+# ------------------------
+# Payload building
+# ------------------------
+def filter_value(value: Any) -> Dict[str, Any]:
+    # config values -> the viewport API's typed form_data values
+    if isinstance(value, bool):
+        return {"boolean": {"value": value}}
+    if isinstance(value, dict):
+        return {"number_range": {k: str(v) for k, v in value.items() if v is not None}}
+    if isinstance(value, (list, tuple)):
+        return {"repeated_string": {"value": [str(v) for v in value]}}
+    return {"str": {"value": str(value)}}
+
+
+def build_payload(district: Dict[str, Any], request: Dict[str, Any]) -> Dict[str, Any]:
+    category = request.get("category", "apartment-sell")
+    city_ids = [str(c) for c in request.get("city_ids", ["1"])]
+    data: Dict[str, Any] = {}
+    if district.get("bbox"):
+        data["bbox"] = {"repeated_float": {"value": [{"value": v} for v in district["bbox"]]}}
+    for key in sorted(district.get("filters") or {}):
+        data[key] = filter_value(district["filters"][key])
+    data["category"] = {"str": {"value": category}}
+    data["districts"] = {"repeated_string": {"value": [str(district["district"])]}}
+
+    payload = {"city_ids": city_ids, "search_data": {"form_data": {"data": data}}}
+    camera = district.get("camera") or {}
+    cam_bbox = camera.get("bbox") or district.get("bbox")
+    if cam_bbox:
+        min_lon, min_lat, max_lon, max_lat = cam_bbox
+        payload["camera_info"] = {
+            "bbox": {
+                "min_latitude": min_lat,
+                "min_longitude": min_lon,
+                "max_latitude": max_lat,
+                "max_longitude": max_lon,
+            },
+            "place_hash": f"{city_ids[0]}|{district['district']}|{category}",
+            "zoom": camera.get("zoom", 12),
+        }
+    return payload
+
+
+def build_request(district: Dict[str, Any], request: Dict[str, Any]) -> DivarRequest:
+    path = district.get("path") or district["district_name"]
+    return DivarRequest(request.get("url", DEFAULT_URL), dict(request.get("headers") or {}),
+                        build_payload(district, request), path)
+
+
+def build_requests(config_path: Path = CONFIG_FILE) -> List[DivarRequest]:
+    # every configured district, regardless of freshness
+    request = load_config(config_path).get("request", {}) or {}
+    return [build_request(d, request) for d in districts(config_path)]
+
+
+# ------------------------
+# Scheduling
+# ------------------------
+def run_succeeded(summary_file: Optional[Path]) -> bool:
+    # an incomplete run (failed size ranges, see range_outcomes) does not make a
+    # district fresh, so it is retried on the next scheduled check
+    if summary_file is None:
+        return False
+    try:
+        summary = json.loads(summary_file.read_bytes())
+    except (OSError, ValueError):
+        return False
+    return summary.get("complete", True) is not False
+
+
+def last_run_time(path: str, root: Path = RESULTS_ROOT) -> Optional[datetime]:
+    # start time of the newest run that completed
+    for run in sorted(iter_runs(root, path), key=lambda r: r.ts, reverse=True):
+        if RUN_DIR_RE.match(run.ts) and run_succeeded(run.best_summary()):
+            return datetime.strptime(run.ts, "%Y%m%d_%H%M%S")
+    return None
+
+
+def plan(now: Optional[datetime] = None, root: Path = RESULTS_ROOT, force: bool = False,
+         only: Optional[List[str]] = None, config_path: Path = CONFIG_FILE) -> List[DivarRequest]:
+    now = now or datetime.now()
+    request = load_config(config_path).get("request", {}) or {}
+    due = []
+    for d in districts(config_path):
+        job = build_request(d, request)
+        if only and job.path not in only and d.get("district_name") not in only:
+            continue
+        every = d.get("refresh_interval", DEFAULT_INTERVAL)
+        interval = parse_interval(every)
+        last = last_run_time(job.path, root)
+        age = now - last if last else None
+        if not force and age is not None and age + REFRESH_GRACE < interval:
+            print(f"[plan] {job.path}: fresh (last run {last:%Y-%m-%d %H:%M}, next in {timedelta(seconds=int((interval - age - REFRESH_GRACE).total_seconds()))})")
+            continue
+        overdue = (age - interval).total_seconds() if age is not None else float("inf")
+        due.append((-int(d.get("priority", 0)), -overdue, job))
+        print(f"[plan] {job.path}: due (last run {f'{last:%Y-%m-%d %H:%M}' if last else 'never'}, every {every})")
+    due.sort(key=lambda x: (x[0], x[1]))
+    return [job for _, _, job in due]
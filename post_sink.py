@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# post_sink.py
+# Streaming destination for fetched pages: dedupe by post token, append the
+# raw post to a JSON Lines file, parse it and hand the row on, one page at a time.
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+from listing_store import ListingWriter, open_raw_posts
+
+# parsed fields whose None counts as a parse failure in the run's metrics
+PARSE_FIELDS = ("price_per_sqm", "total_price", "size", "age")
+
+
+def post_token(post: Dict[str, Any]) -> str:
+    # viewport posts keep their token inside map_post_card; fall back to
+    # top-level ids, then to the post's own JSON
+    card = post.get("map_post_card") or {}
+    for src in (card, post):
+        for k in ("id", "token", "post_token", "postId"):
+            if src.get(k):
+                return src[k]
+    return json.dumps(post, sort_keys=True, ensure_ascii=False)
+
+
+class PostSink:
+    # Shared by all range workers of one district run; add_page() is thread-safe.
+    def __init__(self, parse_posts: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+                 on_row: Optional[Callable[[Dict[str, Any]], None]],
+                 writer: ListingWriter, raw_path: Optional[Path] = None):
+        self.parse_posts = parse_posts
+        self.on_row = on_row
+        self.writer = writer
+        self.raw_path = raw_path
+        self._raw = open_raw_posts(raw_path) if raw_path else None
+        self._seen = set()  # every token of the run: grows with it, like the summary columns
+        self._lock = threading.Lock()
+
+    @property
+    def unique(self) -> int:
+        return len(self._seen)
+
+    def add_page(self, posts: List[Dict[str, Any]]) -> int:
+        # returns how many of the page's posts were new to this run
+        with self._lock:
+            fresh = []
+            for post in posts:
+                pid = post_token(post)
+                if pid not in self._seen:
+                    self._seen.add(pid)
+                    fresh.append(post)
+            if self._raw and fresh:
+                self._raw.write("".join(json.dumps(p, ensure_ascii=False, separators=(",", ":")) + "\n" for p in fresh))
+                self._raw.flush()
+            with metrics.timer("parse_seconds"):
+                rows = self.parse_posts(fresh)
+            missing = dict.fromkeys(PARSE_FIELDS, 0)
+            for row in rows:
+                for field in PARSE_FIELDS:
+                    if row.get(field) is None:
+                        missing[field] += 1
+                self.writer.add(row)
+                if self.on_row:
+                    self.on_row(row)
+        metrics.inc("posts_received_total", len(posts))
+        metrics.inc("posts_new_total", len(fresh))
+        for field, n in missing.items():
+            if n:
+                metrics.inc("parse_missing_total", n, field=field)
+        return len(fresh)
+
+    def close(self) -> List[Path]:
+        with self._lock:
+            if self._raw:
+                self._raw.close()
+                self._raw = None
+            return self.writer.close()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# profiling.py
+# Opt-in profiling of pipeline phases (`python main.py --profile [DIR] ...`).
+#
+# Every profiled phase (scrape / render of one district, summarise) writes to
+# <DIR>/<run ts>/<district>/:
+#   <phase>.folded     sampled stacks of *all* threads, one "a;b;c count" line per
+#                      stack (flamegraph.pl / speedscope / inferno input); shows
+#                      network waits, JSON walks and plotly building side by side
+#   <phase>.prof       cProfile of the thread that ran the phase (pstats / snakeviz)
+#   <phase>.alloc.txt  tracemalloc: peak and the top allocation sites of the phase
+# plus one line per phase in <DIR>/<run ts>/phases.jsonl.
+# phase() is a no-op unless enable() was called in this process.
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+PROFILE_DIR = Path("profile")
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 8
+
+_active: Optional["Profiler"] = None
+
+
+class StackSampler:
+    # background thread sampling sys._current_frames(); cheap enough to leave
+    # on for a whole scrape and, unlike cProfile, it sees every worker thread
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+class Profiler:
+    def __init__(self, root: Path = PROFILE_DIR, run_ts: Optional[str] = None):
+        self.out = Path(root) / (run_ts or time.strftime("%Y%m%d_%H%M%S"))
+        self.out.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()  # phases may end on different threads
+
+    @contextmanager
+    def phase(self, name: str, district: str = "_all") -> Iterator[None]:
+        out_dir = self.out / district
+        out_dir.mkdir(parents=True, exist_ok=True)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        sampler = StackSampler()
+        prof = cProfile.Profile()
+        t = time.perf_counter()
+        sampler.start()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            sampler.stop()
+            wall = time.perf_counter() - t
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+            prof.dump_stats(out_dir / f"{name}.prof")
+            sampler.write_folded(out_dir / f"{name}.folded")
+            top = after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]
+            with open(out_dir / f"{name}.alloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"{district} / {name}: wall {wall:.3f}s, peak traced memory {peak / 2 ** 20:.1f} MB\n")
+                f.write(f"top {len(top)} allocation sites by growth during the phase:\n\n")
+                for stat in top:
+                    f.write(f"{stat}\n")
+            record = {"district": district, "phase": name, "wall_s": round(wall, 3), "samples": sampler.samples,
+                      "peak_mb": round(peak / 2 ** 20, 2), "pid": os.getpid()}
+            with self._lock, open(self.out / "phases.jsonl", "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            print(f"[profile] {district}/{name}: {wall:.2f}s, peak {record['peak_mb']} MB -> {out_dir}")
+
+
+def enable(root: Path = PROFILE_DIR, run_ts: Optional[str] = None) -> Profiler:
+    # run_ts lets worker processes write into their parent's profile directory
+    global _active
+    _active = Profiler(root, run_ts)
+    return _active
+
+
+def active() -> Optional[Profiler]:
+    return _active
+
+
+@contextmanager
+def phase(name: str, district: str = "_all") -> Iterator[None]:
+    if _active is None:
+        yield
+        return
+    with _active.phase(name, district):
+        yield
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# ratelimit.py
+# Thread-safe request pacing shared by every scraper worker.
+
+import threading
+import time
+
+
+class TokenBucket:
+    # rate: tokens added per second, capacity: max burst size.
+    # One bucket is meant to be shared by all threads talking to the same host.
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0):
+        # block until `tokens` are available, then consume them
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+class RequestBudget:
+    # Hard cap on the number of requests a whole run may send.
+    # limit=None means unlimited; take() raises BudgetExhausted once spent.
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.limit is not None and self.used >= self.limit:
+                raise BudgetExhausted(f"request budget of {self.limit} exhausted")
+            self.used += 1
+
+    @property
+    def remaining(self):
+        if self.limit is None:
+            return None
+        with self._lock:
+            return max(0, self.limit - self.used)
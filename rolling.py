@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# rolling.py
+# Rolling aggregates over a district's summary history, maintained per new run
+# instead of recomputed over the whole history on every render.
+#
+# For every series (overall, each age bucket, each size bucket) and every run:
+#   ma7 / ma30    count-weighted moving average of the run averages over the last 7 / 30 days
+#   med7 / med30  median of the run medians over the last 7 / 30 days
+#   wow           % change of ma7 against ma7 as of 7 days earlier
+#
+# Stored next to the summaries in divar_results/<district>/:
+#   rolling.jsonl        one line per run (appended), read by mainDraw.make_chart
+#   rolling_state.json   the windows' running sums and sorted medians, so a new
+#                        run costs O(window) however long the history is
+# A run older than the last one processed (or --rebuild, or backfill
+# rewriting summaries) recomputes the district from scratch.
+
+import argparse
+import bisect
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import summary_index
+from runs import RESULTS_ROOT
+
+ROLLING_VERSION = 1  # bump when the state layout or the outputs change
+WINDOWS = {"7": 7 * 86400, "30": 30 * 86400}  # seconds
+WOW_LAG = 7 * 86400
+STATE_FILE = "rolling_state.json"
+SERIES_FILE = "rolling.jsonl"
+TS_FORMAT = summary_index.TS_FORMAT
+EPOCH = datetime(1970, 1, 1)  # summary timestamps are naive local times
+
+
+class RollingSeries:
+    # time-based windows of one series: entries (ts, avg, count, median) plus,
+    # per window, running sum(avg * count), sum(count) and a sorted list of medians
+    def __init__(self, state: Optional[Dict[str, Any]] = None):
+        state = state or {}
+        self.entries: List[List[float]] = state.get("entries", [])
+        self.windows: Dict[str, Dict[str, Any]] = state.get("windows") or {
+            w: {"start": 0, "sum": 0, "count": 0, "medians": []} for w in WINDOWS}
+        self.ma7_history: List[Tuple[float, float]] = [tuple(x) for x in state.get("ma7_history", [])]
+
+    def state(self) -> Dict[str, Any]:
+        return {"entries": self.entries, "windows": self.windows, "ma7_history": self.ma7_history}
+
+    def push(self, ts: float, avg: Optional[float], count: int, median: Optional[float]) -> Dict[str, Any]:
+        if avg is not None and count:
+            self.entries.append([ts, avg, count, median])
+            for w in self.windows.values():
+                w["sum"] += avg * count
+                w["count"] += count
+                if median is not None:
+                    bisect.insort(w["medians"], median)
+        out: Dict[str, Any] = {}
+        for name, span in WINDOWS.items():
+            w = self.windows[name]
+            # evict entries that left this window (each entry leaves each window once)
+            while w["start"] < len(self.entries) and self.entries[w["start"]][0] <= ts - span:
+                _, e_avg, e_count, e_median = self.entries[w["start"]]
+                w["sum"] -= e_avg * e_count
+                w["count"] -= e_count
+                if e_median is not None:
+                    del w["medians"][bisect.bisect_left(w["medians"], e_median)]
+                w["start"] += 1
+            meds = w["medians"]
+            out[f"ma{name}"] = round(w["sum"] / w["count"]) if w["count"] else None
+            out[f"med{name}"] = (meds[(len(meds) - 1) // 2] + meds[len(meds) // 2]) / 2 if meds else None
+        # drop entries no window needs any more
+        drop = min(w["start"] for w in self.windows.values())
+        if drop:
+            del self.entries[:drop]
+            for w in self.windows.values():
+                w["start"] -= drop
+
+        # week over week: ma7 now vs the latest ma7 at least WOW_LAG ago
+        while len(self.ma7_history) > 1 and self.ma7_history[1][0] <= ts - WOW_LAG:
+            self.ma7_history.pop(0)
+        past = self.ma7_history[0] if self.ma7_history and self.ma7_history[0][0] <= ts - WOW_LAG else None
+        out["wow"] = round((out["ma7"] / past[1] - 1) * 100, 2) if past and past[1] and out["ma7"] else None
+        if out["ma7"] is not None:
+            self.ma7_history.append((ts, out["ma7"]))
+        if out["med7"] is not None:
+            out["med7"], out["med30"] = round(out["med7"]), round(out["med30"])
+        return out
+
+
+def series_points(summary: Dict[str, Any]) -> Dict[str, Tuple[Optional[float], int, Optional[float]]]:
+    # series name -> (avg, count, median) of one summary
+    overall = summary.get("overall") or {}
+    points = {"overall": (summary.get("overall_avg_price_per_sqm"), summary.get("valid_for_averages", 0),
+                          overall.get("median"))}
+    for key, prefix in (("age_intervals", "age"), ("size_intervals", "size")):
+        for label, cell in (summary.get(key) or {}).items():
+            points[f"{prefix}:{label}"] = (cell.get("avg"), cell.get("count", 0), cell.get("median"))
+    return points
+
+
+def _district_dir(district: str, root: Path) -> Path:
+    return Path(root) / district
+
+
+def load_state(district: str, root: Path = RESULTS_ROOT) -> Dict[str, Any]:
+    try:
+        with open(_district_dir(district, root) / STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if state.get("version") == ROLLING_VERSION else {}
+
+
+def update(district: str, root: Path = RESULTS_ROOT, index_file: Path = summary_index.INDEX_FILE,
+           rebuild: bool = False) -> int:
+    # push every summary newer than the last processed one; returns how many.
+    # Expects summary_index to be refreshed for the district.
+    base = _district_dir(district, root)
+    state = {} if rebuild else load_state(district, root)
+    last = state.get("last_timestamp")
+    if last is not None and summary_index.count(district, index_file, until=last, root=root) != state.get("runs"):
+        # a run at or before the last processed one appeared or vanished
+        print(f"[{district}] rolling: history before {last} changed, rebuilding")
+        state, last = {}, None
+    summaries = summary_index.load(district, index_file, since=last, root=root)
+    new = [(ts, s) for ts, s in summaries if last is None or ts.strftime(TS_FORMAT) > last]
+    if not new:
+        return 0
+
+    series = {name: RollingSeries(s) for name, s in (state.get("series") or {}).items()}
+    lines = []
+    for ts, summary in new:
+        epoch = (ts - EPOCH).total_seconds()
+        out = {}
+        for name, (avg, count, median) in series_points(summary).items():
+            out[name] = series.setdefault(name, RollingSeries()).push(epoch, avg, count or 0, median)
+        # series missing from this run still age their windows
+        for name in series.keys() - out.keys():
+            out[name] = series[name].push(epoch, None, 0, None)
+        lines.append(json.dumps({"timestamp": ts.strftime(TS_FORMAT), "series": out},
+                                ensure_ascii=False, separators=(",", ":")))
+
+    base.mkdir(parents=True, exist_ok=True)
+    mode = "w" if not state else "a"
+    with open(base / SERIES_FILE, mode, encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    state = {"version": ROLLING_VERSION, "last_timestamp": new[-1][0].strftime(TS_FORMAT),
+             "runs": state.get("runs", 0) + len(new),
+             "series": {name: s.state() for name, s in series.items()}}
+    tmp = base / f"{STATE_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, base / STATE_FILE)
+    return len(new)
+
+
+def load(district: str, root: Path = RESULTS_ROOT) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    # timestamp -> series name -> {ma7, ma30, med7, med30, wow}
+    out = {}
+    try:
+        with open(_district_dir(district, root) / SERIES_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    out[rec["timestamp"]] = rec["series"]
+    except OSError:
+        pass
+    return out
+
+
+def main(argv=None) -> int:
+    from runs import list_districts
+
+    ap = argparse.ArgumentParser(description="Update rolling 7/30-day aggregates of the summary history.")
+    ap.add_argument("--root", default=str(RESULTS_ROOT))
+    ap.add_argument("--district", action="append", help="only these districts (repeatable)")
+    ap.add_argument("--rebuild", action="store_true", help="recompute from the first run")
+    args = ap.parse_args(argv)
+
+    root = Path(args.root)
+    for district in args.district or list_districts(root):
+        summary_index.refresh(district, root)
+        n = update(district, root, rebuild=args.rebuild)
+        latest = next(reversed(load(district, root).items()), None) if n else None
+        overall = latest[1].get("overall", {}) if latest else {}
+        print(f"[{district}] {n} new runs" + (f"; {latest[0]}: ma7 {overall.get('ma7')}, ma30 {overall.get('ma30')}, "
+                                              f"wow {overall.get('wow')}%" if latest else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
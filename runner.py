@@ -1,290 +1,77 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
 from scraper import extractor
 from scraper import DivarRequest
+import planner
+from divar_client import DivarClient, REQUESTS_PER_SECOND, REQUEST_BURST, POOL_SIZE
+from ratelimit import TokenBucket, RequestBudget
+import http_cache
+import profiling
+
+# districts scraped at the same time; kept below the district count so the
+# planner's priority order decides who reaches the shared limiter and budget first
+DISTRICT_WORKERS = 2
+MAX_REQUESTS = None  # global request budget for one run (None = unlimited)
+
+
+def build_requests() -> List[DivarRequest]:
+    # every district in config.yaml (see planner.py), due or not
+    return planner.build_requests()
+
+
+def run_jobs(jobs: List[DivarRequest], workers: int = DISTRICT_WORKERS,
+             max_requests: Optional[int] = MAX_REQUESTS,
+             cache_mode: str = http_cache.DEFAULT_MODE) -> Dict[str, Dict[str, Any]]:
+    # All districts share one client (connection pool, limiter, budget and
+    # HTTP cache), so running them in parallel does not raise the request rate against api.divar.ir.
+    budget = RequestBudget(max_requests)
+    client = DivarClient(TokenBucket(REQUESTS_PER_SECOND, REQUEST_BURST), budget, pool_size=POOL_SIZE,
+                         cache=http_cache.HttpCache(cache_mode))
+
+    if profiling.active():
+        # one district at a time, so each profile phase only sees its own threads
+        workers = 1
+
+    def run_one(job: DivarRequest) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            with profiling.phase("scrape", job.path):
+                result = extractor(job, client=client)
+            return {"ok": True, "result": result, "elapsed": time.monotonic() - started}
+        except Exception as e:
+            # one broken district must not take the others down
+            traceback.print_exc()
+            return {"ok": False, "error": repr(e), "elapsed": time.monotonic() - started}
+
+    # jobs start in the order given (planner.plan: priority, then most overdue)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+            outcomes = dict(zip((j.path for j in jobs), pool.map(run_one, jobs)))
+    finally:
+        client.close()
+
+    print("\n=== RUN REPORT ===")
+    for path, outcome in outcomes.items():
+        if not outcome["ok"]:
+            status = f"FAILED: {outcome['error']}"
+        elif not outcome["result"].get("complete", True):
+            status = "INCOMPLETE (some size ranges failed, see summary range_outcomes)"
+        else:
+            status = "ok"
+        print(f"  {path}: {status} ({outcome['elapsed']:.1f}s)")
+    if budget.limit is not None:
+        print(f"  requests used: {budget.used}/{budget.limit}")
+    return outcomes
+
 
-def run():
-    
-    
-    
-    
-    #Mehran
-        
-    url = "https://api.divar.ir/v8/mapview/viewport"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
-        "Content-Type": "application/json; charset=utf-8",
-        "Accept": "application/json, text/plain, */*",
-        "X-Requested-With": "XMLHttpRequest",
-        "Referer": "https://divar.ir/",
-        "Accept-Language": "fa-IR,fa;q=0.9,en-US;q=0.8,en;q=0.7"
-    }
-    
-    payload = {
-        "city_ids": ["1"],
-        "search_data": {
-            "form_data": {
-                "data": {
-                    "bbox": {
-                        "repeated_float": {
-                            "value": [
-                                {"value": 51.4465828},
-                                {"value": 35.7176476},
-                                {"value": 51.4743233},
-                                {"value": 35.7756462}
-                            ]
-                        }
-                    },
-                    "building-age": {"number_range": {"maximum": "20"}},
-                    "elevator": {"boolean": {"value": True}},
-                    "has-photo": {"boolean": {"value": True}},
-                    "parking": {"boolean": {"value": True}},
-                    "size": {"number_range": {"minimum": "60", "maximum": "150"}},
-                    "category": {"str": {"value": "apartment-sell"}},
-                    "districts": {"repeated_string": {"value": ["95"]}}
-                }
-            }
-        },
-        "camera_info": {
-            "bbox": {
-                "min_latitude": 35.717647,
-                "min_longitude": 51.393049,
-                "max_latitude": 35.775647,
-                "max_longitude": 51.527854
-            },
-            "place_hash": "1|95|apartment-sell",
-            "zoom": 11.342905675330188
-        }
-    }
-    
-    paths ="Seyyed-Khandan_Araghi_Khaje-Abdollah_Mehran"
-    
-    Mehran = DivarRequest(url,headers,payload,paths)
-    
-    extractor(Mehran)
-    
-    
-    
-    
-    ##Gisha
-    
-    url = "https://api.divar.ir/v8/mapview/viewport"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
-        "Content-Type": "application/json; charset=utf-8",
-        "Accept": "application/json, text/plain, */*",
-        "X-Requested-With": "XMLHttpRequest",
-        "Referer": "https://divar.ir/",
-        "Accept-Language": "fa-IR,fa;q=0.9,en-US;q=0.8,en;q=0.7"
-    }
-    
-    
-    payload = {
-        "city_ids": ["1"],
-        "search_data": {
-            "form_data": {
-                "data": {
-                    "bbox": {
-                        "repeated_float": {
-                            "value": [
-                                {"value": 51.3350372},
-                                {"value": 35.7241974},
-                                {"value": 51.4088402},
-                                {"value": 35.750042}
-                            ]
-                        }
-                    },
-                    "building-age": {"number_range": {"maximum": "20"}},
-                    "elevator": {"boolean": {"value": True}},
-                    "has-photo": {"boolean": {"value": True}},
-                    "parking": {"boolean": {"value": True}},
-                    "size": {"number_range": {"minimum": "60", "maximum": "150"}},
-                    "category": {"str": {"value": "apartment-sell"}},
-                    "districts": {"repeated_string": {"value": ["88"]}}
-                }
-            }
-        },
-        "camera_info": {
-            "bbox": {
-                "min_latitude": 35.724198,
-                "min_longitude": 51.335037,
-                "max_latitude": 35.750043,
-                "max_longitude": 51.408842
-            },
-            "place_hash": "1|88|apartment-sell",
-            "zoom": 12.899449156018573
-        }
-    }
-    
-    paths ="Gisha"
-    
-    gisha = DivarRequest(url,headers,payload,paths)
-    extractor(gisha)
-    
-    
-    
-    ##ShahrAra
-    url = "https://api.divar.ir/v8/mapview/viewport"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
-        "Content-Type": "application/json; charset=utf-8",
-        "Accept": "application/json, text/plain, */*",
-        "X-Requested-With": "XMLHttpRequest",
-        "Referer": "https://divar.ir/",
-        "Accept-Language": "fa-IR,fa;q=0.9,en-US;q=0.8,en;q=0.7"
-    }
-    
-    
-    payload = {
-        "city_ids": ["1"],
-        "search_data": {
-            "form_data": {
-                "data": {
-                    "bbox": {
-                        "repeated_float": {
-                            "value": [
-                                {"value": 51.3174362},
-                                {"value": 35.7004204},
-                                {"value": 51.4182167},
-                                {"value": 35.7357216}
-                            ]
-                        }
-                    },
-                    "building-age": {"number_range": {"maximum": "20"}},
-                    "elevator": {"boolean": {"value": True}},
-                    "has-photo": {"boolean": {"value": True}},
-                    "parking": {"boolean": {"value": True}},
-                    "size": {"number_range": {"minimum": "60", "maximum": "150"}},
-                    "category": {"str": {"value": "apartment-sell"}},
-                    "districts": {"repeated_string": {"value": ["202"]}}
-                }
-            }
-        },
-        "camera_info": {
-            "bbox": {
-                "min_latitude": 35.700421,
-                "min_longitude": 51.317436,
-                "max_latitude": 35.735721,
-                "max_longitude": 51.418215
-            },
-            "place_hash": "1|202|apartment-sell",
-            "zoom": 12.450042235879172
-        }
-    }
-    
-    paths ="ShahrAra"
-    
-    shahrara = DivarRequest(url,headers,payload,paths)
-    extractor(shahrara)
-    
-    
-    
-    
-    ##TehranVilla
-    url = "https://api.divar.ir/v8/mapview/viewport"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
-        "Content-Type": "application/json; charset=utf-8",
-        "Accept": "application/json, text/plain, */*",
-        "X-Requested-With": "XMLHttpRequest",
-        "Referer": "https://divar.ir/",
-        "Accept-Language": "fa-IR,fa;q=0.9,en-US;q=0.8,en;q=0.7"
-    }
-    
-    
-    payload = {
-        "city_ids": ["1"],
-        "search_data": {
-            "form_data": {
-                "data": {
-                    "bbox": {
-                        "repeated_float": {
-                            "value": [
-                                {"value": 51.3441467},
-                                {"value": 35.7074127},
-                                {"value": 51.3795242},
-                                {"value": 35.7357025}
-                            ]
-                        }
-                    },
-                    "building-age": {"number_range": {"maximum": "20"}},
-                    "elevator": {"boolean": {"value": True}},
-                    "has-photo": {"boolean": {"value": True}},
-                    "parking": {"boolean": {"value": True}},
-                    "size": {"number_range": {"minimum": "60", "maximum": "150"}},
-                    "category": {"str": {"value": "apartment-sell"}},
-                    "districts": {"repeated_string": {"value": ["201"]}}
-                }
-            }
-        },
-        "camera_info": {
-            "bbox": {
-                "min_latitude": 35.709418,
-                "min_longitude": 51.346308,
-                "max_latitude": 35.737709,
-                "max_longitude": 51.381686
-            },
-            "place_hash": "1|201|apartment-sell",
-            "zoom": 12.450042235879172
-        }
-    }
-    
-    paths ="TehranVilla"
-    
-    tehranvilla = DivarRequest(url,headers,payload,paths)
-    extractor(tehranvilla)
-    
-    
-    ##YousefAbad_up
-    url = "https://api.divar.ir/v8/mapview/viewport"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
-        "Content-Type": "application/json; charset=utf-8",
-        "Accept": "application/json, text/plain, */*",
-        "X-Requested-With": "XMLHttpRequest",
-        "Referer": "https://divar.ir/",
-        "Accept-Language": "fa-IR,fa;q=0.9,en-US;q=0.8,en;q=0.7"
-    }
-    
-    
-    payload = {
-        "city_ids": ["1"],
-        "search_data": {
-            "form_data": {
-                "data": {
-                    "bbox": {
-                        "repeated_float": {
-                            "value": [
-                                {"value": 51.378773},
-                                {"value": 35.717261},
-                                {"value": 51.425958},
-                                {"value": 35.754989}
-                            ]
-                        }
-                    },
-                    "building-age": {"number_range": {"maximum": "20"}},
-                    "elevator": {"boolean": {"value": True}},
-                    "has-photo": {"boolean": {"value": True}},
-                    "parking": {"boolean": {"value": True}},
-                    "size": {"number_range": {"minimum": "60", "maximum": "150"}},
-                    "category": {"str": {"value": "apartment-sell"}},
-                    "districts": {"repeated_string": {"value": ["90"]}}
-                }
-            }
-        },
-        "camera_info": {
-            "bbox": {
-                "min_latitude": 35.717261,
-                "min_longitude": 51.378773,
-                "max_latitude": 35.754989,
-                "max_longitude": 51.425958
-            },
-            "place_hash": "1|90|apartment-sell",
-            "zoom": 12.7
-        }
-    }
-    
-    paths ="YousefAbad_up"
-    
-    YousefAbad_up = DivarRequest(url,headers,payload,paths)
-    extractor(YousefAbad_up)
-    
-    
\ No newline at end of file
+def run(workers: int = DISTRICT_WORKERS, max_requests: Optional[int] = MAX_REQUESTS,
+        force: bool = False, only: Optional[List[str]] = None, cache_mode: str = http_cache.DEFAULT_MODE):
+    # only the districts whose refresh_interval has elapsed (all of them with force=True)
+    jobs = planner.plan(force=force, only=only)
+    if not jobs:
+        print("No district is due for a refresh.")
+        return {}
+    return run_jobs(jobs, workers, max_requests, cache_mode)
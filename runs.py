@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# runs.py
+# Discovery of stored scrape runs: divar_results/<district>/<YYYYmmdd_HHMMSS>/
+# holding summary_<ts>.json (plus versioned summary_<ts>.v<N>.json written by
+# backfill.py) and the raw posts_collected_<ts>.* snapshot.
+#
+# Runs compacted into monthly archives (compaction.py) are listed too; their
+# files are archive.ArchivedFile objects, readable like Paths (read_bytes,
+# open, stat) but read-only. A run folder on disk wins over an archived copy.
+
+import json
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+from archive import ArchivedFile, archived_runs
+
+RESULTS_ROOT = Path("divar_results")
+RUN_DIR_RE = re.compile(r"^\d{8}_\d{6}$")
+SUMMARY_RE = re.compile(r"^summary_(\d{8}_\d{6})(?:\.v(\d+))?\.json$")
+RAW_SUFFIXES = (".jsonl.gz", ".jsonl", ".json.gz", ".json")
+
+
+RunFile = Union[Path, ArchivedFile]
+
+
+# (name, mtime_ns, size) -> logic version, so repeated scans in one process read
+# each summary once per change; summary_index keeps the same thing on disk
+_version_cache: Dict[tuple, int] = {}
+
+
+def version_from_bytes(name: str, raw: bytes) -> int:
+    # The logic version the summary was built with: its "logic" fingerprint
+    # (aggregation.logic_fingerprint), so a summary_<ts>.json the scraper wrote
+    # with the current logic counts as current. Summaries from before the
+    # fingerprint existed fall back to the file name: .v<N> or 1 for the original.
+    m = SUMMARY_RE.match(name)
+    if not m:
+        return 0
+    from_name = int(m.group(2)) if m.group(2) else 1
+    try:
+        logic = json.loads(raw).get("logic") or {}
+        return int(logic.get("version") or from_name)
+    except (ValueError, AttributeError):
+        return from_name
+
+
+def summary_version(path: RunFile) -> int:
+    name = path.name if hasattr(path, "name") else Path(path).name
+    if not SUMMARY_RE.match(name):
+        return 0
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    if key not in _version_cache:
+        try:
+            _version_cache[key] = version_from_bytes(name, path.read_bytes())
+        except OSError:
+            _version_cache[key] = version_from_bytes(name, b"")
+    return _version_cache[key]
+
+
+class Run:
+    def __init__(self, district: str, path: Path, archived: Optional[Dict[str, ArchivedFile]] = None):
+        # archived: file name -> ArchivedFile for a compacted run (path then doesn't exist)
+        self.district = district
+        self.path = Path(path)
+        self.ts = self.path.name
+        self.archived = archived
+
+    def __repr__(self):
+        return f"Run({self.district}/{self.ts}{', archived' if self.archived is not None else ''})"
+
+    def files(self) -> Dict[str, RunFile]:
+        if self.archived is not None:
+            return dict(self.archived)
+        return {f.name: f for f in self.path.iterdir() if f.is_file()} if self.path.is_dir() else {}
+
+    def _summaries(self) -> List[RunFile]:
+        if self.archived is not None:
+            return [f for f in self.archived.values() if SUMMARY_RE.match(f.name)]
+        return sorted(self.path.glob("summary_*.json"))
+
+    def summary_files(self, version_of: Callable[[RunFile], int] = summary_version) -> Dict[int, RunFile]:
+        # logic version -> file; on a tie the backfilled summary_<ts>.v<N>.json wins.
+        # version_of lets summary_index answer from its stored versions.
+        out = {}
+        for f in sorted(self._summaries(), key=lambda f: f.name != f"summary_{self.ts}.json"):
+            v = version_of(f)
+            if v:
+                out[v] = f
+        return out
+
+    def best_summary(self, version_of: Callable[[RunFile], int] = summary_version) -> Optional[RunFile]:
+        # highest logic version available for this run
+        files = self.summary_files(version_of)
+        return files[max(files)] if files else None
+
+    def original_summary(self) -> Optional[RunFile]:
+        # the summary the scraper wrote (requested sizes, range outcomes), whatever its logic version
+        return next((f for f in self._summaries() if f.name == f"summary_{self.ts}.json"), None)
+
+    def raw_posts_file(self) -> Optional[RunFile]:
+        for suffix in RAW_SUFFIXES:
+            name = f"posts_collected_{self.ts}{suffix}"
+            if self.archived is not None:
+                if name in self.archived:
+                    return self.archived[name]
+                continue
+            f = self.path / name
+            if f.exists():
+                return f
+        return None
+
+
+def list_districts(root: Path = RESULTS_ROOT) -> List[str]:
+    root = Path(root)
+    if not root.exists():
+        return []
+    return sorted(d.name for d in root.iterdir() if d.is_dir() and not d.name.startswith("."))
+
+
+def iter_runs(root: Path = RESULTS_ROOT, district: Optional[str] = None) -> Iterator[Run]:
+    root = Path(root)
+    for name in ([district] if district else list_districts(root)):
+        base = root / name
+        if not base.is_dir():
+            continue
+        on_disk = {d.name: d for d in base.iterdir() if d.is_dir() and RUN_DIR_RE.match(d.name)}
+        archived = archived_runs(base)
+        for ts in sorted(on_disk.keys() | archived.keys()):
+            if ts in on_disk:
+                yield Run(name, on_disk[ts])
+            else:
+                yield Run(name, base / ts, archived[ts])
@@ -2,23 +2,39 @@
 # scraper.py
 # Run with: python3.13 scraper.py
 
-import requests
 import json
 from datetime import datetime
 from pathlib import Path
-import sys
-import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ratelimit import BudgetExhausted
+from divar_client import DivarClient, range_outcome
+import partitioner
+from listing_store import SAVE_RAW_POSTS, RAW_POSTS_GZIP, ListingWriter
+from post_sink import PostSink
+import aggregation
+import lifecycle
+from parsing import parse_posts
+import metrics
 
 # ------------------------
 # Config: tweak as needed
 # ------------------------
-PRICE_FLOOR = 50_000_000
-PRICE_CEILING = 300_000_000
-REQUEST_TIMEOUT = 30
 PAGE_SIZE_GUESS = 200
-RATE_LIMIT_SLEEP = 0.12  # small delay between requests to be polite
+MAX_WORKERS = 4  # size ranges fetched concurrently; 1 = old serial behaviour
+SAVE_DEBUG_PAYLOADS = False  # dump every request payload (request_payload_debug_<cell>_page<N>.json)
+
+# one pooled client for the whole process unless the caller passes its own
+_shared_client = None
+
+
+def shared_client() -> DivarClient:
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = DivarClient()
+    return _shared_client
 
 class DivarRequest:
     def __init__(self, url: str, headers: dict, payload: dict, path: str):
@@ -27,12 +43,13 @@ class DivarRequest:
         self.payload = payload
         self.path = path
 
-def extractor(diverRequest: DivarRequest):
+def extractor(diverRequest: DivarRequest, workers: int = MAX_WORKERS, client: Optional[DivarClient] = None):
 
     url = diverRequest.url
     headers = diverRequest.headers
     payload = diverRequest.payload
     path_d = diverRequest.path
+    client = client or shared_client()
 
     # ------------------------
     # Output setup & helpers
@@ -40,109 +57,13 @@ def extractor(diverRequest: DivarRequest):
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     out_dir = Path("./divar_results/" + path_d) / ts
     out_dir.mkdir(parents=True, exist_ok=True)
+    # request/parse/phase metrics of this run -> metrics_<ts>.json next to the summary
+    run_metrics = metrics.Metrics(district=path_d)
 
     def save_json(data: Any, filename: str):
         with open(out_dir / filename, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
 
-    # ------------------------
-    # Parsers (for price, age, size)
-    # ------------------------
-    PERSIAN_DIGITS = "۰۱۲۳۴۵۶۷۸۹"
-    ENGLISH_DIGITS = "0123456789"
-
-    def persian_to_int(num_str: str) -> Optional[int]:
-        if not isinstance(num_str, str):
-            return None
-        s = num_str
-        for p, e in zip(PERSIAN_DIGITS, ENGLISH_DIGITS):
-            s = s.replace(p, e)
-        s = re.sub(r"[^\d]", "", s)
-        return int(s) if s else None
-
-    WORDS_MAP = {
-        "صفر":0, "یک":1, "دو":2, "سه":3, "چهار":4, "پنج":5, "شش":6, "هفت":7, "هشت":8, "نه":9,
-        "ده":10, "یازده":11, "دوازده":12, "سیزده":13, "چهارده":14, "پانزده":15, "شانزده":16,
-        "هفده":17, "هجده":18, "نوزده":19, "بیست":20, "سی":30, "چهل":40, "پنجاه":50, "شصت":60,
-        "هفتاد":70, "هشتاد":80, "نود":90, "صد":100, "دویست":200, "سیصد":300, "چهارصد":400,
-        "پانصد":500, "ششصد":600, "هفتصد":700, "هشتصد":800, "نهصد":900, "هزار":1000,
-        "میلیون":1_000_000, "میلیارد":1_000_000_000
-    }
-
-    def words_to_number(text: str) -> Optional[int]:
-        if not isinstance(text, str):
-            return None
-        text = text.replace("و", " ").replace("-", " ")
-        total, temp = 0, 0
-        for part in text.split():
-            if part in WORDS_MAP:
-                val = WORDS_MAP[part]
-                if val >= 1000:
-                    temp = max(1, temp) * val
-                    total += temp
-                    temp = 0
-                else:
-                    temp += val
-        total += temp
-        return total if total != 0 else None
-
-    def parse_price(text: str) -> Optional[int]:
-        if not text:
-            return None
-        n = persian_to_int(text)
-        if n is not None:
-            if "میلیارد" in text:
-                n *= 1_000_000_000
-            elif "میلیون" in text:
-                n *= 1_000_000
-            return n
-        n = words_to_number(text)
-        if n is not None:
-            if "میلیارد" in text:
-                n *= 1_000_000_000
-            elif "میلیون" in text:
-                n *= 1_000_000
-            return n
-        return None
-
-    def parse_age(chips: List[Dict[str, Any]]) -> Optional[int]:
-        if not chips:
-            return None
-        for chip in chips:
-            title = chip.get("title", "")
-            if not title:
-                continue
-            if "نوساز" in title:
-                return 0
-            if "سال" in title:
-                m = re.search(r"[\d۰-۹]+", title)
-                if m:
-                    return persian_to_int(m.group())
-                w = words_to_number(title)
-                if w is not None:
-                    return w
-        return None
-
-    def parse_size(map_post: Dict[str, Any]) -> Optional[int]:
-        # attempts to find size in price_fields and chips exactly like your original
-        #for field in map_post.get("price_fields", []):
-        #    title = field.get("title", "")
-        #    if any(k in title for k in ["متراژ", "مساحت", "متر" , "زیربنا" , "زیر بنا"]):
-        #        val = field.get("value", "")
-        #        s = persian_to_int(val) or words_to_number(val)
-        #        if s:
-        #            return s
-        for chip in map_post.get("chips", []):
-            title = chip.get("title", "")
-            if any(k in title for k in ["متراژ", "مساحت", "متر" , "زیربنا" , "زیر بنا"]):
-                s = persian_to_int(title) or words_to_number(title)
-                if s:
-                    return s
-        return None
-
-    def avg(lst: List[float]) -> float:
-        return sum(lst)/len(lst) if lst else 0.0
-
     # ------------------------
     # Find size.number_range anywhere in the payload (recursive search)
     # ------------------------
@@ -170,20 +91,6 @@ def extractor(diverRequest: DivarRequest):
                     return r
         return None
 
-    # ------------------------
-    # Build 5-sqm intervals strictly from the given min..max
-    # ------------------------
-    def build_5sqm_intervals(min_sqm: int, max_sqm: int, step: int = 5) -> List[tuple]:
-        intervals = []
-        current = min_sqm
-        while current <= max_sqm:
-            hi = current + (step - 1)
-            if hi > max_sqm:
-                hi = max_sqm
-            intervals.append((current, hi))
-            current = hi + 1
-        return intervals
-
     # ------------------------
     # Try to inject size filters into a copy of the payload (prefer 'size.number_range' if possible)
     # ------------------------
@@ -255,9 +162,11 @@ def extractor(diverRequest: DivarRequest):
                     return meta.get(k)
         return None
 
-    def fetch_for_payload_with_pagination(base_url: str, headers: dict, payload_in: dict, timeout=REQUEST_TIMEOUT):
-        combined = []
-        seen_ids = set()
+    def fetch_for_payload_with_pagination(base_url: str, headers: dict, payload_in: dict, outcome: dict,
+                                          on_page: Callable[[List[Dict[str, Any]]], int], cell_tag: str = ""):
+        # Pages are handed to on_page (the district's PostSink) as they arrive, nothing is buffered.
+        # outcome (see divar_client.range_outcome) is filled in with status/pages/posts.
+        # cell_tag names this cell's payload dumps, so parallel cells never share a file.
         page_num = 1
 
         p = json.loads(json.dumps(payload_in))
@@ -275,22 +184,25 @@ def extractor(diverRequest: DivarRequest):
                     p["offset"] = (page_num - 1) * PAGE_SIZE_GUESS
 
             try:
-                save_json(p, f"request_payload_debug_page{page_num}.json")
-                resp = requests.post(base_url, headers=headers, json=p, timeout=timeout)
-                resp.raise_for_status()
-                data_local = resp.json()
+                if SAVE_DEBUG_PAYLOADS:
+                    save_json(p, f"request_payload_debug_{cell_tag}_page{page_num}.json")
+                data_local = client.post_json(base_url, headers, p)
+            except BudgetExhausted as e:
+                print(f"Stopping range early: {e}")
+                outcome["status"], outcome["error"] = "budget_exhausted", str(e)
+                break
             except Exception as e:
                 print("Error fetching posts (pagination):", e)
+                outcome["status"], outcome["error"] = "failed", str(e)
                 break
+            outcome["pages"] += 1
 
             posts_chunk = extract_posts_from_response(data_local) or []
-            for post in posts_chunk:
-                pid = post.get("id") or post.get("token") or post.get("post_token") or post.get("postId")
-                if not pid:
-                    pid = json.dumps(post, sort_keys=True, ensure_ascii=False)
-                if pid not in seen_ids:
-                    combined.append(post)
-                    seen_ids.add(pid)
+            metrics.inc("pages_total")
+            metrics.observe("posts_per_page", len(posts_chunk), buckets=metrics.COUNT_BUCKETS)
+            outcome["last_page_posts"] = len(posts_chunk)
+            outcome["posts"] += len(posts_chunk)
+            outcome["new_posts"] = outcome.get("new_posts", 0) + on_page(posts_chunk)
 
             if len(posts_chunk) < PAGE_SIZE_GUESS and not find_next_cursor(data_local):
                 break
@@ -300,19 +212,15 @@ def extractor(diverRequest: DivarRequest):
                 for ck in ("cursor", "next_cursor", "continuation", "last_token"):
                     p[ck] = cursor
                 page_num += 1
-                time.sleep(RATE_LIMIT_SLEEP)
                 continue
             else:
                 if supports_page:
                     page_num += 1
                     if not posts_chunk:
                         break
-                    time.sleep(RATE_LIMIT_SLEEP)
                     continue
                 break
 
-        return combined
-
     # ------------------------
     # Determine requested min/max either from payload or default
     # ------------------------
@@ -322,167 +230,145 @@ def extractor(diverRequest: DivarRequest):
     else:
         min_requested, max_requested = 75, 120
 
-    # Build size ranges strictly from the requested interval
-    size_ranges = build_5sqm_intervals(min_requested, max_requested, step=5)
+    # Plan size ranges from the requested interval: 5 m² slices, merged where the
+    # previous run saw few posts. Saturated cells are split further while fetching.
+    phase_t = time.perf_counter()
+    history = partitioner.load_history(out_dir.parent, exclude=out_dir)
+    cells = partitioner.plan_cells(min_requested, max_requested, history)
+    default_bbox = partitioner.get_bbox(payload)
     print(f"Using requested size range: {min_requested} - {max_requested}")
-    print(f"Will request {len(size_ranges)} ranges: {size_ranges}")
+    print(f"Will request {len(cells)} ranges: {[(c['min'], c['max']) for c in cells]}"
+          + (" (merged using previous run)" if history else ""))
 
     # ------------------------
-    # Request each interval (server-side) and collect posts (deduped)
+    # Request each interval (server-side) and stream posts (deduped) through the sink:
+    # raw post -> JSON Lines file, parsed row -> columnar store + running aggregates
     # ------------------------
-    all_posts_combined = []
-    all_seen_ids = set()
-
-    for (min_sqm, max_sqm) in size_ranges:
-        print(f"Requesting server for size {min_sqm}-{max_sqm} ...")
+    run_metrics.observe("phase_seconds", time.perf_counter() - phase_t, phase="plan")
+    posts_filename = None
+    if SAVE_RAW_POSTS:
+        posts_filename = f"posts_collected_{ts}.jsonl" + (".gz" if RAW_POSTS_GZIP else "")
+    # every new row goes to the store (ListingWriter) and to the summary's running columns
+    summary_columns = aggregation.SummaryColumns()
+    sink = PostSink(parse_posts, summary_columns.add, ListingWriter(path_d, ts),
+                    out_dir / posts_filename if posts_filename else None)
+
+    range_outcomes = []
+
+    def fetch_cell(cell: dict) -> dict:
+        min_sqm, max_sqm = cell["min"], cell["max"]
+        where = f" in bbox {cell['bbox']}" if cell["bbox"] else ""
+        print(f"Requesting server for size {min_sqm}-{max_sqm}{where} ...")
+        outcome = range_outcome(min_sqm, max_sqm, cell["bbox"])
         modified_payload = try_set_size_filters(payload, min_sqm, max_sqm)
-        posts_for_range = fetch_for_payload_with_pagination(url, headers, modified_payload)
-        time.sleep(0.02)
-
-        for post in posts_for_range:
-            pid = post.get("map_post_card").get("id") or post.get("map_post_card").get("token") or post.get("map_post_card").get("post_token") or post.get("map_post_card").get("postId")
-            if not pid:
-                pid = json.dumps(post, sort_keys=True, ensure_ascii=False)
-            if pid not in all_seen_ids:
-                all_posts_combined.append(post)
-                all_seen_ids.add(pid)
-
-        print(f"  fetched {len(posts_for_range)} posts for this range; cumulative unique posts: {len(all_posts_combined)}")
-        time.sleep(RATE_LIMIT_SLEEP)
-
-    # If nothing collected, fallback to a single paginated request
-    if not all_posts_combined:
-        print("No posts collected per-range. Falling back to a single paginated request without size filters.")
-        fallback_posts = fetch_for_payload_with_pagination(url, headers, payload)
-        for post in fallback_posts:
-            pid = post.get("id") or post.get("token") or post.get("post_token") or post.get("postId")
-            if not pid:
-                pid = json.dumps(post, sort_keys=True, ensure_ascii=False)
-            if pid not in all_seen_ids:
-                all_posts_combined.append(post)
-                all_seen_ids.add(pid)
-
-    print(f"Collected total unique posts (before client-side filtering): {len(all_posts_combined)}")
-    posts = all_posts_combined
-
-    # Save raw posts for traceability
-    posts_filename = f"posts_collected_{ts}.json"
-    save_json(posts, posts_filename)
-    print(f"Saved collected posts -> {out_dir / posts_filename}")
+        if cell["bbox"]:
+            partitioner.try_set_bbox(modified_payload, cell["bbox"])
+        # everything reported below (client, sink) is tagged with this size range
+        with metrics.use(run_metrics, range=f"{min_sqm}-{max_sqm}"):
+            with metrics.timer("range_seconds"):
+                fetch_for_payload_with_pagination(url, headers, modified_payload, outcome, sink.add_page,
+                                                  partitioner.cell_tag(cell))
+            metrics.inc("ranges_total", status=outcome["status"])
+        return outcome
+
+    # Cells run concurrently; pacing comes from the shared limiter, not sleeps.
+    # A saturated cell is kept (dedupe absorbs the overlap) and its children are queued.
+    phase_t = time.perf_counter()
+    try:
+        cell_results = []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(cells)))) as pool:
+            futures = {pool.submit(fetch_cell, c): (i,) for i, c in enumerate(cells)}
+            cell_of = {f: c for f, c in zip(futures, cells)}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for f in done:
+                    order, cell = futures.pop(f), cell_of.pop(f)
+                    outcome = f.result()
+                    cell_results.append((order, outcome))
+                    print(f"  size {cell['min']}-{cell['max']}: fetched {outcome['posts']} posts; cumulative unique posts: {sink.unique}")
+                    if partitioner.is_saturated(outcome):
+                        children = partitioner.split_cell(cell, default_bbox)
+                        outcome["split"] = len(children)
+                        if not children:
+                            outcome["status"] = "saturated"
+                        for j, child in enumerate(children):
+                            cf = pool.submit(fetch_cell, child)
+                            futures[cf], cell_of[cf] = order + (j,), child
+        range_outcomes = [o for _, o in sorted(cell_results, key=lambda r: r[0])]
+        run_metrics.observe("phase_seconds", time.perf_counter() - phase_t, phase="fetch")
+
+        # If nothing collected, fallback to a single paginated request
+        if not sink.unique:
+            print("No posts collected per-range. Falling back to a single paginated request without size filters.")
+            fallback_outcome = range_outcome(min_requested, max_requested)
+            fallback_outcome["fallback"] = True
+            range_outcomes.append(fallback_outcome)
+            phase_t = time.perf_counter()
+            with metrics.use(run_metrics, range="fallback"):
+                fetch_for_payload_with_pagination(url, headers, payload, fallback_outcome, sink.add_page)
+            run_metrics.observe("phase_seconds", time.perf_counter() - phase_t, phase="fallback")
+    finally:
+        store_files = sink.close()
+
+    incomplete = [o for o in range_outcomes if o["status"] != "complete"]
+    if incomplete:
+        print(f"WARNING: {len(incomplete)} of {len(range_outcomes)} ranges did not complete: "
+              + ", ".join(f"{o['min']}-{o['max']} ({o['status']})" for o in incomplete))
+    print(f"Collected total unique posts (before client-side filtering): {sink.unique}")
+    if posts_filename:
+        print(f"Saved collected posts -> {out_dir / posts_filename}")
+    print(f"Appended {sink.writer.total} listings -> {', '.join(str(f) for f in store_files) or 'nothing'}")
 
     # ------------------------
-    # CLIENT-SIDE STRICT FILTERING:
-    # Only keep posts whose parsed size is known and between min_requested..max_requested inclusive.
-    # This ensures averages only use items actually within the requested range.
+    # Summary: one vectorised pass over the columns collected while streaming
+    # (bucket edges, percentiles and price floor/ceiling come from config.yaml)
     # ------------------------
-    filtered_posts: List[Dict[str, Any]] = []
-    for post in posts:
-        map_post = post.get("map_post_card", {}) or {}
-        parsed_size = parse_size(map_post)
-        # keep only if parsed_size exists and is within requested bounds
-        if parsed_size is not None and (min_requested <= parsed_size <= max_requested):
-            filtered_posts.append(post)
-    print(f"After client-side size filtering (keeping only posts with parsed size in {min_requested}-{max_requested}): {len(filtered_posts)}")
-
-    # Replace posts with filtered_posts for subsequent calculations
-    posts = filtered_posts
-
-    # ------------------------
-    # The rest of your original parsing/summary logic, but operating on 'posts' which
-    # now contains only items within the requested size range and have known parsed sizes.
-    # ------------------------
-    valid_prices = []
-    age_intervals = {"0-4": [], "5-9": [], "10-14": [], "15-20": []}
-    # Keep the same coarse size buckets for compatibility, but they will be computed from filtered posts.
-    size_intervals = {"<80": [], "80-120": [], ">120": []}
-    age_size_matrix = {age: {"<80": [], "80-120": [], ">120": []} for age in age_intervals}
-
-    parsed_rows: List[Dict[str, Any]] = []
-
-    for post in posts:
-        map_post = post.get("map_post_card", {}) or {}
-        item_id = map_post.get("id") or map_post.get("token")
-        item_title = map_post.get("title")
-        price_per_meter = None
-        for field in map_post.get("price_fields", []):
-            if "متری" in field.get("title", ""):
-                price_per_meter = parse_price(field.get("value", ""))
-                break
-        age = parse_age(map_post.get("chips", []) or [])
-        size = parse_size(map_post)
-
-        parsed_rows.append({
-            "id": item_id,
-            "title": item_title,
-            "price_per_sqm": price_per_meter,
-            "age": age,
-            "size": size,
-        })
-
-        if price_per_meter and PRICE_FLOOR <= price_per_meter <= PRICE_CEILING:
-            valid_prices.append(price_per_meter)
-
-            # age_key classification
-            age_key = None
-            if age is not None:
-                if 0 <= age <= 4:
-                    age_key = "0-4"
-                elif 5 <= age <= 9:
-                    age_key = "5-9"
-                elif 10 <= age <= 14:
-                    age_key = "10-14"
-                elif 15 <= age <= 20:
-                    age_key = "15-20"
-
-            if age_key:
-                age_intervals[age_key].append(price_per_meter)
-                if size is not None:
-                    if size <= 80:
-                        age_size_matrix[age_key]["<80"].append(price_per_meter)
-                    elif 80 < size < 120:
-                        age_size_matrix[age_key]["80-120"].append(price_per_meter)
-                    else:
-                        age_size_matrix[age_key][">120"].append(price_per_meter)
-
-            # size-only buckets
-            if size is not None:
-                if size <= 80:
-                    size_intervals["<80"].append(price_per_meter)
-                elif 80 < size < 120:
-                    size_intervals["80-120"].append(price_per_meter)
-                else:
-                    size_intervals[">120"].append(price_per_meter)
+    phase_t = time.perf_counter()
+    stats = aggregation.summarise(summary_columns.columns(), min_requested, max_requested,
+                                  aggregation.resolve_settings(path_d))
+    print(f"After client-side size filtering (keeping only posts with parsed size in {min_requested}-{max_requested}): {stats['total_posts']}")
+    run_metrics.observe("phase_seconds", time.perf_counter() - phase_t, phase="summarise")
+
+    # Listing lifecycle: new / removed / price-changed listings against earlier runs
+    phase_t = time.perf_counter()
+    activity = next((s for s in lifecycle.update(path_d, complete={ts: not incomplete}) if s["run_ts"] == ts), None)
+    if activity:
+        print(f"Lifecycle: {activity['new']} new, {activity['removed']} removed, "
+              f"{activity['price_cuts']} price cuts, {activity['active']} active")
+    run_metrics.observe("phase_seconds", time.perf_counter() - phase_t, phase="lifecycle")
 
     summary = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "requested_size_min": min_requested,
         "requested_size_max": max_requested,
-        "total_posts": len(posts),
-        "valid_for_averages": len(valid_prices),
-        "overall_avg_price_per_sqm": int(avg(valid_prices)) if valid_prices else 0,
-        "age_intervals": {k: {"avg": int(avg(v)) if v else 0, "count": len(v)} for k, v in age_intervals.items()},
-        "size_intervals": {k: {"avg": int(avg(v)) if v else 0, "count": len(v)} for k, v in size_intervals.items()},
-        "age_size_matrix": {k: {kk: {"avg": int(avg(vv)) if vv else 0, "count": len(vv)} for kk, vv in v.items()} for k, v in age_size_matrix.items()},
+        **stats,
+        "complete": not incomplete,
+        "range_outcomes": range_outcomes,
     }
+    if activity:
+        summary["lifecycle"] = {k: v for k, v in activity.items() if k not in ("run_ts", "timestamp", "complete")}
 
     summary_filename = f"summary_{ts}.json"
     save_json(summary, summary_filename)
+    run_metrics.inc("posts_unique_total", sink.unique)
+    metrics_files = run_metrics.write(out_dir, ts)
+    print(f"Saved run metrics -> {', '.join(str(f) for f in metrics_files)}")
 
     # Print human-readable summary
     print("\n=== SUMMARY ===")
     print(f"Timestamp: {summary['timestamp']}")
     print(f"Requested size range: {min_requested} - {max_requested}")
     print(f"Total posts used (size known & in range): {summary['total_posts']}")
-    print(f"Valid listings used for averages (price in {PRICE_FLOOR}–{PRICE_CEILING}): {summary['valid_for_averages']}")
+    print(f"Valid listings used for averages (price in {summary['price_floor']}–{summary['price_ceiling']}): {summary['valid_for_averages']}")
     print(f"Overall average price per sqm: {summary['overall_avg_price_per_sqm']:,} تومان\n")
 
     print("Average by age intervals:")
     for age, v in summary["age_intervals"].items():
-        print(f"  {age} years: {v['avg']:,} تومان per sqm ({v['count']} listings)")
+        print(f"  {age} years: {v['avg']:,} تومان per sqm, median {v['median']:,} ({v['count']} listings)")
 
     print("\nAverage by size intervals:")
     for size, v in summary["size_intervals"].items():
-        print(f"  {size} sqm: {v['avg']:,} تومان per sqm ({v['count']} listings)")
+        print(f"  {size} sqm: {v['avg']:,} تومان per sqm, median {v['median']:,} ({v['count']} listings)")
 
     print("\nAge x Size matrix (avg price per sqm):")
     for age, sizes in summary["age_size_matrix"].items():
@@ -490,14 +376,13 @@ def extractor(diverRequest: DivarRequest):
         for sz, data in sizes.items():
             print(f"   {sz}: {data['avg']:,} تومان ({data['count']})")
 
-    # Optionally save parsed rows
-    # rows_filename = f"rows_parsed_{ts}.json"
-    # save_json(parsed_rows, rows_filename)
-
     return {
-        "posts_file": out_dir / posts_filename,
+        "posts_file": out_dir / posts_filename if posts_filename else None,
+        "store_files": store_files,
         "summary_file": out_dir / summary_filename,
-        "out_dir": out_dir
+        "metrics_files": metrics_files,
+        "out_dir": out_dir,
+        "complete": not incomplete,
     }
 
 # ------------------------
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# site_builder.py
+# Incremental static site build: one <district>_report.html per district plus index.html.
+#
+# Every report records what it was built from (the district's summary
+# fingerprint, which also covers the rolling aggregates derived from them,
+# the template's and static/report.js' hash, mainDraw.CHART_VERSION,
+# the pinned plotly.js version and the run its map tiles come from) in
+# .cache/site_manifest.json. A build only re-renders reports whose inputs
+# changed or whose file went missing, in parallel worker processes, and then
+# writes index.html once.
+
+import argparse
+import hashlib
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import metrics
+import profiling
+import rolling
+import summary_index
+from runs import RESULTS_ROOT, list_districts
+
+SITE_DIR = Path("./")
+TEMPLATE_DIR = Path("templates")
+TEMPLATE_FILE = "template.html"
+MANIFEST_FILE = Path(".cache/site_manifest.json")
+BUILD_WORKERS = 4
+
+
+# ------------------------
+# index.html
+# ------------------------
+INDEX_HEAD = [
+    "<!DOCTYPE html>",
+    "<html lang='en'>",
+    "<head>",
+    "  <meta charset='utf-8'>",
+    "  <meta name='viewport' content='width=device-width,initial-scale=1'>",
+    "  <title>Divar Results Index</title>",
+    "  <style>",
+    "    :root{",
+    "      --bg:#121212; --card:#1e1e2e; --muted:#90a4ae; --text:#e0e0e0; --accent:#ffab40;",
+    "      --btn-bg:#171722; --btn-hover:#23232b;",
+    "    }",
+    "    html,body{height:100%;margin:0;padding:0;background:var(--bg);color:var(--text);font-family:'Segoe UI', Roboto, Arial, sans-serif;}",
+    "    .wrap{max-width:1100px;margin:28px auto;padding:28px;}",
+    "    header{display:flex;align-items:center;justify-content:space-between;gap:16px;flex-wrap:wrap;margin-bottom:24px;}",
+    "    h1{margin:0;font-size:1.6rem;color:var(--accent);font-weight:600}",
+    "    .subtitle{color:var(--muted);font-size:0.95rem}",
+    "    .grid{display:flex;flex-wrap:wrap;row-gap:30px;column-gap:12px;margin-top:18px}",
+    "    .btn{",
+    "      display:inline-flex;align-items:center;justify-content:center;gap:8px;",
+    "      padding:12px 18px;text-decoration:none;border-radius:10px;min-width:220px;flex-shrink:0;height:auto;",
+    "      background:linear-gradient(180deg,var(--btn-bg),var(--card));box-shadow:0 6px 18px rgba(0,0,0,0.6);color:var(--text);",
+    "      border:1px solid rgba(255,255,255,0.03);transition:transform .15s ease,box-shadow .15s ease,background .15s;",
+    "    }",
+    "    .btn .name{font-weight:600}",
+    "    .btn .meta{font-size:0.85rem;color:var(--muted)}",
+    "    .btn:hover{transform:translateY(-6px);box-shadow:0 14px 30px rgba(0,0,0,0.7);background:var(--btn-hover)}",
+    "    .controls{display:flex;gap:12px;align-items:center;flex-wrap:wrap}",
+    "    .search{padding:8px 12px;border-radius:8px;background:#0f0f12;border:1px solid rgba(255,255,255,0.03);color:var(--text)}",
+    "    footer{margin-top:28px;color:var(--muted);font-size:0.85rem;text-align:center}",
+    "    @media (max-width:640px){.btn{min-width:100%;justify-content:flex-start;padding:12px;border-radius:12px}}",
+    "  </style>",
+    "</head>",
+    "<body>",
+    "  <div class='wrap'>",
+    "    <header>",
+    "      <div>",
+    "        <h1>Reports</h1>",
+    "        <div class='subtitle'>Divar scrape results — open a folder to view its report</div>",
+    "      </div>",
+    "      <div class='controls'>",
+    "        <!-- optional search -->",
+    "        <input class='search' placeholder='Filter reports (client-side)...' oninput=\"(function(){const q=this.value.toLowerCase();document.querySelectorAll('.btn').forEach(b=>{b.style.display = (b.datasetName.toLowerCase().includes(q)||b.datasetMeta.toLowerCase().includes(q)) ? 'inline-flex' : 'none';});}).call(this)\" />",
+    "      </div>",
+    "    </header>",
+    "",
+    "    <div class='grid'>",
+    "      <!-- Buttons for each folder will be inserted here -->",
+    "      <!-- Example: <a class='btn' href='FOLDERNAME_report.html'>FOLDERNAME</a> -->",
+]
+
+INDEX_TAIL = [
+    "    </div>",
+    "",
+    "    <footer>",
+    "      Generated reports — open locally in your browser (the map's listings layer needs the site served over HTTP). <span style='color:var(--muted)'>Dark, modern theme</span>",
+    "    </footer>",
+    "  </div>",
+    "",
+    "  <script>",
+    "    document.addEventListener('DOMContentLoaded', ()=>{",
+    "      document.querySelectorAll('.grid a.btn').forEach(a=>{",
+    "        a.datasetName = a.dataset.name || a.textContent.trim();",
+    "        a.datasetMeta = a.dataset.meta || '';",
+    "      });",
+    "    });",
+    "  </script>",
+    "</body>",
+    "</html>",
+]
+
+
+def report_name(district: str) -> str:
+    return f"{district}_report.html"
+
+
+def write_index(districts: List[str], site_dir: Path = SITE_DIR, prefetch: Optional[List[str]] = None) -> bool:
+    # returns True when index.html actually changed; `prefetch` assets (the pinned
+    # plotly.js) are fetched while the index is idle so opening a report only
+    # downloads its own small data bundle
+    links = [f"      <a class='btn' href='{report_name(d)}' data-name='{d}'>{d}</a>" for d in districts]
+    head = list(INDEX_HEAD)
+    head[head.index("</head>"):head.index("</head>")] = [f"  <link rel='prefetch' href='{u}'>" for u in prefetch or []]
+    html = "\n".join(head + links + INDEX_TAIL)
+    index_file = Path(site_dir) / "index.html"
+    if index_file.exists() and index_file.read_text(encoding="utf-8") == html:
+        return False
+    index_file.write_text(html, encoding="utf-8")
+    print(f"Index created at: {index_file}")
+    return True
+
+
+# ------------------------
+# Dependency tracking
+# ------------------------
+def _file_sha(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16]
+
+
+def load_manifest(manifest_file: Path = MANIFEST_FILE) -> Dict[str, Any]:
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: Dict[str, Any], manifest_file: Path = MANIFEST_FILE):
+    manifest_file = Path(manifest_file)
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_file.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(manifest_file)
+
+
+def report_inputs(district: str, template_sha: str, chart_version: str,
+                  index_file: Path = summary_index.INDEX_FILE,
+                  root: Path = RESULTS_ROOT) -> Optional[Dict[str, Any]]:
+    # None when the district has no readable summaries (nothing to render)
+    import tiles
+
+    summaries = summary_index.fingerprint(district, index_file, root)
+    if summaries is None:
+        return None
+    return {"summaries": summaries, "template": template_sha, "chart": chart_version,
+            "tiles": f"{tiles.TILES_VERSION}/{tiles.latest_run(district)}"}
+
+
+# ------------------------
+# Rendering (runs in worker processes)
+# ------------------------
+def render_district(district: str, site_dir: str, template_dir: str, template_file: str,
+                    index_file: str, root: str, profile: Optional[List[str]] = None) -> Dict[str, Any]:
+    # the builder has already refreshed the index, so only read it here;
+    # returns this render's metrics snapshot for the build's metrics file.
+    # profile = [root, run ts] of the parent's profiler, if profiling
+    import mainDraw
+    import tiles
+
+    if profile:
+        profiling.enable(Path(profile[0]), profile[1])
+    registry = metrics.Metrics(district=district)
+    with profiling.phase("render", district), metrics.use(registry), \
+            metrics.timer("render_seconds", step="total"):
+        with metrics.timer("render_seconds", step="load_summaries"):
+            summaries = summary_index.load(district, Path(index_file), root=Path(root))
+            smoothed = rolling.load(district, Path(root))
+        with metrics.timer("render_seconds", step="tiles"):
+            tiles_url = tiles.export(district, Path(site_dir))
+        out = Path(site_dir) / report_name(district)
+        mainDraw.render_report(summaries, out, template_dir, template_file, tiles_url=tiles_url, rolling=smoothed)
+    registry.inc("summaries_total", len(summaries))
+    return registry.snapshot()
+
+
+def build(root: Path = RESULTS_ROOT, site_dir: Path = SITE_DIR, workers: int = BUILD_WORKERS,
+          force: bool = False, districts: Optional[List[str]] = None,
+          template_dir: Path = TEMPLATE_DIR, template_file: str = TEMPLATE_FILE,
+          manifest_file: Path = MANIFEST_FILE,
+          index_file: Path = summary_index.INDEX_FILE) -> Dict[str, List[str]]:
+    from plotly.offline import get_plotlyjs_version
+    from mainDraw import CHART_VERSION, REPORT_JS, STATIC_SRC
+
+    site_dir = Path(site_dir)
+    all_districts = list_districts(root)
+    targets = [d for d in all_districts if not districts or d in districts]
+    template_sha = _file_sha(Path(template_dir) / template_file) + _file_sha(STATIC_SRC / REPORT_JS)
+    chart_version = f"{CHART_VERSION}/plotly-{get_plotlyjs_version()}"
+    manifest = load_manifest(manifest_file)
+    reports = manifest.setdefault("reports", {})
+
+    result = {"built": [], "fresh": [], "empty": [], "failed": []}
+    stale = {}
+    for district in targets:
+        summary_index.refresh(district, root, index_file)
+        rolling.update(district, root, index_file)
+        inputs = report_inputs(district, template_sha, chart_version, index_file, root)
+        if inputs is None:
+            print(f"[{district}] no summary JSON files found, skipping")
+            result["empty"].append(district)
+            continue
+        out = site_dir / report_name(district)
+        if not force and out.exists() and reports.get(district) == inputs:
+            result["fresh"].append(district)
+            continue
+        stale[district] = inputs
+
+    build_metrics = metrics.Metrics()
+    for status in ("fresh", "empty"):
+        build_metrics.inc("reports_total", len(result[status]), status=status)
+    print(f"Site build: {len(stale)} stale, {len(result['fresh'])} up to date")
+    prof = profiling.active()
+    profile = [str(prof.out.parent), prof.out.name] if prof else None
+    if stale:
+        workers = max(1, min(workers, len(stale)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(render_district, d, str(site_dir), str(template_dir), template_file, str(index_file),
+                            str(root), profile): d
+                for d in stale
+            }
+            for fut in as_completed(futures):
+                district = futures[fut]
+                try:
+                    build_metrics.merge(fut.result())
+                except Exception as e:
+                    print(f"[{district}] report failed: {e!r}")
+                    result["failed"].append(district)
+                    reports.pop(district, None)
+                    continue
+                reports[district] = stale[district]
+                result["built"].append(district)
+
+    # index lists every district that has a report on disk
+    import mainDraw
+    write_index([d for d in all_districts if (site_dir / report_name(d)).exists()], site_dir,
+                prefetch=[mainDraw.plotly_asset(site_dir), mainDraw.report_js_asset(site_dir)])
+    save_manifest(manifest, manifest_file)
+    build_metrics.inc("reports_total", len(result["built"]), status="built")
+    build_metrics.inc("reports_total", len(result["failed"]), status="failed")
+    build_metrics.write(Path(manifest_file).parent, "site")
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build the static report site incrementally.")
+    ap.add_argument("--root", default=str(RESULTS_ROOT))
+    ap.add_argument("--out", default=str(SITE_DIR))
+    ap.add_argument("--district", action="append", help="only consider these districts (repeatable)")
+    ap.add_argument("--workers", type=int, default=BUILD_WORKERS)
+    ap.add_argument("--force", action="store_true", help="rebuild every report")
+    args = ap.parse_args()
+
+    result = build(Path(args.root), Path(args.out), args.workers, args.force, args.district)
+    print(f"built {len(result['built'])}, up to date {len(result['fresh'])}, "
+          f"empty {len(result['empty'])}, failed {len(result['failed'])}")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
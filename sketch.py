@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# sketch.py
+# Mergeable quantile sketches of price per m² (a merging t-digest). Every
+# summary cell gets one (aggregation.summarise -> summary["sketches"]), so
+# medians, IQR and trimmed means can be computed for any run, any range of
+# runs or any set of districts by merging sketches instead of re-reading raw
+# posts.
+#
+# A sketch is a sorted list of centroids (mean, weight) plus the exact min and
+# max. Centroids are grouped by the arcsine scale function, so the tails keep
+# single listings while the middle holds larger groups: about compression / 2
+# centroids however many listings went in. Small cells are stored exactly.
+# Sketches hold every parsed price of the size range, without the summary's
+# price_floor / price_ceiling cut, so --trim (and the IQR) decide how much of
+# the tails is set aside.
+#
+#   python sketch.py --district Gisha --cell overall --since 2025-11-01
+#   python sketch.py --district Gisha --district ShahrAra --cell "age_size:0-4/<80"
+#
+# Cells are named like rolling.py's series: overall, age:<label>, size:<label>
+# and age_size:<age label>/<size label>.
+
+import argparse
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+import summary_index
+from runs import RESULTS_ROOT
+
+DEFAULT_COMPRESSION = 100
+DEFAULT_TRIM = 0.1  # trimmed mean drops this share of listings at each end
+CELL_KINDS = ("overall", "age", "size", "age_size")
+
+
+class QuantileSketch:
+    def __init__(self, mean: Sequence[float] = (), weight: Sequence[float] = (),
+                 lo: Optional[float] = None, hi: Optional[float] = None,
+                 compression: int = DEFAULT_COMPRESSION):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.weight = np.asarray(weight, dtype=np.float64)
+        self.lo, self.hi = lo, hi
+        self.compression = compression
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, compression: int = DEFAULT_COMPRESSION) -> "QuantileSketch":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return cls(compression=compression)
+        # one unit centroid per listing, so repeated prices keep their own ranks
+        # and a cell too small to compress is exactly its sorted values
+        mean = np.sort(values)
+        return cls(*_compress(mean, np.ones(len(mean)), compression),
+                   lo=float(mean[0]), hi=float(mean[-1]), compression=compression)
+
+    @classmethod
+    def merge(cls, sketches: Iterable["QuantileSketch"]) -> "QuantileSketch":
+        sketches = [s for s in sketches if s.count]
+        compression = max((s.compression for s in sketches), default=DEFAULT_COMPRESSION)
+        if not sketches:
+            return cls(compression=compression)
+        mean = np.concatenate([s.mean for s in sketches])
+        weight = np.concatenate([s.weight for s in sketches])
+        order = np.argsort(mean, kind="stable")
+        return cls(*_compress(mean[order], weight[order], compression),
+                   lo=min(s.lo for s in sketches), hi=max(s.hi for s in sketches), compression=compression)
+
+    @property
+    def count(self) -> int:
+        return int(self.weight.sum())
+
+    def quantile(self, q):
+        # linear interpolation between centroid centres (rank 0 .. n - 1 like
+        # np.percentile, so cells stored exactly give its answers), anchored at
+        # the exact min / max
+        if not self.count:
+            return None
+        n = self.weight.sum()
+        centres = np.cumsum(self.weight) - (self.weight + 1) / 2
+        xs = np.concatenate([[0.0], centres, [n - 1]])
+        ys = np.concatenate([[self.lo], self.mean, [self.hi]])
+        out = np.interp(np.asarray(q, dtype=np.float64) * (n - 1), xs, ys)
+        return float(out) if np.ndim(out) == 0 else out
+
+    def median(self) -> Optional[float]:
+        return self.quantile(0.5)
+
+    def iqr(self) -> Optional[float]:
+        if not self.count:
+            return None
+        q25, q75 = self.quantile([0.25, 0.75])
+        return float(q75 - q25)
+
+    def trimmed_mean(self, trim: float = DEFAULT_TRIM) -> Optional[float]:
+        # mean of the mass between ranks trim * n and (1 - trim) * n; centroids
+        # straddling a cut count with the part inside it
+        if not self.count:
+            return None
+        n = self.weight.sum()
+        upper = np.cumsum(self.weight)
+        inside = np.clip(np.minimum(upper, (1 - trim) * n) - np.maximum(upper - self.weight, trim * n), 0, None)
+        if not inside.sum():
+            return self.median()
+        return float((inside * self.mean).sum() / inside.sum())
+
+    def stats(self, trim: float = DEFAULT_TRIM) -> Dict[str, Optional[int]]:
+        if not self.count:
+            return {"count": 0, "median": None, "p25": None, "p75": None, "iqr": None, "trimmed_mean": None}
+        q25, q50, q75 = self.quantile([0.25, 0.5, 0.75])
+        return {"count": self.count, "median": int(q50), "p25": int(q25), "p75": int(q75),
+                "iqr": int(q75 - q25), "trimmed_mean": int(self.trimmed_mean(trim))}
+
+    def to_dict(self) -> Dict[str, Any]:
+        # prices are whole tomans and weights whole listings, so ints keep summaries small
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "min": int(self.lo), "max": int(self.hi),
+                "mean": np.rint(self.mean).astype(np.int64).tolist(),
+                "weight": self.weight.astype(np.int64).tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]],
+                  compression: int = DEFAULT_COMPRESSION) -> "QuantileSketch":
+        if not data or not data.get("count"):
+            return cls(compression=compression)
+        return cls(data["mean"], data["weight"], data["min"], data["max"], compression)
+
+
+def _compress(mean: np.ndarray, weight: np.ndarray, compression: int):
+    # mean sorted ascending. Centroids whose mid-rank falls in the same unit of
+    # k(q) = compression / 2pi * asin(2q - 1) are merged into one.
+    n = weight.sum()
+    q = (np.cumsum(weight) - weight / 2) / n
+    k = np.floor(compression / (2 * math.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    w = np.add.reduceat(weight, starts)
+    return np.add.reduceat(mean * weight, starts) / w, w
+
+
+# ------------------------
+# Summary cells
+# ------------------------
+def cell_sketch(summary: Dict[str, Any], cell: str = "overall") -> Optional[QuantileSketch]:
+    # the sketch of one cell of a summary; None when the summary predates
+    # sketches. summarise writes every bucket label, so a label that is not
+    # there is not one of this summary's buckets (ValueError).
+    sketches = summary.get("sketches")
+    if not sketches:
+        return None
+    compression = sketches.get("compression", DEFAULT_COMPRESSION)
+    kind, _, label = cell.partition(":")
+    if kind == "overall":
+        data = sketches.get("overall")
+    elif kind == "age":
+        data = _bucket(sketches.get("age_intervals", {}), label, "age")
+    elif kind == "size":
+        data = _bucket(sketches.get("size_intervals", {}), label, "size")
+    elif kind == "age_size":
+        age_label, _, size_label = label.partition("/")
+        matrix = sketches.get("age_size_matrix", {})
+        data = _bucket(_bucket(matrix, age_label, "age"), size_label, "size")
+    else:
+        raise ValueError(f"unknown cell {cell!r}")
+    return QuantileSketch.from_dict(data, compression)
+
+
+def _bucket(cells: Dict[str, Any], label: str, kind: str) -> Dict[str, Any]:
+    if label not in cells:
+        raise ValueError(f"unknown {kind} bucket {label!r}, expected one of: {', '.join(cells) or '(none)'}")
+    return cells[label]
+
+
+def load(districts: List[str], cell: str = "overall", since: Optional[str] = None, until: Optional[str] = None,
+         index_file: Path = summary_index.INDEX_FILE, root: Path = RESULTS_ROOT) -> Dict[str, Any]:
+    # one merged sketch over every indexed run of `districts` between since and
+    # until (inclusive, "YYYY-MM-DD[ HH:MM:SS]"). Expects summary_index refreshed.
+    # Runs summarised with other buckets (settings changed) are skipped and
+    # counted; a cell no run has is a ValueError. Runs without sketches are
+    # counted by whether backfill.py can add them: raw posts in a run folder
+    # ("without_sketch"), only in a monthly archive ("archived") or none ("no_raw").
+    from runs import iter_runs
+
+    if cell.partition(":")[0] not in CELL_KINDS:
+        raise ValueError(f"unknown cell {cell!r}")
+    sketches, runs, other_buckets, error = [], 0, 0, None
+    missing = {"without_sketch": 0, "archived": 0, "no_raw": 0}
+    for district in districts:
+        raw = None  # run ts -> where its raw posts are, looked up once a run lacks a sketch
+        for run_ts, ts, summary in summary_index.load_runs(district, index_file, since=since, root=root):
+            if until and ts.strftime(summary_index.TS_FORMAT)[:len(until)] > until:
+                break
+            try:
+                s = cell_sketch(summary, cell)
+            except ValueError as e:
+                other_buckets += 1
+                error = e
+                continue
+            if s is None:
+                if raw is None:
+                    raw = {run.ts: ("no_raw" if run.raw_posts_file() is None else
+                                    "archived" if run.archived is not None else "without_sketch")
+                           for run in iter_runs(root, district)}
+                missing[raw.get(run_ts, "no_raw")] += 1
+                continue
+            sketches.append(s)
+            runs += 1
+    if error is not None and not runs:
+        raise error
+    return {"sketch": QuantileSketch.merge(sketches), "runs": runs, "other_buckets": other_buckets, **missing}
+
+
+def main(argv=None) -> int:
+    from runs import list_districts
+
+    ap = argparse.ArgumentParser(description="Robust price statistics over merged summary sketches.")
+    ap.add_argument("--root", default=str(RESULTS_ROOT))
+    ap.add_argument("--district", action="append", help="districts to merge (repeatable, default: all)")
+    ap.add_argument("--cell", default="overall", help="overall, age:<label>, size:<label> or age_size:<age>/<size>")
+    ap.add_argument("--since", default=None, help="first run, YYYY-MM-DD[ HH:MM:SS]")
+    ap.add_argument("--until", default=None, help="last run, YYYY-MM-DD[ HH:MM:SS]")
+    ap.add_argument("--trim", type=float, default=DEFAULT_TRIM, help=f"trimmed-mean cut per end (default {DEFAULT_TRIM})")
+    args = ap.parse_args(argv)
+
+    root = Path(args.root)
+    districts = args.district or list_districts(root)
+    for district in districts:
+        summary_index.refresh(district, root)
+    started = time.perf_counter()
+    try:
+        merged = load(districts, args.cell, args.since, args.until, root=root)
+    except ValueError as e:
+        ap.error(str(e))
+    sketch, elapsed = merged["sketch"], time.perf_counter() - started
+    print(f"{', '.join(districts)} [{args.cell}]: {merged['runs']} runs merged in {elapsed * 1000:.1f} ms "
+          f"({len(sketch.mean)} centroids)"
+          + (f", {merged['without_sketch']} runs without sketches (run backfill.py)" if merged["without_sketch"] else "")
+          + (f", {merged['archived']} archived runs without sketches (compaction.py --unpack, then backfill.py)"
+             if merged["archived"] else "")
+          + (f", {merged['no_raw']} runs without sketches and without raw posts (cannot be rebuilt)"
+             if merged["no_raw"] else "")
+          + (f", {merged['other_buckets']} runs with other buckets skipped" if merged["other_buckets"] else ""))
+    if not sketch.count:
+        print("no listings")
+        return 1
+    stats = sketch.stats(args.trim)
+    print(f"listings {stats['count']:,}  median {stats['median']:,}  IQR {stats['iqr']:,} "
+          f"({stats['p25']:,} - {stats['p75']:,})  trimmed mean ({args.trim:.0%}) {stats['trimmed_mean']:,}  "
+          f"range {int(sketch.lo):,} - {int(sketch.hi):,}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# spatial.py
+# Fixed square grid over map_pin_feature lat/lon, used for
+#   - per-run cell statistics (aggregation.summarise -> summary["grid"], drawn
+#     as the report heatmap), and
+#   - SpatialIndex: every stored listing observation of a district
+#     (listing_store parts) sorted by cell, persisted in .cache/spatial/, so
+#     "median price per m² within 500 m of this point" over all history reads a
+#     handful of contiguous slices instead of every snapshot.
+#
+# Cells are cell_m x cell_m metres in an equirectangular projection at REF_LAT
+# (Tehran), so a cell id (ix, iy) means the same square in every run and district.
+#
+#   python spatial.py --district TehranVilla --lat 35.7216 --lon 51.3618 --radius 500
+
+import argparse
+import math
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+import listing_store
+
+# ------------------------
+# Config: tweak as needed (grid_cell_m / grid_min_count also in config.yaml `summary:`)
+# ------------------------
+DEFAULT_CELL_M = 250
+DEFAULT_MIN_COUNT = 3  # cells with fewer valid listings are left out of the heatmap
+REF_LAT = 35.7
+M_PER_DEG_LAT = 110_574.0
+M_PER_DEG_LON = 111_320.0 * math.cos(math.radians(REF_LAT))
+CACHE_DIR = Path(".cache/spatial")
+
+_IY_OFFSET = 2 ** 31  # keeps the iy half of the key non-negative
+
+
+# ------------------------
+# Grid
+# ------------------------
+def cell_index(lat: np.ndarray, lon: np.ndarray, cell_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    ix = np.floor(np.asarray(lon, dtype=np.float64) * M_PER_DEG_LON / cell_m).astype(np.int64)
+    iy = np.floor(np.asarray(lat, dtype=np.float64) * M_PER_DEG_LAT / cell_m).astype(np.int64)
+    return ix, iy
+
+
+def cell_key(ix: np.ndarray, iy: np.ndarray) -> np.ndarray:
+    # ix-major, so one grid column of a query window is one contiguous key range
+    return np.asarray(ix, dtype=np.int64) * 2 ** 32 + (np.asarray(iy, dtype=np.int64) + _IY_OFFSET)
+
+
+def cell_bounds(ix: int, iy: int, cell_m: float) -> Tuple[float, float, float, float]:
+    # (lon0, lat0, lon1, lat1) of one cell
+    return (ix * cell_m / M_PER_DEG_LON, iy * cell_m / M_PER_DEG_LAT,
+            (ix + 1) * cell_m / M_PER_DEG_LON, (iy + 1) * cell_m / M_PER_DEG_LAT)
+
+
+def cell_geojson(grid: Dict[str, Any]) -> Dict[str, Any]:
+    # FeatureCollection of the cell squares of a summary["grid"] block, id "ix:iy"
+    features = []
+    for ix, iy in zip(grid["ix"], grid["iy"]):
+        lon0, lat0, lon1, lat1 = cell_bounds(ix, iy, grid["cell_m"])
+        ring = [[round(x, 6), round(y, 6)] for x, y in
+                ((lon0, lat0), (lon1, lat0), (lon1, lat1), (lon0, lat1), (lon0, lat0))]
+        features.append({"type": "Feature", "id": f"{ix}:{iy}",
+                         "geometry": {"type": "Polygon", "coordinates": [ring]}, "properties": {}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def group_stats(key: np.ndarray, price: np.ndarray, *means: np.ndarray):
+    # sort once by (cell, price): each cell is a contiguous, price-sorted slice.
+    # Returns (keys, counts, median, avg) plus the per-cell mean of each extra array
+    order = np.lexsort((price, key))
+    key, price = key[order], price[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    counts = np.diff(np.r_[starts, len(key)])
+    median = (price[starts + (counts - 1) // 2] + price[starts + counts // 2]) / 2
+    avg = np.add.reduceat(price, starts) / counts
+    return (key[starts], counts, median, avg, *(np.add.reduceat(m[order], starts) / counts for m in means))
+
+
+def grid_stats(price: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+               cell_m: float = DEFAULT_CELL_M, min_count: int = DEFAULT_MIN_COUNT) -> Dict[str, Any]:
+    # price-per-m² count / median / avg per cell in one sort; inputs are the
+    # already-filtered valid listings (NaN coordinates are skipped)
+    price = np.asarray(price, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    located = ~np.isnan(lat) & ~np.isnan(lon) & ~np.isnan(price)
+    out: Dict[str, Any] = {"cell_m": cell_m, "ref_lat": REF_LAT, "min_count": min_count,
+                           "located": int(located.sum()), "ix": [], "iy": [], "count": [], "median": [], "avg": []}
+    if not located.any():
+        return out
+    ix, iy = cell_index(lat[located], lon[located], cell_m)
+    keys, counts, median, avg = group_stats(cell_key(ix, iy), price[located])
+    keep = counts >= min_count
+    keys = keys[keep]
+    out["ix"] = (keys // 2 ** 32).tolist()
+    out["iy"] = (keys % 2 ** 32 - _IY_OFFSET).tolist()
+    out["count"] = counts[keep].tolist()
+    out["median"] = median[keep].astype(np.int64).tolist()
+    out["avg"] = avg[keep].astype(np.int64).tolist()
+    return out
+
+
+# ------------------------
+# History index
+# ------------------------
+def _run_day(run_ts: str) -> int:
+    return (datetime.strptime(run_ts, listing_store.RUN_TS_FORMAT).date() - date(1970, 1, 1)).days
+
+
+class SpatialIndex:
+    # all stored observations of one district as flat arrays sorted by cell key:
+    # key, lat, lon, price (per m²), day (days since epoch), token (code into self.tokens)
+    FIELDS = ("key", "lat", "lon", "price", "day", "token")
+
+    def __init__(self, district: str, cell_m: float = DEFAULT_CELL_M,
+                 store_root: Path = listing_store.STORE_ROOT, cache_dir: Path = CACHE_DIR):
+        self.district = district
+        self.cell_m = cell_m
+        self.store_root = Path(store_root)
+        self.cache_file = Path(cache_dir) / f"{district}.{int(cell_m)}m.npz"
+        self.parts: list = []
+        self.tokens = np.empty(0, dtype=str)
+        self.arrays = self._empty()
+
+    @classmethod
+    def _empty(cls) -> Dict[str, np.ndarray]:
+        return {"key": np.empty(0, np.int64), "lat": np.empty(0), "lon": np.empty(0),
+                "price": np.empty(0), "day": np.empty(0, np.int32), "token": np.empty(0, np.int32)}
+
+    def __len__(self) -> int:
+        return len(self.arrays["key"])
+
+    def _load(self):
+        if not self.cache_file.exists():
+            return
+        try:
+            with np.load(self.cache_file, allow_pickle=False) as z:
+                self.arrays = {f: z[f] for f in self.FIELDS}
+                self.parts = z["__parts"].tolist()
+                self.tokens = z["__tokens"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"spatial index {self.cache_file} unreadable ({e}); rebuilding")
+            self.parts, self.tokens, self.arrays = [], np.empty(0, dtype=str), self._empty()
+
+    def _save(self):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_file.with_name(self.cache_file.name + ".tmp.npz")
+        np.savez(tmp, **self.arrays, __parts=np.array(self.parts, dtype=str), __tokens=self.tokens)
+        tmp.replace(self.cache_file)
+
+    def refresh(self) -> Dict[str, int]:
+        # parts are append-only, so only new part files are read; a vanished
+        # part (store rewritten) triggers a full rebuild
+        self._load()
+        current = {str(p.relative_to(self.store_root)): p
+                   for p in listing_store.iter_parts(self.district, root=self.store_root)}
+        if set(self.parts) - set(current):
+            self.parts, self.tokens, self.arrays = [], np.empty(0, dtype=str), self._empty()
+        new = sorted(set(current) - set(self.parts))
+        if not new:
+            return {"parts": len(self.parts), "added": 0, "rows": len(self)}
+
+        token_ids = {t: i for i, t in enumerate(self.tokens.tolist())}
+        chunks = {f: [self.arrays[f]] for f in self.FIELDS}
+        for name in new:
+            cols = listing_store.read_part(current[name], ["token", "price_per_sqm", "lat", "lon"])
+            keep = ~np.isnan(cols["lat"]) & ~np.isnan(cols["lon"]) & ~np.isnan(cols["price_per_sqm"])
+            lat, lon = cols["lat"][keep], cols["lon"][keep]
+            chunks["key"].append(cell_key(*cell_index(lat, lon, self.cell_m)))
+            chunks["lat"].append(lat)
+            chunks["lon"].append(lon)
+            chunks["price"].append(cols["price_per_sqm"][keep])
+            day = _run_day(cols["run_ts"][0]) if len(cols["run_ts"]) else 0
+            chunks["day"].append(np.full(int(keep.sum()), day, dtype=np.int32))
+            chunks["token"].append(np.array([-1 if t is None else token_ids.setdefault(t, len(token_ids))
+                                             for t in cols["token"][keep]], dtype=np.int32))
+        merged = {f: np.concatenate(v) for f, v in chunks.items()}
+        order = np.argsort(merged["key"], kind="stable")
+        self.arrays = {f: v[order] for f, v in merged.items()}
+        self.tokens = np.array(list(token_ids), dtype=str)
+        self.parts = sorted(current)
+        self._save()
+        return {"parts": len(self.parts), "added": len(new), "rows": len(self)}
+
+    def _window(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        # row indices of every cell overlapping the query circle's bounding box
+        ix0, iy0 = cell_index(lat - radius_m / M_PER_DEG_LAT, lon - radius_m / M_PER_DEG_LON, self.cell_m)
+        ix1, iy1 = cell_index(lat + radius_m / M_PER_DEG_LAT, lon + radius_m / M_PER_DEG_LON, self.cell_m)
+        ixs = np.arange(int(ix0), int(ix1) + 1)
+        lo = np.searchsorted(self.arrays["key"], cell_key(ixs, np.full(len(ixs), int(iy0))), "left")
+        hi = np.searchsorted(self.arrays["key"], cell_key(ixs, np.full(len(ixs), int(iy1))), "right")
+        if not len(ixs) or not (hi - lo).any():
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])
+
+    def query(self, lat: float, lon: float, radius_m: float = 500, start: Optional[date] = None,
+              end: Optional[date] = None, latest_only: bool = True, price_floor: Optional[float] = None,
+              price_ceiling: Optional[float] = None) -> Dict[str, Any]:
+        # price-per-m² stats of the listings within radius_m of (lat, lon);
+        # latest_only counts a listing once (its last observation) rather than once per run
+        rows = self._window(lat, lon, radius_m)
+        a = {f: v[rows] for f, v in self.arrays.items()}
+        # local equirectangular distance; well under 0.1% off at these radii
+        dy = (a["lat"] - lat) * M_PER_DEG_LAT
+        dx = (a["lon"] - lon) * 111_320.0 * math.cos(math.radians(lat))
+        mask = dx * dx + dy * dy <= radius_m * radius_m
+        if start is not None:
+            mask &= a["day"] >= (start - date(1970, 1, 1)).days
+        if end is not None:
+            mask &= a["day"] <= (end - date(1970, 1, 1)).days
+        if price_floor is not None:
+            mask &= a["price"] >= price_floor
+        if price_ceiling is not None:
+            mask &= a["price"] <= price_ceiling
+        price, day, token = a["price"][mask], a["day"][mask], a["token"][mask]
+        if latest_only and len(price):
+            # newest observation first within each token; untokenised rows all count
+            order = np.lexsort((-day, token))
+            token, price = token[order], price[order]
+            first = np.r_[True, token[1:] != token[:-1]] | (token < 0)
+            price = price[first]
+        out: Dict[str, Any] = {"count": int(len(price)), "radius_m": radius_m}
+        if len(price):
+            p25, median, p75 = np.percentile(price, [25, 50, 75])
+            out.update(median=int(median), avg=int(price.mean()), p25=int(p25), p75=int(p75))
+        return out
+
+
+def main(argv=None) -> int:
+    import aggregation
+
+    ap = argparse.ArgumentParser(description="Price-per-m² statistics around a point over a district's history.")
+    ap.add_argument("--district", required=True, help="district folder name, e.g. TehranVilla")
+    ap.add_argument("--lat", type=float, required=True)
+    ap.add_argument("--lon", type=float, required=True)
+    ap.add_argument("--radius", type=float, default=500, help="metres (default 500)")
+    ap.add_argument("--since", type=date.fromisoformat, default=None, help="YYYY-MM-DD")
+    ap.add_argument("--until", type=date.fromisoformat, default=None, help="YYYY-MM-DD")
+    ap.add_argument("--all-observations", action="store_true",
+                    help="count every run's observation of a listing, not just its latest")
+    args = ap.parse_args(argv)
+
+    settings = aggregation.resolve_settings(args.district)
+    index = SpatialIndex(args.district, settings["grid_cell_m"])
+    t = time.perf_counter()
+    stats = index.refresh()
+    print(f"index: {stats['rows']} observations from {stats['parts']} parts "
+          f"({stats['added']} new) in {time.perf_counter() - t:.2f}s")
+    t = time.perf_counter()
+    result = index.query(args.lat, args.lon, args.radius, args.since, args.until,
+                         latest_only=not args.all_observations,
+                         price_floor=settings["price_floor"], price_ceiling=settings["price_ceiling"])
+    ms = (time.perf_counter() - t) * 1000
+    if not result["count"]:
+        print(f"no listings within {args.radius:g} m ({ms:.1f} ms)")
+        return 1
+    print(f"{result['count']} listings within {args.radius:g} m: median {result['median']:,}, "
+          f"avg {result['avg']:,}, IQR {result['p25']:,}–{result['p75']:,} per m² ({ms:.1f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,217 @@
+// static/report.js
+// Draws a report's chart on demand from its content-hashed data bundle
+// (written by mainDraw.render_report) with the pinned local plotly.js.
+//
+// <div class="chart" data-bundle="data/<district>.<hash>.js" data-plotly="static/plotly-<v>.min.js"
+//      data-map="<id of the map element>">
+// <div id="<map id>" data-tiles="tiles/<district>/tiles.json"> shows the bundle's
+// heatmap and/or the listings of the district's tile pyramid (tiles.py).
+//
+// Plotly and the bundle are loaded with <script> tags, so a report opened from
+// disk (file://) draws its chart. The listings layer fetches tiles and needs
+// the site served over HTTP; without it the map keeps the heatmap only.
+
+(function () {
+  "use strict";
+
+  var plotlyLoading = null;
+
+  function loadScript(src) {
+    return new Promise(function (resolve, reject) {
+      var s = document.createElement("script");
+      s.src = src;
+      s.onload = resolve;
+      s.onerror = function () { reject(new Error("could not load " + src)); };
+      document.head.appendChild(s);
+    });
+  }
+
+  function loadPlotly(src) {
+    if (window.Plotly) return Promise.resolve(window.Plotly);
+    if (!plotlyLoading) {
+      plotlyLoading = loadScript(src).then(function () { return window.Plotly; });
+    }
+    return plotlyLoading;
+  }
+
+  // data/<name>.<hash>.js registers itself as window.reportBundles["<name>.<hash>"]
+  function loadBundle(src) {
+    var key = src.slice(src.lastIndexOf("/") + 1).replace(/\.js$/, "");
+    var have = window.reportBundles && window.reportBundles[key];
+    return (have ? Promise.resolve() : loadScript(src)).then(function () {
+      var bundle = window.reportBundles && window.reportBundles[key];
+      if (!bundle) throw new Error("bundle " + key + " missing from " + src);
+      return bundle;
+    });
+  }
+
+  // Switches every trace to the finest level that keeps <= target points in
+  // the visible x range; levels come from downsample.build_levels.
+  var ORDER = ["raw", "daily", "weekly", "monthly"];
+
+  function attachResolution(gd, data) {
+    var current = data.level;
+    function pick(x0, x1) {
+      var ref = data.traces[0];
+      for (var i = 0; i < ORDER.length; i++) {
+        var xs = ref[ORDER[i]][0], n = 0;
+        for (var j = 0; j < xs.length; j++) { if (x0 === null || (xs[j] >= x0 && xs[j] <= x1)) n++; }
+        if (n <= data.target) return ORDER[i];
+      }
+      return ORDER[ORDER.length - 1];
+    }
+    function ms(v) { return typeof v === "number" ? v : Date.parse(String(v).replace(" ", "T") + "Z"); }
+    gd.on("plotly_relayout", function (ev) {
+      var x0 = null, x1 = null;
+      ["xaxis", "xaxis2", "xaxis3"].forEach(function (ax) {
+        if (ev[ax + ".range[0]"] !== undefined) { x0 = ms(ev[ax + ".range[0]"]); x1 = ms(ev[ax + ".range[1]"]); }
+        else if (ev[ax + ".range"]) { x0 = ms(ev[ax + ".range"][0]); x1 = ms(ev[ax + ".range"][1]); }
+      });
+      var level = pick(x0, x1);
+      if (level === current) return;
+      current = level;
+      Plotly.restyle(gd, {
+        x: data.traces.map(function (t) { return t[level][0]; }),
+        y: data.traces.map(function (t) { return t[level][1]; })
+      });
+    });
+  }
+
+  // Listings layer from the tile pyramid: on every pan / zoom only the tiles
+  // in view are fetched (each once); clusters below max_zoom, pins at it.
+  function fmt(v) { return v === null || v === undefined ? "?" : Number(v).toLocaleString("en-US"); }
+
+  function featureText(p) {
+    if (p.count !== undefined) return p.count + " listings<br>median " + fmt(p.median) + " IRR/m²";
+    return fmt(p.price_per_sqm) + " IRR/m²<br>" + fmt(p.size) + " m², " + fmt(p.age) + " y, " +
+      fmt(p.rooms) + " rooms<br>total " + fmt(p.total_price);
+  }
+
+  function mercator(lon, lat) {
+    var s = Math.sin(Math.max(-85.05, Math.min(85.05, lat)) * Math.PI / 180);
+    return [(lon + 180) / 360, 0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI)];
+  }
+
+  function attachTiles(gd, url, manifest) {
+    var base = url.slice(0, url.lastIndexOf("/") + 1);
+    var present = {}, cache = {}, view = { center: null, zoom: null }, generation = 0;
+    Object.keys(manifest.tiles).forEach(function (z) {
+      manifest.tiles[z].forEach(function (t) { present[z + "/" + t] = true; });
+    });
+    var trace = gd.data.length;
+
+    function inView() {
+      var lay = gd.layout.map || {};
+      var center = view.center || lay.center, zoom = view.zoom !== null ? view.zoom : lay.zoom;
+      var z = Math.max(manifest.min_zoom, Math.min(manifest.max_zoom, Math.floor(zoom) + 1));
+      var n = Math.pow(2, z), world = 512 * Math.pow(2, zoom);
+      var c = mercator(center.lon, center.lat);
+      var hw = gd.clientWidth / 2 / world, hh = gd.clientHeight / 2 / world, out = [];
+      for (var x = Math.floor((c[0] - hw) * n); x <= Math.floor((c[0] + hw) * n); x++) {
+        for (var y = Math.floor((c[1] - hh) * n); y <= Math.floor((c[1] + hh) * n); y++) {
+          if (present[z + "/" + x + "/" + y]) out.push(z + "/" + x + "/" + y);
+        }
+      }
+      return out;
+    }
+
+    function load(key) {
+      if (!cache[key]) {
+        var p = key.split("/");
+        cache[key] = fetch(base + manifest.url.replace("{z}", p[0]).replace("{x}", p[1]).replace("{y}", p[2]))
+          .then(function (r) { return r.ok ? r.json() : { features: [] }; })
+          .catch(function () { return { features: [] }; });
+      }
+      return cache[key];
+    }
+
+    function update() {
+      var mine = ++generation;
+      return Promise.all(inView().map(load)).then(function (collections) {
+        if (mine !== generation) return;
+        var lon = [], lat = [], text = [], size = [];
+        collections.forEach(function (fc) {
+          fc.features.forEach(function (f) {
+            lon.push(f.geometry.coordinates[0]);
+            lat.push(f.geometry.coordinates[1]);
+            text.push(featureText(f.properties));
+            size.push(f.properties.count ? 6 + 3 * Math.sqrt(f.properties.count) : 7);
+          });
+        });
+        return Plotly.restyle(gd, { lon: [lon], lat: [lat], text: [text], "marker.size": [size] }, [trace]);
+      });
+    }
+
+    gd.on("plotly_relayout", function (ev) {
+      if (ev["map.center"] === undefined && ev["map.zoom"] === undefined) return;
+      if (ev["map.center"]) view.center = ev["map.center"];
+      if (ev["map.zoom"] !== undefined) view.zoom = ev["map.zoom"];
+      update();
+    });
+    return Plotly.addTraces(gd, {
+      type: "scattermap", mode: "markers", name: "Listings (" + manifest.run_ts.slice(0, 8) + ")",
+      lon: [], lat: [], text: [], hovertemplate: "%{text}<extra></extra>",
+      marker: { size: [], color: "#ffab40", opacity: 0.85 }
+    }).then(update);
+  }
+
+  function drawMap(el, bundle) {
+    var url = el.dataset.tiles;
+    // no tiles (or no HTTP, e.g. file://): the map keeps the bundle's heatmap
+    var manifest = url ? fetch(url, { cache: "no-cache" }).then(function (r) { return r.ok ? r.json() : null; })
+      .catch(function () { return null; }) : Promise.resolve(null);
+    return manifest.then(function (m) {
+      if (!bundle.map && !(m && m.bounds)) return;
+      var fig = bundle.map || { data: [], layout: { template: bundle.figure.layout.template, height: 650 } };
+      if (!bundle.map && m.bounds) {
+        fig.layout.map = {
+          style: "carto-darkmatter", zoom: 13,
+          center: { lon: (m.bounds[0] + m.bounds[2]) / 2, lat: (m.bounds[1] + m.bounds[3]) / 2 }
+        };
+      }
+      el.hidden = false;
+      return Plotly.newPlot(el, fig.data, fig.layout, { responsive: true }).then(function () {
+        if (m) return attachTiles(el, url, m);
+      });
+    });
+  }
+
+  function draw(gd) {
+    gd.classList.add("loading");
+    Promise.all([
+      loadPlotly(gd.dataset.plotly),
+      // the bundle name carries its content hash, so the browser cache can keep it
+      loadBundle(gd.dataset.bundle)
+    ]).then(function (res) {
+      var bundle = res[1];
+      gd.classList.remove("loading");
+      return Plotly.newPlot(gd, bundle.figure.data, bundle.figure.layout, { responsive: true })
+        .then(function () {
+          attachResolution(gd, bundle.levels);
+          var mapEl = gd.dataset.map && document.getElementById(gd.dataset.map);
+          // a map failure must not replace the drawn chart with an error
+          if (mapEl) return drawMap(mapEl, bundle).catch(function (err) { console.warn("map:", err); });
+        });
+    }).catch(function (err) {
+      gd.classList.remove("loading");
+      gd.textContent = "Could not load chart: " + err;
+    });
+  }
+
+  function init() {
+    var charts = document.querySelectorAll(".chart[data-bundle]");
+    if (!("IntersectionObserver" in window)) {
+      charts.forEach(draw);
+      return;
+    }
+    var io = new IntersectionObserver(function (entries) {
+      entries.forEach(function (e) {
+        if (e.isIntersecting) { io.unobserve(e.target); draw(e.target); }
+      });
+    }, { rootMargin: "200px" });
+    charts.forEach(function (c) { io.observe(c); });
+  }
+
+  if (document.readyState === "loading") document.addEventListener("DOMContentLoaded", init);
+  else init();
+})();
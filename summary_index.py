@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# summary_index.py
+# Persistent SQLite index of run summaries, keyed by (district, run ts).
+#
+# refresh() only re-reads a summary whose file, mtime or size changed (and
+# only re-parses it if its sha256 changed too), so loading a district's full
+# history is one indexed query instead of opening every summary_*.json.
+# The logic version of every summary file (runs.version_from_bytes) is kept
+# in summary_files by (file, mtime_ns, size), so picking a run's best summary
+# needs only a stat per file: an unchanged tree reads no summary bodies.
+# Rows are keyed by results root as well, so `--root divar_results_old` and
+# the live tree can share one index file without mixing. A summary that stops
+# parsing loses its row rather than keeping stale data in the index.
+
+import hashlib
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from runs import RESULTS_ROOT, RunFile, iter_runs, version_from_bytes
+
+INDEX_FILE = Path(".cache/summary_index.sqlite")
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+SCHEMA_VERSION = 3  # 2: rows keyed by results root, 3: summary_files; older indexes are dropped and rebuilt
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    root      TEXT NOT NULL,
+    district  TEXT NOT NULL,
+    run_ts    TEXT NOT NULL,
+    file      TEXT NOT NULL,
+    version   INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    size      INTEGER NOT NULL,
+    sha256    TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    data      TEXT NOT NULL,
+    PRIMARY KEY (root, district, run_ts)
+);
+CREATE INDEX IF NOT EXISTS summaries_by_time ON summaries (root, district, timestamp);
+CREATE TABLE IF NOT EXISTS summary_files (
+    root      TEXT NOT NULL,
+    district  TEXT NOT NULL,
+    file      TEXT NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    size      INTEGER NOT NULL,
+    version   INTEGER NOT NULL,
+    PRIMARY KEY (root, file)
+);
+"""
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def connect(index_file: Path = INDEX_FILE) -> Iterator[sqlite3.Connection]:
+    # one short-lived connection per call; commits on success, always closes
+    index_file = Path(index_file)
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(index_file, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # the index is a cache of the summary files: rebuild rather than migrate
+            conn.executescript("DROP TABLE IF EXISTS summaries; DROP TABLE IF EXISTS summary_files; "
+                               f"PRAGMA user_version = {SCHEMA_VERSION};")
+        conn.executescript(_SCHEMA)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _root_key(root: Path) -> str:
+    return str(Path(root).resolve())
+
+
+def refresh(district: str, root: Path = RESULTS_ROOT, index_file: Path = INDEX_FILE) -> Dict[str, int]:
+    # bring one district's rows in line with the files on disk; "read" counts
+    # summary bodies read from disk (0 when nothing changed)
+    stats = {"unchanged": 0, "touched": 0, "updated": 0, "removed": 0, "unreadable": 0, "read": 0}
+    root_key = _root_key(root)
+    with _lock, connect(index_file) as conn:
+        known = {row[0]: row[1:] for row in conn.execute(
+            "SELECT run_ts, file, mtime_ns, size, sha256 FROM summaries WHERE root = ? AND district = ?",
+            (root_key, district))}
+        versions = {row[0]: row[1:] for row in conn.execute(
+            "SELECT file, mtime_ns, size, version FROM summary_files WHERE root = ? AND district = ?",
+            (root_key, district))}
+        bodies: Dict[str, bytes] = {}  # summaries read while picking versions, reused below
+        seen_files = set()
+
+        def version_of(file: RunFile) -> int:
+            st, key = file.stat(), str(file)
+            seen_files.add(key)
+            prev = versions.get(key)
+            if prev and prev[0] == st.st_mtime_ns and prev[1] == st.st_size:
+                return prev[2]
+            bodies[key] = file.read_bytes()
+            stats["read"] += 1
+            version = version_from_bytes(file.name, bodies[key])
+            versions[key] = (st.st_mtime_ns, st.st_size, version)
+            conn.execute("INSERT OR REPLACE INTO summary_files VALUES (?, ?, ?, ?, ?, ?)",
+                         (root_key, district, key, st.st_mtime_ns, st.st_size, version))
+            return version
+
+        present = set()
+        for run in iter_runs(root, district):
+            file = run.best_summary(version_of)
+            if file is None:
+                continue
+            present.add(run.ts)
+            st = file.stat()
+            prev = known.get(run.ts)
+            if prev and prev[0] == str(file) and prev[1] == st.st_mtime_ns and prev[2] == st.st_size:
+                stats["unchanged"] += 1
+                continue
+            raw = bodies.get(str(file))
+            if raw is None:
+                raw = file.read_bytes()
+                stats["read"] += 1
+            sha = _sha256(raw)
+            if prev and prev[0] == str(file) and prev[3] == sha:
+                conn.execute("UPDATE summaries SET mtime_ns = ?, size = ? "
+                             "WHERE root = ? AND district = ? AND run_ts = ?",
+                             (st.st_mtime_ns, st.st_size, root_key, district, run.ts))
+                stats["touched"] += 1
+                continue
+            try:
+                data = json.loads(raw)
+                datetime.strptime(data["timestamp"], TS_FORMAT)
+            except Exception:
+                # unreadable: not served at all, so an earlier row for the run goes too
+                print(f"[{district}] {run.ts}: unreadable summary {file}, not indexed")
+                present.discard(run.ts)
+                stats["unreadable"] += 1
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (root_key, district, run.ts, str(file), version_of(file), st.st_mtime_ns, st.st_size, sha,
+                 data["timestamp"], json.dumps(data, ensure_ascii=False)))
+            stats["updated"] += 1
+        for run_ts in set(known) - present:
+            conn.execute("DELETE FROM summaries WHERE root = ? AND district = ? AND run_ts = ?",
+                         (root_key, district, run_ts))
+            stats["removed"] += 1
+        for file in set(versions) - seen_files:
+            conn.execute("DELETE FROM summary_files WHERE root = ? AND file = ?", (root_key, file))
+    return stats
+
+
+def load(district: str, index_file: Path = INDEX_FILE, since: Optional[str] = None,
+         root: Path = RESULTS_ROOT) -> List[Tuple[datetime, Dict[str, Any]]]:
+    # full (or since-timestamp) history of a district, oldest first
+    return [(ts, data) for _, ts, data in load_runs(district, index_file, since, root)]
+
+
+def load_runs(district: str, index_file: Path = INDEX_FILE, since: Optional[str] = None,
+              root: Path = RESULTS_ROOT) -> List[Tuple[str, datetime, Dict[str, Any]]]:
+    # like load(), with each summary's run folder name (run ts) first
+    query = "SELECT run_ts, timestamp, data FROM summaries WHERE root = ? AND district = ?"
+    args: list = [_root_key(root), district]
+    if since:
+        query += " AND timestamp >= ?"
+        args.append(since)
+    query += " ORDER BY timestamp"
+    with _lock, connect(index_file) as conn:
+        rows = conn.execute(query, args).fetchall()
+    return [(run_ts, datetime.strptime(ts, TS_FORMAT), json.loads(data)) for run_ts, ts, data in rows]
+
+
+def count(district: str, index_file: Path = INDEX_FILE, until: Optional[str] = None,
+          root: Path = RESULTS_ROOT) -> int:
+    # number of indexed runs of a district (with timestamp <= until, if given)
+    query = "SELECT COUNT(*) FROM summaries WHERE root = ? AND district = ?"
+    args: list = [_root_key(root), district]
+    if until:
+        query += " AND timestamp <= ?"
+        args.append(until)
+    with _lock, connect(index_file) as conn:
+        return conn.execute(query, args).fetchone()[0]
+
+
+def load_district(district: str, root: Path = RESULTS_ROOT,
+                  index_file: Path = INDEX_FILE) -> List[Tuple[datetime, Dict[str, Any]]]:
+    refresh(district, root, index_file)
+    return load(district, index_file, root=root)
+
+
+def fingerprint(district: str, index_file: Path = INDEX_FILE, root: Path = RESULTS_ROOT) -> Optional[str]:
+    # content hash over a district's indexed summaries; changes whenever a run
+    # is added, removed or its summary rewritten (None when there are none)
+    with _lock, connect(index_file) as conn:
+        rows = conn.execute("SELECT run_ts, sha256 FROM summaries WHERE root = ? AND district = ? ORDER BY run_ts",
+                            (_root_key(root), district)).fetchall()
+    if not rows:
+        return None
+    return _sha256("\n".join(f"{ts} {sha}" for ts, sha in rows).encode())[:16]
@@ -0,0 +1,8 @@
+# tests/conftest.py
+# The modules live at the repo root (flat scripts), so put it on the path.
+# Run from the repo root: python -m pytest -q
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
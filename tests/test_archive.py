@@ -0,0 +1,99 @@
+# tests/test_archive.py
+
+import gzip
+import json
+from datetime import date, datetime
+
+import archive
+import compaction
+import listing_store
+from runs import iter_runs
+
+
+def write_run(root, district, ts, summary=None):
+    run = root / district / ts
+    run.mkdir(parents=True)
+    (run / f"summary_{ts}.json").write_text(json.dumps(summary or {"timestamp": ts}))
+    (run / f"posts_collected_{ts}.jsonl.gz").write_bytes(gzip.compress(b'{"token": "a"}\n'))
+    return run
+
+
+def test_add_read_and_verify(tmp_path):
+    run = write_run(tmp_path, "A", "20251001_080000")
+    pack = archive.MonthArchive(tmp_path / "A", "2025-10")
+    files = {f"{run.name}/{f.name}": f for f in sorted(run.iterdir())}
+    assert pack.add(files) > 0
+    assert pack.verify(list(files))
+
+    reopened = archive.MonthArchive(tmp_path / "A", "2025-10")
+    for key, src in files.items():
+        member = reopened.file(key)
+        assert member.read_bytes() == src.read_bytes()
+        assert member.stat().st_size == src.stat().st_size
+    assert reopened.members[f"{run.name}/posts_collected_{run.name}.jsonl.gz"]["codec"] == "store"
+    assert reopened.members[f"{run.name}/summary_{run.name}.json"]["codec"] == "zlib"
+
+    # the same content again appends nothing
+    assert pack.add(files) == 0
+
+
+def test_verify_catches_corruption_and_missing_keys(tmp_path):
+    run = write_run(tmp_path, "A", "20251001_080000", {"timestamp": "x" * 500})
+    pack = archive.MonthArchive(tmp_path / "A", "2025-10")
+    key = f"{run.name}/summary_{run.name}.json"
+    pack.add({key: run / f"summary_{run.name}.json"})
+    assert not pack.verify([key, "20251001_080000/missing.json"])
+
+    data = bytearray(pack.pack.read_bytes())
+    data[len(data) // 2] ^= 0xFF
+    pack.pack.write_bytes(bytes(data))
+    assert not archive.MonthArchive(tmp_path / "A", "2025-10").verify([key])
+
+
+def test_bytes_after_the_last_indexed_member_are_ignored(tmp_path):
+    run = write_run(tmp_path, "A", "20251001_080000")
+    pack = archive.MonthArchive(tmp_path / "A", "2025-10")
+    key = f"{run.name}/summary_{run.name}.json"
+    pack.add({key: run / f"summary_{run.name}.json"})
+    with open(pack.pack, "ab") as f:
+        f.write(b"half-written member")  # an interrupted append
+    assert archive.MonthArchive(tmp_path / "A", "2025-10").verify([key])
+
+
+def test_compaction_seals_whole_past_months_once(tmp_path):
+    root = tmp_path / "results"
+    for ts in ("20251001_080000", "20251031_080000", "20251101_080000", "20251120_080000"):
+        write_run(root, "A", ts)
+
+    # cutoff inside November: October is sealed, November (holding the newest run) is not
+    stats = compaction.compact(root, 10, now=datetime(2025, 11, 25))
+    assert stats["runs"] == 2 and not stats["failed"]
+    assert sorted(p.name for p in (root / "A").iterdir()) == ["20251101_080000", "20251120_080000", "archive"]
+    assert [(r.ts, r.archived is not None) for r in iter_runs(root, "A")] == [
+        ("20251001_080000", True), ("20251031_080000", True),
+        ("20251101_080000", False), ("20251120_080000", False)]
+    archived = next(iter_runs(root, "A"))
+    assert json.loads(archived.best_summary().read_bytes()) == {"timestamp": "20251001_080000"}
+
+    # a later pass does not touch the sealed month again
+    size = (root / "A" / "archive" / "2025-10.pack").stat().st_size
+    assert compaction.compact(root, 10, now=datetime(2025, 11, 28))["runs"] == 0
+    assert (root / "A" / "archive" / "2025-10.pack").stat().st_size == size
+
+
+def test_compaction_waits_for_the_whole_month(tmp_path):
+    root = tmp_path / "results"
+    for ts in ("20251001_080000", "20251020_080000", "20251120_080000"):
+        write_run(root, "A", ts)
+    # cutoff 2025-10-25: the month is not over at the cutoff, nothing is packed
+    assert compaction.compact(root, 30, now=datetime(2025, 11, 24))["runs"] == 0
+
+
+def test_store_prune_keeps_the_newest_day(tmp_path):
+    for day in ("2025-10-01", "2025-10-02", "2025-11-01"):
+        part = tmp_path / "A" / f"date={day}"
+        part.mkdir(parents=True)
+        (part / "part_x.npz").write_bytes(b"x")
+    stats = listing_store.prune("A", date(2026, 1, 1), tmp_path)
+    assert stats["partitions"] == 2
+    assert [p.name for p in (tmp_path / "A").iterdir()] == ["date=2025-11-01"]
@@ -0,0 +1,59 @@
+# tests/test_downsample.py
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import downsample
+
+
+def test_lttb_keeps_ends_and_peaks():
+    x = np.arange(100, dtype=float)
+    y = np.zeros(100)
+    y[37], y[71] = 50.0, -50.0
+    keep = downsample.lttb(x, y, 10)
+    assert len(keep) == 10 and keep[0] == 0 and keep[-1] == 99
+    assert np.all(np.diff(keep) > 0)
+    assert {37, 71} <= set(keep.tolist())
+
+
+def test_lttb_passes_short_series_through():
+    x = np.arange(5, dtype=float)
+    assert downsample.lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    assert downsample.lttb(x, x, 2).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_resample_is_count_weighted_per_period():
+    day = downsample._DAY_MS
+    ms = np.array([0, day // 2, day, day + 1])
+    y = np.array([10.0, 20.0, 30.0, 99.0])
+    w = np.array([1.0, 3.0, 1.0, 0.0])
+    keys, mean, weight = downsample.resample(ms, y, w, "daily")
+    assert keys.tolist() == [0, day] and mean.tolist() == [17.5, 30.0] and weight.tolist() == [4.0, 1.0]
+
+
+def test_weeks_start_on_monday_and_months_on_the_first():
+    ms = np.array([np.datetime64("2025-11-19T12:00", "ms").astype(np.int64)])  # a Wednesday
+    week = downsample.ms_to_datetime(int(downsample._period_start(ms, "weekly")[0]))
+    month = downsample.ms_to_datetime(int(downsample._period_start(ms, "monthly")[0]))
+    assert week == datetime(2025, 11, 17) and month == datetime(2025, 11, 1)
+
+
+def test_build_levels_caps_points_and_drops_missing_values():
+    start = datetime(2025, 1, 1)
+    ts = [start + timedelta(hours=6 * i) for i in range(2000)]
+    values = [None if i % 10 == 0 else 100 + i % 7 for i in range(2000)]
+    levels = downsample.build_levels(ts, values, max_points=300)
+    assert set(levels) == set(downsample.LEVELS)
+    assert len(levels["raw"][0]) == 300
+    assert len(levels["daily"][0]) == 300  # 500 days -> capped
+    assert len(levels["monthly"][0]) == 17
+    assert levels["raw"][0][0] == np.datetime64(ts[1], "ms").astype(np.int64)  # ts[0] has no value
+
+
+def test_pick_level_is_the_finest_that_fits():
+    levels = {"raw": [list(range(1000)), []], "daily": [list(range(0, 1000, 4)), []],
+              "weekly": [list(range(0, 1000, 28)), []], "monthly": [list(range(0, 1000, 120)), []]}
+    assert downsample.pick_level(levels, target=400) == "daily"
+    assert downsample.pick_level(levels, 0, 300, target=400) == "raw"
+    assert downsample.pick_level(levels, target=10) == "monthly"
@@ -0,0 +1,69 @@
+# tests/test_parsing.py
+
+import pytest
+
+import parsing
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("۱۲۳", 123),
+    ("٤٥٦", 456),
+    ("۱۰٫۷ میلیارد", 10_700_000_000),
+    ("۱ میلیارد و ۲۰۰ میلیون", 1_200_000_000),
+    ("دو میلیون و پانصد هزار", 2_500_000),
+    ("یک میلیون پانصد هزار", 1_500_000),
+    ("۱۲۵٬۰۰۰٬۰۰۰ تومان", 125_000_000),
+    ("سی‌صد", 300),
+    ("۸۵ متر", 85),
+    ("متراژ ۸۵", 85),
+])
+def test_parse_number(text, expected):
+    assert parsing.parse_number(text) == expected
+
+
+@pytest.mark.parametrize("text", ["۲ خوابه ۸۵ متر", "۸۵ ۹۰", "بدون قیمت", ""])
+def test_parse_number_rejects_ambiguous_or_missing(text):
+    assert parsing.parse_number(text) is None
+
+
+@pytest.mark.parametrize("value", [None, 12, ["۱۲"], {"a": 1}])
+def test_non_strings_never_reach_the_cache(value):
+    # unhashable input would raise TypeError inside lru_cache
+    assert parsing.parse_number(value) is None
+    assert parsing.parse_price(value) is None
+
+
+def test_parse_price_rounds():
+    assert parsing.parse_price("۱۰٫۷ میلیون") == 10_700_000
+    assert parsing.parse_price("۰") is None
+
+
+def test_persian_to_int_takes_the_first_literal():
+    assert parsing.persian_to_int("۶۳٫۵ متر، ۲ خواب") == 63
+
+
+def test_parse_age_size_rooms():
+    chips = [{"title": "۸۵ متر"}, {"title": "۱۲ سال ساخت"}, {"title": "۲ اتاق"}]
+    assert parsing.parse_age(chips) == 12
+    assert parsing.parse_age([{"title": "نوساز"}]) == 0
+    assert parsing.parse_size({"chips": chips}) == 85
+    assert parsing.parse_rooms(chips) == 2
+    assert parsing.parse_rooms([{"title": "بدون اتاق"}]) == 0
+
+
+def test_parse_post():
+    post = {
+        "map_post_card": {
+            "token": "abc",
+            "title": "آپارتمان",
+            "price_fields": [{"title": "قیمت متری", "value": "۱۵۰ میلیون"},
+                             {"title": "قیمت کل", "value": "۱۲ میلیارد و ۷۵۰ میلیون"}],
+            "chips": [{"title": "۸۵ متر"}, {"title": "نوساز"}],
+        },
+        "map_pin_feature": {"lat": 35.72, "lon": 51.36},
+    }
+    row = parsing.parse_post(post)
+    assert row["token"] == "abc"
+    assert row["price_per_sqm"] == 150_000_000
+    assert row["total_price"] == 12_750_000_000
+    assert (row["size"], row["age"], row["lat"], row["lon"]) == (85, 0, 35.72, 51.36)
@@ -0,0 +1,70 @@
+# tests/test_partitioner.py
+
+import json
+
+import partitioner
+from divar_client import range_outcome
+
+
+def outcome(lo, hi, posts, bbox=None, status="complete", **extra):
+    o = range_outcome(lo, hi, bbox)
+    o.update(status=status, posts=posts, **extra)
+    return o
+
+
+def write_run(district_dir, ts, outcomes):
+    run = district_dir / ts
+    run.mkdir(parents=True)
+    (run / f"summary_{ts}.json").write_text(json.dumps({"range_outcomes": outcomes}))
+    return run
+
+
+def test_build_5sqm_intervals():
+    assert partitioner.build_5sqm_intervals(60, 72) == [(60, 64), (65, 69), (70, 72)]
+
+
+def test_history_counts_leaf_cells_only(tmp_path):
+    quads = partitioner.split_cell(partitioner.make_cell(65, 65), [51.0, 35.0, 52.0, 36.0])
+    outcomes = [
+        outcome(60, 64, 70),
+        outcome(65, 69, 400, split=2),  # saturated parent: its children hold the same listings
+        outcome(65, 67, 50),
+        outcome(68, 69, 70),
+        outcome(70, 74, 30, status="failed"),
+        *[outcome(75, 75, 10, q["bbox"]) for q in quads],
+        outcome(75, 75, 10, quads[0]["bbox"]),  # repeated (range, bbox): kept once
+    ]
+    write_run(tmp_path, "20251101_080000", outcomes)
+    assert partitioner.load_history(tmp_path) == {(60, 64): 70, (65, 67): 50, (68, 69): 70, (75, 75): 40}
+
+
+def test_history_uses_latest_run_and_skips_excluded(tmp_path):
+    write_run(tmp_path, "20251101_080000", [outcome(60, 64, 10)])
+    latest = write_run(tmp_path, "20251102_080000", [outcome(60, 64, 20)])
+    assert partitioner.load_history(tmp_path) == {(60, 64): 20}
+    assert partitioner.load_history(tmp_path, exclude=latest) == {(60, 64): 10}
+
+
+def test_plan_merges_sparse_slices_and_keeps_unknown_ones_apart():
+    history = {(60, 69): 20, (70, 74): 60}
+    cells = [(c["min"], c["max"]) for c in partitioner.plan_cells(60, 84, history)]
+    assert cells == [(60, 69), (70, 74), (75, 79), (80, 84)]
+    assert [(c["min"], c["max"]) for c in partitioner.plan_cells(60, 69, {})] == [(60, 64), (65, 69)]
+
+
+def test_split_by_size_then_into_quadrants():
+    halves = partitioner.split_cell(partitioner.make_cell(60, 69), None)
+    assert [(c["min"], c["max"], c["depth"]) for c in halves] == [(60, 64, 1), (65, 69, 1)]
+    quads = partitioner.split_cell(partitioner.make_cell(60, 60), [0.0, 0.0, 2.0, 2.0])
+    assert [c["bbox"] for c in quads] == [[0.0, 0.0, 1.0, 1.0], [1.0, 0.0, 2.0, 1.0],
+                                         [0.0, 1.0, 1.0, 2.0], [1.0, 1.0, 2.0, 2.0]]
+    assert partitioner.split_cell(partitioner.make_cell(60, 60), None) == []
+    deep = partitioner.make_cell(60, 69, depth=partitioner.MAX_SPLIT_DEPTH)
+    assert partitioner.split_cell(deep, None) == []
+
+
+def test_saturation_and_cell_tags():
+    assert partitioner.is_saturated({"status": "complete", "last_page_posts": partitioner.VIEWPORT_RESULT_CAP})
+    assert not partitioner.is_saturated({"status": "failed", "last_page_posts": 500})
+    quad = partitioner.make_cell(60, 64, [51.38, 35.72, 51.4, 35.74], 1)
+    assert partitioner.cell_tag(quad) == "60-64_51.3800_35.7200_51.4000_35.7400"
@@ -0,0 +1,69 @@
+# tests/test_rolling.py
+
+import json
+import random
+import statistics
+
+import rolling
+
+DAY = 86400
+
+
+def brute_force(points, ts):
+    # reference values straight from the definition, over every point so far
+    out = {}
+    for name, span in rolling.WINDOWS.items():
+        inside = [p for p in points if ts - span < p[0] <= ts and p[1] is not None and p[2]]
+        count = sum(p[2] for p in inside)
+        out[f"ma{name}"] = round(sum(p[1] * p[2] for p in inside) / count) if count else None
+        meds = [p[3] for p in inside if p[3] is not None]
+        out[f"med{name}"] = round(statistics.median(meds)) if meds else None
+    return out
+
+
+def series(n, seed=1):
+    rng = random.Random(seed)
+    ts, points = 0.0, []
+    for _ in range(n):
+        ts += rng.choice([0.5, 1, 1, 2, 5]) * DAY
+        missing = rng.random() < 0.1
+        points.append((ts, None if missing else rng.uniform(1e8, 2e8), rng.randint(0, 50),
+                       None if missing else rng.uniform(1e8, 2e8)))
+    return points
+
+
+def test_windows_match_brute_force():
+    s, points = rolling.RollingSeries(), series(300)
+    for i, p in enumerate(points):
+        out = s.push(*p)
+        want = brute_force(points[:i + 1], p[0])
+        assert {k: out[k] for k in want} == want
+
+
+def test_entries_are_evicted_once_no_window_needs_them():
+    s = rolling.RollingSeries()
+    for day in range(200):
+        s.push(day * DAY, 100.0, 1, 100.0)
+    assert len(s.entries) == 30
+    assert all(len(w["medians"]) == w_len for w, w_len in ((s.windows["7"], 7), (s.windows["30"], 30)))
+
+
+def test_wow_compares_against_ma7_a_week_earlier():
+    s = rolling.RollingSeries()
+    out = None
+    for day in range(15):
+        out = s.push(day * DAY, 100.0 if day < 7 else 110.0, 1, None)
+    # ma7 on day 14 covers days 8..14 (110); on day 7 it covered 1..7 (6 x 100 + 110)
+    assert out["ma7"] == 110 and out["wow"] == round((110 / round(710 / 7) - 1) * 100, 2)
+
+
+def test_state_round_trip_continues_identically():
+    points = series(120, seed=7)
+    whole = rolling.RollingSeries()
+    expected = [whole.push(*p) for p in points]
+
+    first = rolling.RollingSeries()
+    got = [first.push(*p) for p in points[:60]]
+    resumed = rolling.RollingSeries(json.loads(json.dumps(first.state())))
+    got += [resumed.push(*p) for p in points[60:]]
+    assert got == expected
@@ -0,0 +1,68 @@
+# tests/test_sketch.py
+
+import numpy as np
+import pytest
+
+import sketch
+from sketch import QuantileSketch
+
+
+def test_small_cells_are_exact():
+    values = np.array([5.0, 1.0, 3.0, 3.0, 9.0])
+    s = QuantileSketch.from_values(values)
+    assert s.count == 5 and (s.lo, s.hi) == (1.0, 9.0)
+    for q in (0, 0.1, 0.25, 0.5, 0.75, 1):
+        assert s.quantile(q) == pytest.approx(np.percentile(values, q * 100))
+
+
+def test_empty_sketch():
+    s = QuantileSketch.from_values(np.array([np.nan]))
+    assert s.count == 0 and s.median() is None and s.iqr() is None and s.trimmed_mean() is None
+    assert s.to_dict() == {"count": 0}
+    assert s.stats()["median"] is None
+    assert QuantileSketch.merge([s, QuantileSketch()]).count == 0
+
+
+def test_merged_sketches_track_pooled_quantiles():
+    rng = np.random.default_rng(3)
+    parts = [rng.lognormal(18.9, 0.25, rng.integers(50, 400)) for _ in range(40)]
+    pooled = np.concatenate(parts)
+    merged = QuantileSketch.merge(QuantileSketch.from_values(p) for p in parts)
+    assert merged.count == len(pooled)
+    assert len(merged.mean) <= sketch.DEFAULT_COMPRESSION
+    assert (merged.lo, merged.hi) == (pooled.min(), pooled.max())
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        assert merged.quantile(q) == pytest.approx(np.percentile(pooled, q * 100), rel=0.01)
+
+
+def test_merge_is_order_independent_in_count_and_range():
+    rng = np.random.default_rng(5)
+    parts = [QuantileSketch.from_values(rng.normal(100, 10, 200)) for _ in range(10)]
+    a, b = QuantileSketch.merge(parts), QuantileSketch.merge(parts[::-1])
+    assert (a.count, a.lo, a.hi) == (b.count, b.lo, b.hi)
+    assert a.median() == pytest.approx(b.median(), rel=0.005)
+
+
+def test_trimmed_mean_drops_the_tails():
+    values = np.array([1.0] * 10 + [100.0] * 80 + [10_000.0] * 10)
+    s = QuantileSketch.from_values(values)
+    assert s.trimmed_mean(0.1) == pytest.approx(100.0)
+    assert s.trimmed_mean(0.0) == pytest.approx(values.mean())
+
+
+def test_dict_round_trip():
+    s = QuantileSketch.from_values(np.arange(1000, dtype=float) * 1000)
+    back = QuantileSketch.from_dict(s.to_dict())
+    assert back.count == s.count and back.stats() == s.stats()
+
+
+def test_cell_sketch_rejects_unknown_buckets():
+    summary = {"sketches": {"compression": 100, "overall": {"count": 0},
+                            "age_intervals": {"0-4": {"count": 0}},
+                            "size_intervals": {"<80": {"count": 0}},
+                            "age_size_matrix": {"0-4": {"<80": {"count": 0}}}}}
+    assert sketch.cell_sketch(summary, "age_size:0-4/<80").count == 0
+    assert sketch.cell_sketch({"overall": {}}, "overall") is None  # predates sketches
+    for cell in ("age:0-5", "size:zz", "age_size:0-4/zz", "nope"):
+        with pytest.raises(ValueError):
+            sketch.cell_sketch(summary, cell)
@@ -0,0 +1,85 @@
+# tests/test_summary_index.py
+
+import json
+from pathlib import Path
+
+import pytest
+
+import summary_index
+
+
+def write_summary(root: Path, district: str, ts: str, version=None, name=None, **extra):
+    run = root / district / ts
+    run.mkdir(parents=True, exist_ok=True)
+    data = {"timestamp": f"{ts[:4]}-{ts[4:6]}-{ts[6:8]} {ts[9:11]}:{ts[11:13]}:{ts[13:]}", **extra}
+    if version is not None:
+        data["logic"] = {"version": version}
+    path = run / (name or f"summary_{ts}.json")
+    path.write_text(json.dumps(data))
+    return path
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    # counts summary bodies read from disk
+    count = {"n": 0}
+    read_bytes = Path.read_bytes
+
+    def counting(self):
+        count["n"] += 1
+        return read_bytes(self)
+
+    monkeypatch.setattr(Path, "read_bytes", counting)
+    return count
+
+
+def test_second_refresh_reads_no_summary_bodies(tmp_path, reads):
+    root, index = tmp_path / "results", tmp_path / "index.sqlite"
+    write_summary(root, "A", "20251101_080000", version=4)
+    write_summary(root, "A", "20251102_080000")
+    write_summary(root, "A", "20251102_080000", version=4, name="summary_20251102_080000.v4.json", n=2)
+
+    first = summary_index.refresh("A", root, index)
+    assert first["updated"] == 2 and first["read"] == 3 and reads["n"] == 3
+
+    reads["n"] = 0
+    second = summary_index.refresh("A", root, index)
+    assert second["unchanged"] == 2 and second["read"] == 0 and reads["n"] == 0
+
+
+def test_refresh_picks_best_version_and_rereads_only_changed_files(tmp_path, reads):
+    root, index = tmp_path / "results", tmp_path / "index.sqlite"
+    write_summary(root, "A", "20251101_080000", n=1)
+    summary_index.refresh("A", root, index)
+    assert summary_index.load("A", index, root=root)[0][1]["n"] == 1
+
+    write_summary(root, "A", "20251101_080000", version=4, name="summary_20251101_080000.v4.json", n=2)
+    reads["n"] = 0
+    stats = summary_index.refresh("A", root, index)
+    assert stats["updated"] == 1 and reads["n"] == 1  # only the new file
+    assert summary_index.load("A", index, root=root)[0][1]["n"] == 2
+
+    # the original rewritten with a newer fingerprint takes over again
+    write_summary(root, "A", "20251101_080000", version=5, n=3)
+    summary_index.refresh("A", root, index)
+    assert summary_index.load("A", index, root=root)[0][1]["n"] == 3
+
+
+def test_unreadable_summary_drops_its_row(tmp_path):
+    root, index = tmp_path / "results", tmp_path / "index.sqlite"
+    path = write_summary(root, "A", "20251101_080000")
+    summary_index.refresh("A", root, index)
+    path.write_text("{not json")
+    stats = summary_index.refresh("A", root, index)
+    assert stats["unreadable"] == 1 and stats["removed"] == 1
+    assert summary_index.load("A", index, root=root) == []
+
+
+def test_roots_do_not_mix(tmp_path):
+    index = tmp_path / "index.sqlite"
+    write_summary(tmp_path / "live", "A", "20251101_080000")
+    write_summary(tmp_path / "old", "A", "20251001_080000")
+    for root in ("live", "old"):
+        summary_index.refresh("A", tmp_path / root, index)
+    assert [ts.month for ts, _ in summary_index.load("A", index, root=tmp_path / "live")] == [11]
+    assert [ts.month for ts, _ in summary_index.load("A", index, root=tmp_path / "old")] == [10]
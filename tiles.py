@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# tiles.py
+# GeoJSON tile pyramid of a district's latest stored run, written next to the
+# reports so the report map loads only the tiles in view:
+#
+#   <site>/tiles/<district>/tiles.json                        manifest (run, zooms, bounds, tile list)
+#   <site>/tiles/<district>/<run ts>/<z>/<x>/<y>.geojson      standard XYZ (web mercator) tiles
+#
+# Below PIN_ZOOM a tile holds clusters: the listings of each 1/CLUSTER_BINS x
+# 1/CLUSTER_BINS sub-square merged into one point at their centroid with count
+# and median price per m². At PIN_ZOOM every listing is its own pin; maps
+# zoomed in further reuse the PIN_ZOOM tiles. Only non-empty tiles are written
+# and listed in the manifest. The pyramid is rebuilt only for a new run (or a
+# new TILES_VERSION); older runs' pyramids are removed.
+#
+#   python tiles.py --district Mehran --out /tmp/site
+
+import argparse
+import json
+import math
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import listing_store
+import spatial
+
+# ------------------------
+# Config: tweak as needed
+# ------------------------
+TILES_VERSION = 1  # bump when the tile layout or feature properties change
+MIN_ZOOM = 10
+PIN_ZOOM = 15
+CLUSTER_BINS = 64  # cluster grid per tile side below PIN_ZOOM
+PIN_FIELDS = ["price_per_sqm", "total_price", "size", "age", "rooms"]
+
+
+def latest_run(district: str, root: Path = listing_store.STORE_ROOT) -> Optional[str]:
+    # run ts of the newest part file (part_<ts>[_<chunk>].npz)
+    parts = list(listing_store.iter_parts(district, root=root))
+    return max((p.stem[5:20] for p in parts), default=None)
+
+
+def mercator(lat: np.ndarray, lon: np.ndarray):
+    # lon/lat -> web mercator x/y in [0, 1), y growing southwards like XYZ tile rows
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    s = np.sin(np.radians(np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878)))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return x, y
+
+
+def _num(v: float):
+    return None if v != v else (int(v) if float(v).is_integer() else round(float(v), 2))
+
+
+def _feature(lon: float, lat: float, props: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+            "properties": props}
+
+
+def load_listings(district: str, run_ts: str, root: Path = listing_store.STORE_ROOT) -> Dict[str, np.ndarray]:
+    # the run's located listings, all columns needed for pins
+    wanted = ["token", "lat", "lon"] + PIN_FIELDS
+    chunks = [listing_store.read_part(p, wanted) for p in listing_store.iter_parts_for_run(district, run_ts, root)]
+    cols = {c: np.concatenate([ch[c] for ch in chunks]) if chunks else np.empty(0) for c in wanted}
+    keep = ~np.isnan(cols["lat"].astype(np.float64)) & ~np.isnan(cols["lon"].astype(np.float64))
+    return {c: v[keep] for c, v in cols.items()}
+
+
+def build_tiles(cols: Dict[str, np.ndarray], min_zoom: int = MIN_ZOOM,
+                pin_zoom: int = PIN_ZOOM) -> Dict[int, Dict[tuple, List[Dict[str, Any]]]]:
+    # {z: {(x, y): [features]}}; clusters ignore listings without a price
+    lat, lon = cols["lat"].astype(np.float64), cols["lon"].astype(np.float64)
+    price = cols["price_per_sqm"].astype(np.float64)
+    mx, my = mercator(lat, lon)
+    pyramid: Dict[int, Dict[tuple, List[Dict[str, Any]]]] = {}
+
+    priced = ~np.isnan(price)
+    for z in range(min_zoom, pin_zoom):
+        n = 2 ** z * CLUSTER_BINS
+        bx = np.minimum((mx[priced] * n).astype(np.int64), n - 1)
+        by = np.minimum((my[priced] * n).astype(np.int64), n - 1)
+        keys, counts, median, _, c_lat, c_lon = spatial.group_stats(bx * n + by, price[priced],
+                                                                    lat[priced], lon[priced])
+        tiles = pyramid.setdefault(z, {})
+        for key, count, med, la, lo in zip(keys.tolist(), counts.tolist(), median.tolist(),
+                                           c_lat.tolist(), c_lon.tolist()):
+            tile = (key // n // CLUSTER_BINS, key % n // CLUSTER_BINS)
+            tiles.setdefault(tile, []).append(_feature(lo, la, {"count": count, "median": int(med)}))
+
+    n = 2 ** pin_zoom
+    tx = np.minimum((mx * n).astype(np.int64), n - 1)
+    ty = np.minimum((my * n).astype(np.int64), n - 1)
+    tiles = pyramid.setdefault(pin_zoom, {})
+    for i in range(len(lat)):
+        props = {"token": cols["token"][i], **{f: _num(cols[f][i]) for f in PIN_FIELDS}}
+        tiles.setdefault((int(tx[i]), int(ty[i])), []).append(_feature(float(lon[i]), float(lat[i]), props))
+    return pyramid
+
+
+def export(district: str, site_dir: Path, store_root: Path = listing_store.STORE_ROOT,
+           force: bool = False) -> Optional[str]:
+    # returns the manifest's URL relative to the site, None without stored listings
+    run_ts = latest_run(district, store_root)
+    if run_ts is None:
+        return None
+    base = Path(site_dir) / "tiles" / district
+    manifest_file = base / "tiles.json"
+    url = f"tiles/{district}/tiles.json"
+    try:
+        current = json.loads(manifest_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        current = {}
+    if not force and current.get("run_ts") == run_ts and current.get("version") == TILES_VERSION \
+            and (base / run_ts).is_dir():
+        return url
+
+    cols = load_listings(district, run_ts, store_root)
+    pyramid = build_tiles(cols)
+    out = base / run_ts
+    if out.exists():
+        shutil.rmtree(out)
+    written = 0
+    for z, tiles in pyramid.items():
+        for (x, y), features in tiles.items():
+            path = out / str(z) / str(x) / f"{y}.geojson"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({"type": "FeatureCollection", "features": features},
+                                       ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            written += 1
+
+    lat, lon = cols["lat"].astype(np.float64), cols["lon"].astype(np.float64)
+    manifest = {
+        "version": TILES_VERSION,
+        "district": district,
+        "run_ts": run_ts,
+        "listings": int(len(lat)),
+        "min_zoom": MIN_ZOOM,
+        "max_zoom": PIN_ZOOM,
+        "bounds": [round(float(lon.min()), 6), round(float(lat.min()), 6),
+                   round(float(lon.max()), 6), round(float(lat.max()), 6)] if len(lat) else None,
+        "url": f"{run_ts}/{{z}}/{{x}}/{{y}}.geojson",
+        # tiles that exist, so the client never asks for an empty one
+        "tiles": {str(z): sorted(f"{x}/{y}" for x, y in tiles) for z, tiles in pyramid.items()},
+    }
+    manifest_file.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+    for old in base.iterdir():
+        if old.is_dir() and old.name != run_ts:
+            shutil.rmtree(old)
+    print(f"[{district}] tiles: {written} files for {len(lat)} listings of run {run_ts} -> {out}")
+    return url
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Export a district's latest run as a GeoJSON tile pyramid.")
+    ap.add_argument("--district", action="append", required=True, help="district folder name (repeatable)")
+    ap.add_argument("--out", default=".", help="site folder (default: current directory)")
+    ap.add_argument("--store", default=str(listing_store.STORE_ROOT), help="listing store root")
+    ap.add_argument("--force", action="store_true", help="rewrite even if the pyramid is current")
+    args = ap.parse_args(argv)
+
+    missing = [d for d in args.district if export(d, Path(args.out), Path(args.store), args.force) is None]
+    for d in missing:
+        print(f"[{d}] no stored listings")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())